@@ -0,0 +1,141 @@
+"""
+Semantic answer cache for repeated and near-duplicate questions.
+
+Answers are matched on normalized query text first, then on cosine
+similarity of query embeddings. Every entry records the corpus version it
+was generated against, so any change to the index invalidates it.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Hashable
+import numpy as np
+from config import Config
+from embedding_cache import normalize_text
+
+def normalize_query(query: str) -> str:
+    """Normalize a question for exact matching."""
+    return re.sub(r"[\s?!.]+$", "", normalize_text(query).casefold())
+
+class AnswerCache:
+    """In-memory LRU/TTL cache of RAG answers."""
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        similarity_threshold: Optional[float] = None
+    ):
+        """Initialize the cache (defaults come from Config)."""
+        self.max_entries = max(1, max_entries if max_entries is not None else Config.ANSWER_CACHE_MAX_ENTRIES)
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.ANSWER_CACHE_TTL_SECONDS
+        self.similarity_threshold = (
+            similarity_threshold if similarity_threshold is not None else Config.ANSWER_CACHE_SIMILARITY
+        )
+        # Keyed by (normalized query, scope); scope captures retrieval settings
+        self.entries: "OrderedDict[Tuple[str, Hashable], Dict[str, Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _expire(self, version: int):
+        """Drop entries from older corpus versions or past their TTL."""
+        now = time.time()
+        stale = [
+            key for key, entry in self.entries.items()
+            if entry['version'] != version or now - entry['created'] > self.ttl_seconds
+        ]
+        for key in stale:
+            del self.entries[key]
+
+    def get_exact(self, query: str, scope: Hashable, version: int) -> Optional[Dict[str, Any]]:
+        """Look up an answer by normalized query text."""
+        key = (normalize_query(query), scope)
+        with self.lock:
+            self._expire(version)
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry['result']
+
+    def get_similar(self, embedding: List[float], scope: Hashable, version: int) -> Optional[Dict[str, Any]]:
+        """Look up the answer to the most similar cached question above the threshold."""
+        query_vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query_vector)
+        with self.lock:
+            self._expire(version)
+            candidates = [
+                (key, entry) for key, entry in self.entries.items()
+                if key[1] == scope and entry['vector'] is not None
+                and len(entry['vector']) == len(query_vector)
+            ]
+            if not candidates or norm == 0:
+                self.misses += 1
+                return None
+            matrix = np.stack([entry['vector'] for _, entry in candidates])
+            similarities = matrix @ (query_vector / norm)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+            key, entry = candidates[best]
+            self.entries.move_to_end(key)
+            self.semantic_hits += 1
+            return entry['result']
+
+    def put(
+        self,
+        query: str,
+        embedding: Optional[List[float]],
+        scope: Hashable,
+        version: int,
+        result: Dict[str, Any]
+    ):
+        """
+        Store an answer generated against a corpus version.
+        
+        Without an embedding the entry only serves exact matches.
+        """
+        vector = np.asarray(embedding or [], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        vector = vector / norm if norm > 0 else None
+        key = (normalize_query(query), scope)
+        with self.lock:
+            self.entries[key] = {
+                'vector': vector,
+                'result': result,
+                'version': version,
+                'created': time.time()
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def record_miss(self):
+        """Count a miss for a lookup that skipped the similarity check."""
+        with self.lock:
+            self.misses += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and occupancy."""
+        with self.lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'exact_hits': self.exact_hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'hit_rate': (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+            }
+
+# Global instance
+answer_cache = AnswerCache()
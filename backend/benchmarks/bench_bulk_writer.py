@@ -0,0 +1,116 @@
+"""
+Benchmark bulk ingestion writes: one vector store write per file against
+a BulkWriter batching many files per write.
+
+Simulates ingesting many small files (e.g. Markdown notes) with random
+embeddings, then re-ingesting all of them, which has to replace every
+file's chunks. Counts backend calls as well as time.
+
+Usage (from the backend directory):
+    python benchmarks/bench_bulk_writer.py --files 2000 --chunks 3 --backend chroma
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+def make_files(files: int, chunks: int, dim: int, seed: int) -> list:
+    """(texts, metadatas, embeddings) per simulated file."""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    result = []
+    for i in range(files):
+        source = f"/docs/note-{i}.md"
+        texts = [f"note {i} chunk {j} seed {seed}" for j in range(chunks)]
+        metadatas = [{"source": source, "chunk_index": j} for j in range(chunks)]
+        embeddings = rng.standard_normal((chunks, dim), dtype=np.float32).tolist()
+        result.append((texts, metadatas, embeddings))
+    return result
+
+def count_calls(backend) -> dict:
+    """Wrap a backend's write methods to count the calls made to it."""
+    calls = {"add": 0, "delete": 0}
+    # delete_by_source and delete_by_sources may call each other; count the outer call only
+    depth = [0]
+
+    def counted(name, method):
+        def wrapper(*args, **kwargs):
+            if depth[0] == 0:
+                calls[name] += 1
+            depth[0] += 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                depth[0] -= 1
+        return wrapper
+
+    backend.add = counted("add", backend.add)
+    backend.delete_by_source = counted("delete", backend.delete_by_source)
+    backend.delete_by_sources = counted("delete", backend.delete_by_sources)
+    backend.delete = counted("delete", backend.delete)
+    return calls
+
+def per_file(store, files: list, replace: bool):
+    """How ingestion wrote before: delete and add once per file."""
+    for texts, metadatas, embeddings in files:
+        if replace:
+            store.delete_by_source(metadatas[0]["source"])
+        store.add_documents(texts, metadatas, embeddings)
+
+def bulk(store, files: list, replace: bool, batch_size: int):
+    with store.bulk_writer(batch_size) as writer:
+        for texts, metadatas, embeddings in files:
+            if replace:
+                writer.replace(metadatas[0]["source"])
+            writer.add(texts, metadatas, embeddings)
+
+def run(mode: str, args) -> dict:
+    """Ingest then re-ingest the simulated files into a fresh store."""
+    with tempfile.TemporaryDirectory() as tmp:
+        from vector_backends import ChromaBackend, NumpyBackend
+        from vector_store import VectorStore
+        backend = ChromaBackend(path=Path(tmp)) if args.backend == "chroma" else NumpyBackend(path=Path(tmp))
+        store = VectorStore(backend=backend, path=Path(tmp))
+        calls = count_calls(store.backend)
+
+        timings = {}
+        for phase, seed, replace in (("ingest", 0, False), ("re-ingest", 1, True)):
+            files = make_files(args.files, args.chunks, args.dim, seed)
+            before = dict(calls)
+            start = time.perf_counter()
+            if mode == "per-file":
+                per_file(store, files, replace)
+            else:
+                bulk(store, files, replace, args.batch)
+            store.flush()
+            timings[phase] = {
+                "seconds": time.perf_counter() - start,
+                "add": calls["add"] - before["add"],
+                "delete": calls["delete"] - before["delete"]
+            }
+        timings["count"] = store.backend.count()
+        return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--chunks", type=int, default=3, help="chunks per file")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--batch", type=int, default=512, help="BulkWriter batch size")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma")
+    args = parser.parse_args()
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    print(f"{args.files} files x {args.chunks} chunks, dim {args.dim}, {args.backend} backend")
+    print(f"{'writer':<10} {'phase':<10} {'seconds':>8} {'adds':>6} {'deletes':>8} {'chunks':>7}")
+    for mode in ("per-file", "bulk"):
+        result = run(mode, args)
+        for phase in ("ingest", "re-ingest"):
+            r = result[phase]
+            print(f"{mode:<10} {phase:<10} {r['seconds']:>8.2f} {r['add']:>6} {r['delete']:>8} {result['count']:>7}")
+
+if __name__ == "__main__":
+    main()
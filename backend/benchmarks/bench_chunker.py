@@ -0,0 +1,144 @@
+"""
+Benchmark the chunker against langchain's RecursiveCharacterTextSplitter,
+and check that both split a corpus at the same places.
+
+The corpus is every supported file under a directory (DOCUMENTS_DIR by
+default). Each file is split the way ingestion splits it (split_file, so
+PDFs go through the page windows) and langchain splits its extracted
+text, both with the configured CHUNK_SIZE/CHUNK_OVERLAP; a file counts
+as matching when the chunk texts are identical. Start offsets are
+compared too, but langchain finds them by searching for each chunk's
+text, so on repetitive text it can report an earlier copy. PDFs are also
+split with a small --window, so that even short ones span several page
+windows, and must give the same chunks. Every stage timing must be
+non-negative.
+
+langchain is no longer a dependency; install it to run this:
+    pip install langchain==0.1.0
+
+Usage (from the backend directory):
+    python benchmarks/bench_chunker.py --corpus ../documents --repeat 3
+"""
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from config import Config
+
+# File types ingest_directory picks up
+SUPPORTED_EXTENSIONS = ('.pdf', '.md', '.markdown', '.txt', '.eml')
+
+def load_corpus(corpus: Path) -> dict:
+    """Extract the text of every supported file under corpus."""
+    from ingestion import ingester
+    texts = {}
+    for path in sorted(corpus.rglob("*")):
+        if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS:
+            text = ingester.extract_text(path)
+            if text and text.strip():
+                texts[str(path)] = text
+    return texts
+
+def check_ingest_path(texts: dict, reference, window_chars: int) -> dict:
+    """Split each file as ingestion does and compare with langchain's chunks of its text."""
+    from ingestion import ingester
+    counts = {'matching': 0, 'offset_mismatches': 0, 'chunks': 0, 'pdfs': 0, 'windowed_matching': 0, 'negative_timings': 0}
+    for path, text in texts.items():
+        timings = {}
+        actual = ingester.split_file(Path(path), timings) or []
+        if any(seconds < 0 for seconds in timings.values()):
+            counts['negative_timings'] += 1
+            print(f"  negative stage timing: {path} {timings}")
+        if path.lower().endswith('.pdf'):
+            counts['pdfs'] += 1
+            windowed = [
+                chunk
+                for segment in ingester.split_pages(ingester.iter_pdf_pages(Path(path)), window_chars=window_chars)
+                for chunk in segment
+            ]
+            if windowed == actual:
+                counts['windowed_matching'] += 1
+            else:
+                print(f"  page windows change boundaries: {path}")
+
+        expected = reference.create_documents([text])
+        counts['chunks'] += len(actual)
+        if [doc.page_content for doc in expected] != [chunk['text'] for chunk in actual]:
+            print(f"  boundaries differ: {path}")
+            continue
+        counts['matching'] += 1
+        counts['offset_mismatches'] += sum(
+            doc.metadata['start_index'] != chunk['start_offset'] for doc, chunk in zip(expected, actual)
+        )
+    return counts
+
+def throughput(split, texts: dict, repeat: int) -> float:
+    """Best MB/s over `repeat` passes through the corpus."""
+    size_mb = sum(len(text.encode("utf-8")) for text in texts.values()) / 2**20
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts.values():
+            split(text)
+        best = min(best, time.perf_counter() - start)
+    return size_mb / best if best > 0 else float("inf")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=Config.DOCUMENTS_DIR)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tokens", action="store_true", help="size chunks in estimated tokens")
+    parser.add_argument("--window", type=int, default=2000, help="page window (chars) for the PDF check")
+    args = parser.parse_args()
+    if args.tokens:
+        Config.CHUNK_UNIT = "tokens"
+    from context_packer import estimate_tokens
+    from ingestion import ingester
+
+    try:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+    except ImportError:
+        sys.exit("langchain isn't installed: pip install langchain==0.1.0")
+    # It warns about every oversized chunk
+    logging.getLogger("langchain.text_splitter").setLevel(logging.ERROR)
+
+    texts = load_corpus(args.corpus)
+    if not texts:
+        sys.exit(f"No supported documents under {args.corpus}")
+
+    length_function = estimate_tokens if args.tokens else None
+    chunker = ingester.text_splitter
+    reference = RecursiveCharacterTextSplitter(
+        chunk_size=Config.CHUNK_SIZE,
+        chunk_overlap=Config.CHUNK_OVERLAP,
+        length_function=length_function or len,
+        add_start_index=True
+    )
+
+    counts = check_ingest_path(texts, reference, args.window)
+
+    size_mb = sum(len(text.encode("utf-8")) for text in texts.values()) / 2**20
+    native = throughput(chunker.split_text, texts, args.repeat)
+    # With start offsets, as ingestion used it
+    langchain = throughput(lambda text: reference.create_documents([text]), texts, args.repeat)
+
+    unit = "tokens" if args.tokens else "chars"
+    print(f"Corpus: {len(texts)} files, {size_mb:.1f} MB, {counts['chunks']} chunks "
+          f"(size {Config.CHUNK_SIZE}, overlap {Config.CHUNK_OVERLAP} {unit})")
+    print(f"  identical boundaries    {counts['matching']}/{len(texts)} files")
+    print(f"  start offset mismatches {counts['offset_mismatches']}")
+    print(f"  PDFs windowed the same  {counts['windowed_matching']}/{counts['pdfs']} ({args.window}-char windows)")
+    print(f"  negative stage timings  {counts['negative_timings']} files")
+    print(f"  TextChunker             {native:>8.1f} MB/s")
+    print(f"  langchain               {langchain:>8.1f} MB/s")
+    print(f"  speedup                 {native / langchain:>8.2f}x")
+    if counts['matching'] < len(texts) or counts['windowed_matching'] < counts['pdfs'] or counts['negative_timings']:
+        sys.exit("Chunking regressed (see above)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark scoped search against full-corpus search on random embeddings.
+
+Builds a store of synthetic files, 100 per folder and ten folders per
+team, half of them under a sibling "teamN-archive" directory. It then
+times vector and keyword queries over the whole corpus and over two
+source path prefixes (a team's five folders and one folder), including
+the time to resolve the scope through the source index. Each scope must
+match exactly the files under it: "/docs/team0" mustn't pick up
+"/docs/team0-archive/".
+
+Usage (from the backend directory):
+    python benchmarks/bench_filtered_search.py --files 5000 --chunks 10 --backend numpy
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+def file_source(i: int) -> str:
+    """Source path of the i-th synthetic file."""
+    archive = "-archive" if (i // 100) % 10 >= 5 else ""
+    return f"/docs/team{i // 1000}{archive}/folder{i // 100:03d}/file{i}.md"
+
+def build_store(tmp: Path, args):
+    """A store holding args.files files of args.chunks chunks each, 100 files per folder."""
+    import numpy as np
+    from vector_backends import ChromaBackend, NumpyBackend
+    from vector_store import VectorStore
+    backend = ChromaBackend(path=tmp) if args.backend == "chroma" else NumpyBackend(path=tmp)
+    store = VectorStore(backend=backend, path=tmp)
+
+    rng = np.random.default_rng(0)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    with store.bulk_writer() as writer:
+        for i in range(args.files):
+            source = file_source(i)
+            texts = [" ".join(rng.choice(vocabulary, 40)) for _ in range(args.chunks)]
+            metadatas = [{"source": source, "chunk_index": j, "file_type": ".md"} for j in range(args.chunks)]
+            writer.add(texts, metadatas, rng.standard_normal((args.chunks, args.dim), dtype=np.float32).tolist())
+    return store, vocabulary
+
+def time_queries(search, queries: list) -> float:
+    """Median milliseconds per query."""
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--chunks", type=int, default=10, help="chunks per file")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="numpy")
+    args = parser.parse_args()
+    sys.path.insert(0, str(BACKEND_DIR))
+    import numpy as np
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store, vocabulary = build_store(Path(tmp), args)
+        rng = np.random.default_rng(1)
+        vectors = rng.standard_normal((args.queries, args.dim), dtype=np.float32).tolist()
+        keywords = [" ".join(rng.choice(vocabulary, 3)) for _ in range(args.queries)]
+
+        # Files each scope must match, counted from how the paths were built
+        expected = {
+            None: args.files,
+            "/docs/team0": sum(1 for i in range(min(args.files, 1000)) if (i // 100) % 10 < 5),
+            "/docs/team0/folder000/": min(args.files, 100)
+        }
+        wrong_scopes = []
+        print(f"{args.files} files x {args.chunks} chunks, dim {args.dim}, {args.backend} backend")
+        print(f"{'scope':<24} {'sources':>8} {'vector ms':>10} {'keyword ms':>11}")
+        for prefix, expected_sources in expected.items():
+            filters = {"source_prefix": prefix} if prefix else None
+            name = prefix or "all"
+            sources = len(store.source_index.find(source_prefix=prefix)) if prefix else args.files
+            if sources != expected_sources:
+                wrong_scopes.append(f"{name} matched {sources} files, expected {expected_sources}")
+            vector_ms = time_queries(
+                lambda v: store.search(v, args.top_k, filter_dict=store.scope_filter(filters)), vectors
+            )
+            keyword_ms = time_queries(
+                lambda q: store.lexical_search(q, args.top_k, filter_dict=store.scope_filter(filters)), keywords
+            )
+            print(f"{name:<24} {sources:>8} {vector_ms:>10.2f} {keyword_ms:>11.2f}")
+
+    if wrong_scopes:
+        for problem in wrong_scopes:
+            print(problem)
+        sys.exit("Scoped search matched the wrong files (see above)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark partitioned collections against one shared collection on random embeddings.
+
+Builds the same chunks twice: once in a single collection, once split
+across several partitions. Times queries over the single collection,
+fanned out over every partition (searched concurrently, then merged by
+distance, as the RAG pipeline does) and over one partition, then the
+time to write a batch of new chunks into each layout, and the recall of
+each layout against exact search.
+
+Usage (from the backend directory):
+    python benchmarks/bench_partitions.py --partitions 4 --chunks 25000 --backend chroma
+"""
+import argparse
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+def open_store(path: Path, name: str, backend: str):
+    """A vector store with its own collection and indexes in path."""
+    from vector_backends import create_backend
+    from vector_store import VectorStore
+    path.mkdir(parents=True, exist_ok=True)
+    return VectorStore(create_backend(backend, path=path, collection_name=name), path=path)
+
+def fill(store, embeddings, start: int, prefix: str):
+    """Write one chunk per embedding, one file per 10 chunks."""
+    with store.bulk_writer() as writer:
+        for i in range(0, len(embeddings), 10):
+            batch = embeddings[i:i + 10]
+            writer.add(
+                [f"{prefix} chunk {start + i + j}" for j in range(len(batch))],
+                [{"source": f"/docs/{prefix}/file{(start + i) // 10}.md", "chunk_index": j} for j in range(len(batch))],
+                batch.tolist()
+            )
+
+def time_queries(search, queries: list) -> float:
+    """Median milliseconds per query."""
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--partitions", type=int, default=4)
+    parser.add_argument("--chunks", type=int, default=25000, help="chunks per partition")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--write-batch", type=int, default=1000, help="chunks in the timed write")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma")
+    args = parser.parse_args()
+    sys.path.insert(0, str(BACKEND_DIR))
+    import numpy as np
+    from partitions import merge_results
+
+    rng = np.random.default_rng(0)
+    data = [rng.standard_normal((args.chunks, args.dim), dtype=np.float32) for _ in range(args.partitions)]
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32).tolist()
+    extra = rng.standard_normal((args.write_batch, args.dim), dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        shared = open_store(root / "shared", "documents", args.backend)
+        partitions = [open_store(root / f"team{p}", f"team{p}", args.backend) for p in range(args.partitions)]
+        for p, embeddings in enumerate(data):
+            fill(shared, embeddings, 0, f"team{p}")
+            fill(partitions[p], embeddings, 0, f"team{p}")
+
+        pool = ThreadPoolExecutor(max_workers=args.partitions)
+
+        def fan_out(query):
+            searched = pool.map(lambda store: store.search(query, args.top_k), partitions)
+            return merge_results(list(searched), args.top_k)
+
+        total = args.partitions * args.chunks
+        print(f"{args.partitions} partitions x {args.chunks} chunks, dim {args.dim}, {args.backend} backend")
+        print(f"{'layout':<28} {'chunks':>8} {'query ms':>9}")
+        for name, chunks, search in [
+            ("shared collection", total, lambda q: shared.search(q, args.top_k)),
+            (f"fan-out over {args.partitions} partitions", total, fan_out),
+            ("one partition", args.chunks, lambda q: partitions[0].search(q, args.top_k)),
+        ]:
+            print(f"{name:<28} {chunks:>8} {time_queries(search, queries):>9.2f}")
+
+        # Exact top-k by cosine similarity over every chunk, identified by text
+        matrix = np.concatenate(data)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        texts = [f"team{p} chunk {i}" for p in range(args.partitions) for i in range(args.chunks)]
+        exact = [{texts[i] for i in np.argsort(-(matrix @ np.asarray(q)))[:args.top_k]} for q in queries]
+        for name, search in [("shared collection", lambda q: shared.search(q, args.top_k)), ("fan-out", fan_out)]:
+            recall = np.mean([
+                len({r['text'] for r in search(q)} & truth) / args.top_k for q, truth in zip(queries, exact)
+            ])
+            print(f"{name} recall@{args.top_k} vs exact search: {recall:.1%}")
+
+        print(f"\nwriting {args.write_batch} new chunks")
+        for name, store in [("shared collection", shared), ("one partition", partitions[0])]:
+            start = time.perf_counter()
+            fill(store, extra, args.chunks, "team0")
+            print(f"{name:<28} {(time.perf_counter() - start) * 1000:>9.0f} ms")
+        pool.shutdown()
+
+if __name__ == "__main__":
+    main()
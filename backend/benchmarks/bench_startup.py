@@ -0,0 +1,93 @@
+"""
+Benchmark backend cold start: how long `import main` takes, how long the
+startup handlers take, and how long until the first query is answered.
+
+Each run is a fresh subprocess, so imports are never cached in memory.
+Model warm-up is turned off (it runs in the background and needs Ollama);
+the first query is a keyword search, which opens the vector store and
+lexical index without calling Ollama. It runs against the configured
+CHROMA_DB_PATH, so point that at a copy of a real index for realistic
+numbers.
+
+Usage (from the backend directory):
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Libraries that should only be imported once they're needed
+HEAVY_MODULES = ("chromadb", "fitz", "bs4", "ollama")
+
+def run_once() -> dict:
+    """Measure one cold start in this process."""
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(BACKEND_DIR)
+
+    start = time.perf_counter()
+    import main
+    import_ms = (time.perf_counter() - start) * 1000
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    from fastapi.testclient import TestClient
+    start = time.perf_counter()
+    with TestClient(main.app) as client:
+        startup_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        response = client.post("/api/search", json={"query": "startup benchmark", "mode": "lexical"})
+        first_query_ms = (time.perf_counter() - start) * 1000
+        response.raise_for_status()
+
+    return {
+        "import_ms": round(import_ms, 1),
+        "startup_ms": round(startup_ms, 1),
+        "first_query_ms": round(first_query_ms, 1),
+        "ready_ms": round(import_ms + startup_ms + first_query_ms, 1),
+        "heavy_modules_at_import": loaded
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print the median run as JSON")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_once()))
+        return
+
+    env = {**os.environ, "WARMUP_ON_STARTUP": "false"}
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, __file__, "--single"],
+            capture_output=True, text=True, check=True, env=env
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    median = {
+        key: statistics.median(run[key] for run in runs)
+        for key in ("import_ms", "startup_ms", "first_query_ms", "ready_ms")
+    }
+    median["heavy_modules_at_import"] = runs[-1]["heavy_modules_at_import"]
+    if args.json:
+        print(json.dumps(median))
+        return
+
+    print(f"Median of {args.runs} cold starts:")
+    print(f"  import main      {median['import_ms']:>8.1f} ms")
+    print(f"  startup handlers {median['startup_ms']:>8.1f} ms")
+    print(f"  first query      {median['first_query_ms']:>8.1f} ms")
+    print(f"  ready            {median['ready_ms']:>8.1f} ms")
+    print(f"  heavy modules imported by main: {', '.join(median['heavy_modules_at_import']) or 'none'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark the vector backends on random embeddings.
+
+Each backend runs in its own subprocess so RSS numbers don't mix.
+
+Usage (from the backend directory):
+    python benchmarks/bench_vector_backends.py --vectors 20000 --dim 768
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+def rss_mb() -> float:
+    """Current resident set size in MiB (Linux), falling back to peak RSS."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_one(backend_name: str, vectors: int, dim: int, queries: int, top_k: int, batch: int) -> dict:
+    """Benchmark a single backend in this process."""
+    import numpy as np
+    sys.path.insert(0, str(BACKEND_DIR))
+    from vector_backends import ChromaBackend, NumpyBackend
+
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((vectors, dim), dtype=np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    query_vectors = rng.standard_normal((queries, dim), dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rss_before = rss_mb()
+        if backend_name == "chroma":
+            backend = ChromaBackend(path=Path(tmp))
+        else:
+            backend = NumpyBackend(path=Path(tmp))
+
+        start = time.perf_counter()
+        for offset in range(0, vectors, batch):
+            rows = range(offset, min(offset + batch, vectors))
+            backend.add(
+                ids=[f"doc-{i}" for i in rows],
+                embeddings=data[offset:offset + len(rows)].tolist(),
+                texts=[f"chunk {i}" for i in rows],
+                metadatas=[{"source": f"file-{i // 20}", "chunk_index": i % 20} for i in rows]
+            )
+        backend.flush()
+        add_seconds = time.perf_counter() - start
+
+        latencies = []
+        for query in query_vectors:
+            start = time.perf_counter()
+            backend.search(query.tolist(), top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+
+        start = time.perf_counter()
+        for query in query_vectors[:20]:
+            backend.search(query.tolist(), top_k, where={"source": "file-7"})
+        filtered_ms = (time.perf_counter() - start) * 1000 / 20
+
+        return {
+            "backend": backend_name,
+            "vectors": vectors,
+            "dim": dim,
+            "add_per_sec": round(vectors / add_seconds),
+            "query_p50_ms": round(latencies[len(latencies) // 2], 2),
+            "query_p95_ms": round(latencies[int(len(latencies) * 0.95)], 2),
+            "filtered_query_ms": round(filtered_ms, 2),
+            "rss_delta_mb": round(rss_mb() - rss_before, 1)
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="chroma,numpy")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_one(args.single, args.vectors, args.dim, args.queries, args.top_k, args.batch)))
+        return
+
+    print(f"{'backend':<8} {'add/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'filter ms':>10} {'RSS MiB':>8}")
+    for name in args.backends.split(","):
+        output = subprocess.run(
+            [sys.executable, __file__, "--single", name,
+             "--vectors", str(args.vectors), "--dim", str(args.dim),
+             "--queries", str(args.queries), "--top-k", str(args.top_k), "--batch", str(args.batch)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{name:<8} {result['add_per_sec']:>8} {result['query_p50_ms']:>8} "
+              f"{result['query_p95_ms']:>8} {result['filtered_query_ms']:>10} {result['rss_delta_mb']:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+Offset-based recursive text chunker.
+
+Splits text the same way langchain's RecursiveCharacterTextSplitter does
+(with its defaults: separators kept at the start of the following piece,
+chunk whitespace stripped), but works on (start, end) offsets into the
+source text instead of copying every piece and overlapping window. Only
+the final chunks are sliced out, and each one knows exactly where it came
+from.
+
+Sizes are measured in characters by default; pass a length_function
+(e.g. context_packer.estimate_tokens) to size chunks in tokens instead.
+
+Text that arrives in parts (pages of a PDF) can be split as it comes with
+a ChunkStream, which gives the same chunks as splitting it all at once.
+"""
+import bisect
+import itertools
+import operator
+import re
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+# A (start, end) range of the source text
+Span = Tuple[int, int]
+
+class TextChunker:
+    """Recursively splits text into overlapping chunks of bounded size."""
+
+    def __init__(
+        self,
+        chunk_size: int,
+        chunk_overlap: int,
+        separators: Optional[List[str]] = None,
+        length_function: Optional[Callable[[str], int]] = None
+    ):
+        """
+        Args:
+            chunk_size: Maximum chunk size
+            chunk_overlap: Maximum overlap between neighbouring chunks
+            separators: Separators to try, coarsest first; "" splits into characters
+            length_function: Measures a piece of text; defaults to characters
+        """
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"Chunk overlap ({chunk_overlap}) is larger than chunk size ({chunk_size})"
+            )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = list(separators or DEFAULT_SEPARATORS)
+        self.length_function = length_function
+
+    def split_text(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Split text into chunks.
+
+        Returns:
+            List of dicts with 'text', 'start_offset' and 'end_offset', where
+            text == source[start_offset:end_offset]
+        """
+        return [
+            {'text': text[start:end], 'start_offset': start, 'end_offset': end}
+            for start, end in self.split_spans(text)
+        ]
+
+    def split_spans(self, text: str) -> List[Span]:
+        """Split text into chunks, returned as (start, end) offsets only."""
+        spans: List[Span] = []
+        self._split(text, 0, len(text), self.separators, spans)
+        return spans
+
+    def stream(self) -> "ChunkStream":
+        """Start splitting a text that arrives in parts (see ChunkStream)."""
+        return ChunkStream(self)
+
+    def _split(self, text: str, start: int, end: int, separators: List[str], spans: List[Span]):
+        # Use the first separator that occurs in this range
+        separator = separators[-1]
+        finer: List[str] = []
+        for i, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator = candidate
+                finer = separators[i + 1:]
+                break
+        self._split_pieces(text, start, end, separator, finer, spans)
+
+    def _split_pieces(self, text: str, start: int, end: int, separator: str, finer: List[str], spans: List[Span]):
+        """Split a range at a chosen separator, then merge or split further the pieces."""
+        cuts, lengths = self._pieces(text, start, end, separator)
+
+        # Runs of pieces that fit are merged; pieces that don't are split further
+        run_start = 0
+        if lengths and max(lengths) >= self.chunk_size:
+            for i, length in enumerate(lengths):
+                if length < self.chunk_size:
+                    continue
+                if i > run_start:
+                    self._merge(text, cuts, lengths, run_start, i, spans)
+                if finer:
+                    self._split(text, cuts[i], cuts[i + 1], finer, spans)
+                else:
+                    # Can't be split further; kept as is, unstripped
+                    spans.append((cuts[i], cuts[i + 1]))
+                run_start = i + 1
+        if run_start < len(lengths):
+            self._merge(text, cuts, lengths, run_start, len(lengths), spans)
+
+    def _split_open(
+        self, text: str, start: int, end: int, known_end: int, separator: str, finer: List[str], spans: List[Span]
+    ) -> Tuple[int, bool]:
+        """
+        Like _split_pieces, for a range that continues past end.
+
+        Only chunks that can't change whatever text follows are added: the
+        last piece may not be complete, so neither is the run it ends. Text
+        past known_end may begin a separator, so it isn't counted as part of
+        the last piece.
+
+        Returns:
+            (offset, descend): where splitting resumes, and whether it
+            resumes inside the last piece, which is already too big and will
+            be split with the finer separators; otherwise the offset starts
+            a piece that begins a chunk at this level
+        """
+        cuts, lengths = self._pieces(text, start, end, separator)
+        last = len(lengths) - 1
+        run_start = 0
+        for i in range(last):
+            if lengths[i] < self.chunk_size:
+                continue
+            if i > run_start:
+                self._merge(text, cuts, lengths, run_start, i, spans)
+            if finer:
+                self._split(text, cuts[i], cuts[i + 1], finer, spans)
+            else:
+                spans.append((cuts[i], cuts[i + 1]))
+            run_start = i + 1
+        if self._measure(text[cuts[last]:max(cuts[last], known_end)]) >= self.chunk_size:
+            # It can only grow, so it's split further; without finer
+            # separators it's kept whole once its end is known
+            if last > run_start:
+                self._merge(text, cuts, lengths, run_start, last, spans)
+            return cuts[last], bool(finer)
+        return cuts[self._merge(text, cuts, lengths, run_start, last + 1, spans, open_end=True)], False
+
+    def _pieces(self, text: str, start: int, end: int, separator: str) -> Tuple[List[int], List[int]]:
+        """Piece i is text[cuts[i]:cuts[i + 1]], of size lengths[i]."""
+        cuts = self._cuts(text, start, end, separator)
+        if self.length_function is None:
+            lengths = list(map(operator.sub, cuts[1:], cuts))
+        else:
+            lengths = [self.length_function(text[a:b]) for a, b in zip(cuts, cuts[1:])]
+        return cuts, lengths
+
+    def _measure(self, text: str) -> int:
+        return len(text) if self.length_function is None else self.length_function(text)
+
+    @staticmethod
+    def _cuts(text: str, start: int, end: int, separator: str) -> List[int]:
+        """Offsets that cut a range before each occurrence of separator (no empty pieces)."""
+        if separator == "":
+            return list(range(start, end + 1))
+        cuts = [match.start() for match in re.compile(re.escape(separator)).finditer(text, start, end)]
+        # A match at the very start just begins the first piece
+        if not cuts or cuts[0] != start:
+            cuts.insert(0, start)
+        if end > start:
+            cuts.append(end)
+        return cuts
+
+    def _merge(
+        self,
+        text: str,
+        cuts: List[int],
+        lengths: List[int],
+        first: int,
+        stop: int,
+        spans: List[Span],
+        open_end: bool = False
+    ) -> int:
+        """
+        Combine pieces first..stop-1 into chunks, overlapping by up to chunk_overlap.
+
+        Greedy, like langchain: a chunk takes pieces until the next one would
+        overflow it, then pieces are dropped from its front until the rest
+        fits in the overlap and leaves room for the next piece. Prefix sums
+        let each chunk be found with a bisect instead of piece by piece.
+
+        Each chunk depends only on the piece it starts at and the pieces
+        after it. With open_end, the last piece may grow (or be followed by
+        more), so merging stops at the first chunk that could reach it.
+
+        Returns:
+            The piece the next chunk starts at (stop once all are merged)
+        """
+        if self.length_function is None:
+            totals = cuts  # Sizes are character counts, so offsets are prefix sums
+        else:
+            totals = [0] * first + list(itertools.accumulate(lengths[first:stop], initial=0))
+        while True:
+            if open_end and totals[stop - 1] - totals[first] <= self.chunk_size:
+                return first
+            # Pieces first..last-1 fit; piece `last` would overflow the chunk
+            last = bisect.bisect_right(totals, totals[first] + self.chunk_size, first, stop + 1) - 1
+            if last >= stop:
+                self._emit(text, cuts[first], cuts[stop], spans)
+                return stop
+            self._emit(text, cuts[first], cuts[last], spans)
+            first = max(
+                first,
+                bisect.bisect_left(totals, totals[last] - self.chunk_overlap, first, last),
+                bisect.bisect_left(totals, totals[last + 1] - self.chunk_size, first, last)
+            )
+
+    @staticmethod
+    def _emit(text: str, start: int, end: int, spans: List[Span]):
+        """Add a chunk with surrounding whitespace trimmed (skipped if nothing is left)."""
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if end > start:
+            spans.append((start, end))
+
+class ChunkStream:
+    """
+    Splits a text that arrives in parts into the same chunks as
+    TextChunker.split_text on the whole text, keeping only the text that
+    later chunks can still depend on.
+
+    Splitting is recursive: a range is cut at its coarsest separator and
+    pieces that are too big are split again at the next. Part way through
+    the text, that recursion is somewhere inside a stack of pieces still
+    being split, one per separator level. A piece ends where its level's
+    separator next occurs, so each level only needs to know where to look
+    for that; the innermost level resumes at the start of a piece that
+    begins its next chunk, which depends on nothing before it.
+
+    A range where the coarsest separator hasn't occurred yet is treated as
+    one piece; once it's too big, that is the same as split_text choosing
+    the next separator, whether or not the coarser one turns up later.
+    This assumes the length function never shrinks as text is added.
+
+    Offsets are into the whole text.
+    """
+
+    def __init__(self, chunker: TextChunker):
+        self.chunker = chunker
+        self.text = ""
+        self.base = 0  # Offset of self.text in the whole text
+        self.pending = 0  # Characters added since the last split()
+        # Where to look next for each enclosing level's separator (offsets into self.text)
+        self.scans: List[int] = []
+        # Whether self.text starts a chunk at the current level, rather than a new range
+        self.resumed = False
+
+    @property
+    def end(self) -> int:
+        """Offset of the end of the text added so far."""
+        return self.base + len(self.text)
+
+    def feed(self, text: str):
+        """Add the next part of the text."""
+        self.text += text
+        self.pending += len(text)
+
+    def split(self, final: bool = False) -> List[Dict[str, Any]]:
+        """
+        Split as much of the text added so far as is settled.
+
+        Args:
+            final: The whole text has been added; split the rest
+
+        Returns:
+            New chunks in order, as in TextChunker.split_text
+        """
+        chunker = self.chunker
+        separators = chunker.separators
+        text = self.text
+        end = len(text)
+        # Text past here may be the start of a separator
+        known_end = end - max(map(len, separators)) + 1
+        spans: List[Span] = []
+        pos = 0
+        while True:
+            level = len(self.scans)
+            separator = separators[level]
+            # The range ends where an enclosing level's separator occurs next
+            range_end, outer = -1, 0
+            for i, scan in enumerate(self.scans):
+                found = text.find(separators[i], scan, end)
+                if found != -1 and (range_end == -1 or found < range_end):
+                    range_end, outer = found, i
+            if range_end != -1 or final:
+                stop = end if range_end == -1 else range_end
+                if self.resumed:
+                    chunker._split_pieces(text, pos, stop, separator, separators[level + 1:], spans)
+                else:
+                    chunker._split(text, pos, stop, separators[level:], spans)
+                if range_end == -1:
+                    pos, self.scans, self.resumed = end, [], False
+                    break
+                # The enclosing level carries on with a new piece there
+                del self.scans[outer:]
+                pos, self.resumed = range_end, True
+                continue
+
+            if not self.resumed and separator != "" and text.find(separator, pos, end) == -1:
+                # One piece so far: split it with the finer separators once it's too big
+                if level + 1 == len(separators) or chunker._measure(text[pos:max(pos, known_end)]) < chunker.chunk_size:
+                    break
+                self.scans.append(pos)
+                continue
+            pos, descend = chunker._split_open(text, pos, end, known_end, separator, separators[level + 1:], spans)
+            self.resumed = not descend
+            if not descend:
+                break
+            self.scans.append(pos + len(separator) if text.startswith(separator, pos) else pos)
+
+        self.text = text[pos:]
+        self.base += pos
+        self.scans = [max(0, scan - pos) for scan in self.scans]
+        self.pending = 0
+        return [
+            {'text': text[start:stop], 'start_offset': self.base - pos + start, 'end_offset': self.base - pos + stop}
+            for start, stop in spans
+        ]
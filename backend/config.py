@@ -16,6 +16,10 @@ class Config:
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "phi3")  # Changed to phi3 for faster responses
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+    OLLAMA_KEEP_ALIVE: str = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # How long Ollama keeps models loaded ("-1" = forever)
+    WARMUP_ON_STARTUP: bool = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"  # Load models when the server starts
+    OLLAMA_STATUS_TIMEOUT_SECONDS: float = float(os.getenv("OLLAMA_STATUS_TIMEOUT_SECONDS", "2"))  # How long /api/status waits for Ollama
+    OLLAMA_STATUS_CACHE_SECONDS: float = float(os.getenv("OLLAMA_STATUS_CACHE_SECONDS", "5"))  # How long a loaded-models answer is reused
     
     # Document storage
     BASE_DIR: Path = Path(__file__).parent.parent  # Project root
@@ -28,11 +32,68 @@ class Config:
     # RAG configuration
     CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "1000"))
     CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "200"))
+    CHUNK_UNIT: str = os.getenv("CHUNK_UNIT", "chars")  # CHUNK_SIZE/CHUNK_OVERLAP in "chars" or (estimated) "tokens"
     TOP_K: int = int(os.getenv("TOP_K", "5"))
+    RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "hybrid")  # "vector", "lexical" or "hybrid"
+    HISTORY_MAX_MESSAGES: int = int(os.getenv("HISTORY_MAX_MESSAGES", "6"))  # Conversation messages sent with each question
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))  # Prompt tokens for retrieved context
+    MAX_SEARCH_BATCH: int = int(os.getenv("MAX_SEARCH_BATCH", "1000"))  # Queries per /api/search/batch request
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "chroma")  # "chroma" or "numpy" (exact memory-mapped search)
+    VECTOR_QUANTIZATION: str = os.getenv("VECTOR_QUANTIZATION", "none")  # numpy backend: "none", "float16" or "int8"
+    VECTOR_RESCORE: bool = os.getenv("VECTOR_RESCORE", "false").lower() == "true"  # Re-rank quantized hits with float32 copies
+    VECTOR_RESCORE_MULTIPLIER: int = int(os.getenv("VECTOR_RESCORE_MULTIPLIER", "4"))  # Candidates per result to re-rank
+    VECTOR_FLUSH_INTERVAL: float = float(os.getenv("VECTOR_FLUSH_INTERVAL", "30"))  # Seconds between numpy index saves
+    LEXICAL_FLUSH_INTERVAL: float = float(os.getenv("LEXICAL_FLUSH_INTERVAL", "30"))  # Seconds between BM25 index saves
+    INCREMENTAL_INGEST: bool = os.getenv("INCREMENTAL_INGEST", "true").lower() == "true"  # Skip unchanged files
+    DEDUP_ENABLED: bool = os.getenv("DEDUP_ENABLED", "true").lower() == "true"  # Skip near-duplicate chunks at ingest
+    DEDUP_THRESHOLD: float = float(os.getenv("DEDUP_THRESHOLD", "0.85"))  # Estimated Jaccard similarity that counts as a duplicate
+    
+    # Embedding throughput
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))  # Chunks per embed request
+    EMBEDDING_CONCURRENCY: int = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))  # Batches in flight
+    
+    # Ingestion pipeline
+    INGEST_EXTRACT_WORKERS: int = int(os.getenv("INGEST_EXTRACT_WORKERS", str(os.cpu_count() or 2)))  # Extraction processes
+    INGEST_EMBED_WORKERS: int = int(os.getenv("INGEST_EMBED_WORKERS", "2"))  # Files embedded concurrently
+    INGEST_QUEUE_SIZE: int = int(os.getenv("INGEST_QUEUE_SIZE", "16"))  # Files in flight between stages
+    INGEST_WRITE_BATCH_SIZE: int = int(os.getenv("INGEST_WRITE_BATCH_SIZE", "512"))  # Chunks per vector store write
+    INGEST_STREAM_MIN_MB: float = float(os.getenv("INGEST_STREAM_MIN_MB", "5"))  # PDFs this big are read page by page, not in the process pool
+    
+    # Uploads
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # Bytes read per write
+    MAX_UPLOAD_SIZE_MB: int = int(os.getenv("MAX_UPLOAD_SIZE_MB", "500"))  # Per file
+    MAX_UPLOAD_FILES: int = int(os.getenv("MAX_UPLOAD_FILES", "50"))  # Per request
+    MAX_UPLOAD_REQUEST_MB: int = int(os.getenv("MAX_UPLOAD_REQUEST_MB", "2000"))  # All files in one request
+    
+    # Answer cache
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_MAX_ENTRIES: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+    ANSWER_CACHE_TTL_SECONDS: float = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+    ANSWER_CACHE_SIMILARITY: float = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))  # Cosine similarity for a near-duplicate hit
+    
+    # Embedding cache
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    embedding_cache_dir = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache")
+    EMBEDDING_CACHE_PATH: Path = (
+        Path(embedding_cache_dir) if Path(embedding_cache_dir).is_absolute()
+        else BASE_DIR / embedding_cache_dir
+    )
+    EMBEDDING_CACHE_MAX_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
     
     # Server configuration
+    IO_WORKERS: int = int(os.getenv("IO_WORKERS", "8"))  # Threads for vector store and other blocking calls
+    INGEST_REQUEST_WORKERS: int = int(os.getenv("INGEST_REQUEST_WORKERS", "2"))  # Concurrent ingest requests
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "1"))  # Background ingest jobs run at once
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", "8000"))
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "info")  # Structured request/RAG logs go to stderr
+    
+    # Request profiling
+    profiles_dir = os.getenv("PROFILES_DIR", "profiles")
+    PROFILES_DIR: Path = Path(profiles_dir) if Path(profiles_dir).is_absolute() else BASE_DIR / profiles_dir
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Fraction of chat/search/ingest requests profiled
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))  # Time between stack samples
+    PROFILE_MAX_STORED: int = int(os.getenv("PROFILE_MAX_STORED", "50"))  # Oldest profiles are deleted beyond this
     CORS_ORIGINS: list = os.getenv(
         "CORS_ORIGINS", 
         "http://localhost:5173,http://localhost:3000"
@@ -43,7 +104,5 @@ class Config:
         """Ensure required directories exist."""
         cls.DOCUMENTS_DIR.mkdir(parents=True, exist_ok=True)
         cls.CHROMA_DB_PATH.mkdir(parents=True, exist_ok=True)
-
-# Initialize directories
-Config.ensure_directories()
-
+        if cls.EMBEDDING_CACHE_ENABLED:
+            cls.EMBEDDING_CACHE_PATH.mkdir(parents=True, exist_ok=True)
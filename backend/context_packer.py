@@ -0,0 +1,138 @@
+"""
+Token-budgeted packing of retrieved chunks into prompt context.
+
+Neighbouring chunks from the same file share CHUNK_OVERLAP characters, so
+sending them separately repeats text. The packer picks chunks by relevance
+until the token budget is spent, then merges runs of adjacent chunks from
+one source into a single passage with the overlap removed. Each passage
+becomes one citation.
+"""
+from typing import List, Dict, Any, Optional
+from config import Config
+
+# Rough size of a token for English text with the models we use
+CHARS_PER_TOKEN = 4
+# Tokens for the "[Citation N] Source: ..." header of each passage
+PASSAGE_HEADER_TOKENS = 12
+# Shorter suffix/prefix matches are treated as coincidence, not overlap
+MIN_OVERLAP_CHARS = 8
+
+def estimate_tokens(text: str) -> int:
+    """Estimate how many tokens a text takes up."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def overlap_length(previous: str, following: str, max_overlap: Optional[int] = None) -> int:
+    """Length of the longest suffix of `previous` that starts `following`."""
+    if max_overlap is None:
+        max_overlap = Config.CHUNK_OVERLAP
+        if Config.CHUNK_UNIT == "tokens":
+            max_overlap *= CHARS_PER_TOKEN
+    longest = min(len(previous), len(following), max_overlap)
+    for length in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(following[:length]):
+            return length
+    return 0
+
+def merge_texts(texts: List[str]) -> str:
+    """Join consecutive chunk texts, dropping the text they overlap on."""
+    merged = texts[0]
+    for text in texts[1:]:
+        overlap = overlap_length(merged, text)
+        if overlap:
+            merged += text[overlap:]
+        else:
+            merged += "\n" + text
+    return merged
+
+def _chunk_key(chunk: Dict[str, Any], position: int) -> tuple:
+    """(source, chunk_index), with a unique negative index for chunks lacking one."""
+    metadata = chunk.get('metadata', {})
+    index = metadata.get('chunk_index')
+    return metadata.get('source', ''), -1 - position if index is None else index
+
+def pack_context(chunks: List[Dict[str, Any]], token_budget: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Select and merge retrieved chunks to fit a token budget.
+
+    Chunks are taken in the order given (most relevant first). A chunk
+    whose neighbour is already selected only costs its non-overlapping
+    text. Chunks that don't fit are skipped so smaller ones further down
+    can still fill the budget; the top chunk is truncated if it alone is
+    too big.
+
+    Args:
+        chunks: Retrieved chunks, most relevant first
+        token_budget: Tokens available for context (defaults to config value)
+
+    Returns:
+        Passages ordered by their best chunk's rank. Each has the fields of
+        its best chunk plus merged 'text' and 'chunk_indices', and its
+        metadata 'chunk_index' is the first chunk in the passage ('page_end',
+        if present, is the last chunk's).
+    """
+    if token_budget is None:
+        token_budget = Config.CONTEXT_TOKEN_BUDGET
+
+    selected: Dict[tuple, Dict[str, Any]] = {}
+    rank: Dict[tuple, int] = {}
+    remaining = token_budget
+    for position, chunk in enumerate(chunks):
+        key = _chunk_key(chunk, position)
+        if key in selected:
+            continue
+        source, index = key
+        text = chunk.get('text', '')
+        cost = estimate_tokens(text)
+        joins_passage = False
+        if index >= 0:
+            before = selected.get((source, index - 1))
+            after = selected.get((source, index + 1))
+            if before is not None:
+                cost -= estimate_tokens(text[:overlap_length(before.get('text', ''), text)])
+                joins_passage = True
+            if after is not None:
+                cost -= estimate_tokens(text[len(text) - overlap_length(text, after.get('text', '')):])
+                joins_passage = True
+        if not joins_passage:
+            cost += PASSAGE_HEADER_TOKENS
+
+        if cost > remaining:
+            if selected:
+                continue
+            # Always keep the best chunk, cut down to the budget
+            keep_chars = max(0, (remaining - PASSAGE_HEADER_TOKENS) * CHARS_PER_TOKEN)
+            chunk = {**chunk, 'text': text[:keep_chars]}
+            cost = remaining
+        selected[key] = chunk
+        rank[key] = position
+        remaining -= cost
+
+    # Group selected chunks into runs of consecutive chunk_index per source
+    passages = []
+    for key in sorted(selected):
+        source, index = key
+        previous = passages[-1] if passages else None
+        if (previous is not None and index > 0
+                and previous['source'] == source and previous['last_index'] == index - 1):
+            previous['keys'].append(key)
+            previous['last_index'] = index
+        else:
+            passages.append({'source': source, 'last_index': index, 'keys': [key]})
+
+    packed = []
+    ranks = []
+    for passage in passages:
+        keys = passage['keys']
+        best_key = min(keys, key=lambda k: rank[k])
+        metadata = {**selected[keys[0]].get('metadata', {})}
+        last_metadata = selected[keys[-1]].get('metadata', {})
+        if 'page_end' in last_metadata:
+            metadata['page_end'] = last_metadata['page_end']
+        packed.append({
+            **selected[best_key],
+            'text': merge_texts([selected[k].get('text', '') for k in keys]),
+            'metadata': metadata,
+            'chunk_indices': [k[1] for k in keys if k[1] >= 0]
+        })
+        ranks.append(rank[best_key])
+    return [passage for _, passage in sorted(zip(ranks, packed), key=lambda item: item[0])]
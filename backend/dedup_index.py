@@ -0,0 +1,190 @@
+"""
+MinHash/LSH index of stored chunks, for skipping near-duplicates at ingest.
+
+Each chunk gets a MinHash signature over its word shingles; chunks whose
+estimated Jaccard similarity reaches DEDUP_THRESHOLD count as the same
+passage. Locality-sensitive hashing (signature bands as bucket keys) keeps
+lookups to a handful of candidates instead of every stored chunk.
+
+When a chunk is skipped, its file is linked to the file holding the copy
+that was kept. Removing that file returns its linked files, so they can
+be re-ingested and get their passages back. Persisted next to the Chroma
+database.
+"""
+import os
+import pickle
+import re
+import threading
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import List, Dict, Optional, Set, Tuple
+import numpy as np
+from config import Config
+
+NUM_PERM = 128
+# 16 bands of 8 rows: chunks at 0.9 similarity share a bucket ~99.9% of the
+# time, chunks at 0.5 only ~6%
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Words per shingle
+SHINGLE_WORDS = 3
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Fixed seed so signatures stay comparable across runs
+_rng = np.random.default_rng(20240)
+_MULTIPLIERS = _rng.integers(1, 2**63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_INCREMENTS = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64)
+
+# (source, chunk_index)
+ChunkKey = Tuple[str, int]
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """MinHash signature of a text's word shingles, or None if it has no words."""
+    words = WORD_PATTERN.findall(text.lower())
+    if not words:
+        return None
+    if len(words) < SHINGLE_WORDS:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # Multiply-shift hashing, one permutation per row; uint64 arithmetic wraps
+    permuted = (_MULTIPLIERS[:, None] * hashes[None, :] + _INCREMENTS[:, None]) >> np.uint64(32)
+    return permuted.min(axis=1).astype(np.uint32)
+
+class DedupIndex:
+    """Near-duplicate lookup over the signatures of stored chunks."""
+
+    def __init__(self, path: Optional[Path] = None, threshold: Optional[float] = None):
+        """Load the index from disk if it exists."""
+        self.path = path or Config.CHROMA_DB_PATH / "dedup_index.pkl"
+        self.threshold = Config.DEDUP_THRESHOLD if threshold is None else threshold
+        self.lock = threading.RLock()
+        self.signatures: Dict[ChunkKey, np.ndarray] = {}
+        self.buckets: List[Dict[bytes, Set[ChunkKey]]] = [defaultdict(set) for _ in range(BANDS)]
+        self.source_keys: Dict[str, Set[ChunkKey]] = defaultdict(set)
+        # Source holding the kept copy -> sources whose duplicates were skipped
+        self.dependents: Dict[str, Set[str]] = defaultdict(set)
+        self.dirty = False
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                state = pickle.load(f)
+            for key, signature in state['signatures'].items():
+                self._add(key, signature)
+            self.dependents = defaultdict(set, state['dependents'])
+        except Exception as e:
+            print(f"Error loading dedup index, starting empty: {e}")
+            self.clear()
+            self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def _add(self, key: ChunkKey, signature: np.ndarray):
+        self.signatures[key] = signature
+        for band in range(BANDS):
+            self.buckets[band][signature[band * ROWS:(band + 1) * ROWS].tobytes()].add(key)
+        self.source_keys[key[0]].add(key)
+
+    def _remove(self, key: ChunkKey):
+        signature = self.signatures.pop(key)
+        for band in range(BANDS):
+            band_key = signature[band * ROWS:(band + 1) * ROWS].tobytes()
+            bucket = self.buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band][band_key]
+
+    def find_duplicate(self, signature: np.ndarray) -> Optional[ChunkKey]:
+        """Key of an indexed chunk similar enough to count as a copy, or None."""
+        with self.lock:
+            candidates = set()
+            for band in range(BANDS):
+                bucket = self.buckets[band].get(signature[band * ROWS:(band + 1) * ROWS].tobytes())
+                if bucket:
+                    candidates.update(bucket)
+            best, best_similarity = None, self.threshold
+            for key in candidates:
+                similarity = float(np.mean(self.signatures[key] == signature))
+                if similarity >= best_similarity:
+                    best, best_similarity = key, similarity
+            return best
+
+    def claim(self, source: str, chunk_index: int, signature: np.ndarray) -> Optional[str]:
+        """
+        Index a chunk unless it duplicates one already indexed.
+
+        Check and insert happen under one lock, so two copies ingested at
+        the same time can't both be kept.
+
+        Returns:
+            None if the chunk was indexed (keep it), otherwise the source of
+            the chunk it duplicates (skip it)
+        """
+        with self.lock:
+            duplicate = self.find_duplicate(signature)
+            if duplicate is None:
+                self._add((source, chunk_index), signature)
+                self.dirty = True
+                return None
+            if duplicate[0] != source:
+                self.dependents[duplicate[0]].add(source)
+                self.dirty = True
+            return duplicate[0]
+
+    def release(self, source: str, chunk_index: int):
+        """Forget a claimed chunk that didn't get stored after all."""
+        with self.lock:
+            key = (source, chunk_index)
+            if key in self.signatures:
+                self._remove(key)
+                self.source_keys[source].discard(key)
+                self.dirty = True
+
+    def delete_by_source(self, source: str) -> List[str]:
+        """
+        Remove every chunk from a source.
+
+        Returns:
+            Other sources that had chunks skipped as copies of this one's;
+            they're missing those passages until re-ingested
+        """
+        with self.lock:
+            for key in self.source_keys.pop(source, ()):
+                self._remove(key)
+            dependents = self.dependents.pop(source, set())
+            dependents.discard(source)
+            self.dirty = True
+            return sorted(dependents)
+
+    def clear(self):
+        with self.lock:
+            self.signatures = {}
+            self.buckets = [defaultdict(set) for _ in range(BANDS)]
+            self.source_keys = defaultdict(set)
+            self.dependents = defaultdict(set)
+            self.dirty = True
+
+    def flush(self):
+        """Atomically persist the index if it changed."""
+        with self.lock:
+            if not self.dirty:
+                return
+            state = {
+                'signatures': self.signatures,
+                'dependents': dict(self.dependents)
+            }
+            tmp_path = self.path.with_suffix(".tmp")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
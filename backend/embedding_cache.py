@@ -0,0 +1,192 @@
+"""
+Persistent, content-addressed embedding cache backed by memory-mapped arrays.
+
+Vectors live in a float32 matrix on disk, keyed by a hash of the embedding
+model and the normalized chunk text, so re-embedding unchanged text is free.
+"""
+import hashlib
+import json
+import re
+import threading
+import unicodedata
+from pathlib import Path
+from typing import List, Dict, Optional
+import numpy as np
+from config import Config
+
+KEY_BYTES = 16
+INITIAL_CAPACITY = 1024
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different copies share a cache entry."""
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+class EmbeddingCache:
+    """Size-bounded on-disk embedding cache for a single embedding model."""
+
+    def __init__(self, model: str, path: Optional[Path] = None, max_entries: Optional[int] = None):
+        """Open (or create) the cache directory for a model."""
+        self.model = model
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+        self.path = (path or Config.EMBEDDING_CACHE_PATH) / safe_name
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max(1, max_entries or Config.EMBEDDING_CACHE_MAX_ENTRIES)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.dim = 0
+        self.capacity = 0
+        self.vectors = None
+        self.keys = None
+        self.ticks = None
+        self.index: Dict[bytes, int] = {}
+        self.free_slots: List[int] = []
+        self.tick = 0
+        self._load()
+
+    @property
+    def meta_path(self) -> Path:
+        return self.path / "meta.json"
+
+    def _key(self, text: str) -> bytes:
+        """Hash the model name and normalized text into a fixed-size key."""
+        return hashlib.blake2b(
+            f"{self.model}\x00{normalize_text(text)}".encode("utf-8"),
+            digest_size=KEY_BYTES
+        ).digest()
+
+    def _open_arrays(self, mode: str):
+        """Memory-map the vector, key and last-used arrays."""
+        self.vectors = np.memmap(self.path / "vectors.f32", dtype=np.float32, mode=mode,
+                                 shape=(self.capacity, self.dim))
+        self.keys = np.memmap(self.path / "keys.bin", dtype=np.uint8, mode=mode,
+                              shape=(self.capacity, KEY_BYTES))
+        # A tick of 0 marks an empty slot
+        self.ticks = np.memmap(self.path / "ticks.u64", dtype=np.uint64, mode=mode,
+                               shape=(self.capacity,))
+
+    def _load(self):
+        """Load an existing cache and rebuild the in-memory key index."""
+        if not self.meta_path.exists():
+            return
+        try:
+            meta = json.loads(self.meta_path.read_text())
+            self.dim = int(meta['dim'])
+            self.capacity = int(meta['capacity'])
+            self._open_arrays("r+")
+        except Exception as e:
+            print(f"Error loading embedding cache {self.path}, starting empty: {e}")
+            self.dim = self.capacity = 0
+            self.vectors = self.keys = self.ticks = None
+            return
+
+        used = np.nonzero(self.ticks)[0]
+        self.index = {self.keys[slot].tobytes(): int(slot) for slot in used}
+        self.free_slots = sorted(set(range(self.capacity)) - set(int(s) for s in used), reverse=True)
+        self.tick = int(self.ticks.max()) if self.capacity else 0
+
+    def _write_meta(self):
+        self.meta_path.write_text(json.dumps({
+            'model': self.model,
+            'dim': self.dim,
+            'capacity': self.capacity
+        }))
+
+    def _grow(self, dim: int):
+        """Create the arrays on first use, or double their capacity."""
+        if self.capacity >= self.max_entries:
+            return
+        new_capacity = min(self.max_entries, max(INITIAL_CAPACITY, self.capacity * 2))
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.keys.flush()
+            self.ticks.flush()
+        self.vectors = self.keys = self.ticks = None
+
+        self.dim = dim
+        for name, row_bytes in (("vectors.f32", dim * 4), ("keys.bin", KEY_BYTES), ("ticks.u64", 8)):
+            with open(self.path / name, "ab") as f:
+                f.truncate(new_capacity * row_bytes)
+        self.free_slots = list(range(new_capacity - 1, self.capacity - 1, -1)) + self.free_slots
+        self.capacity = new_capacity
+        self._open_arrays("r+")
+        self._write_meta()
+
+    def _evict(self):
+        """Free the least recently used tenth of the cache."""
+        used = np.nonzero(self.ticks)[0]
+        n_evict = max(1, len(used) // 10)
+        oldest = used[np.argpartition(self.ticks[used], n_evict - 1)[:n_evict]]
+        for slot in oldest:
+            self.index.pop(self.keys[slot].tobytes(), None)
+            self.ticks[slot] = 0
+            self.free_slots.append(int(slot))
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return cached embeddings for texts, with None for misses."""
+        results: List[Optional[List[float]]] = []
+        with self.lock:
+            for text in texts:
+                slot = self.index.get(self._key(text))
+                if slot is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                self.hits += 1
+                self.tick += 1
+                self.ticks[slot] = self.tick
+                results.append(self.vectors[slot].tolist())
+        return results
+
+    def put_many(self, texts: List[str], embeddings: List[List[float]]):
+        """Store embeddings for texts, evicting old entries when full."""
+        with self.lock:
+            for text, embedding in zip(texts, embeddings):
+                if embedding is None:
+                    continue
+                if self.dim and len(embedding) != self.dim:
+                    print(f"Skipping cache write: expected dimension {self.dim}, got {len(embedding)}")
+                    continue
+                key = self._key(text)
+                slot = self.index.get(key)
+                if slot is None:
+                    if not self.free_slots:
+                        self._grow(len(embedding))
+                    if not self.free_slots:
+                        self._evict()
+                    slot = self.free_slots.pop()
+                    self.keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                    self.index[key] = slot
+                self.vectors[slot] = embedding
+                self.tick += 1
+                self.ticks[slot] = self.tick
+
+    def flush(self):
+        """Flush memory-mapped arrays and the metadata to disk."""
+        with self.lock:
+            if self.vectors is not None:
+                self.vectors.flush()
+                self.keys.flush()
+                self.ticks.flush()
+                self._write_meta()
+
+    def clear(self):
+        """Drop every cached embedding."""
+        with self.lock:
+            if self.ticks is not None:
+                self.ticks[:] = 0
+            self.index = {}
+            self.free_slots = list(range(self.capacity - 1, -1, -1))
+            self.tick = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Get cache occupancy and hit/miss counters."""
+        return {
+            'entries': len(self.index),
+            'capacity': self.capacity,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses
+        }
@@ -0,0 +1,131 @@
+"""
+Batched, concurrent embedding generation using Ollama's multi-input embed API.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+from config import Config
+from embedding_cache import EmbeddingCache
+from generation import parse_keep_alive
+from lazy import LazyInstance
+
+class EmbeddingEngine:
+    """Embeds texts in batches, keeping several batches in flight at once."""
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ):
+        """Initialize the engine, its Ollama clients and worker pool."""
+        import ollama
+        self.client = ollama.Client(host=Config.OLLAMA_BASE_URL)
+        self.async_client = ollama.AsyncClient(host=Config.OLLAMA_BASE_URL)
+        self.model = model or Config.EMBEDDING_MODEL
+        self.batch_size = max(1, batch_size or Config.EMBEDDING_BATCH_SIZE)
+        self.concurrency = max(1, concurrency or Config.EMBEDDING_CONCURRENCY)
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.concurrency,
+            thread_name_prefix="embed"
+        )
+        self.cache = EmbeddingCache(self.model) if Config.EMBEDDING_CACHE_ENABLED else None
+        self.keep_alive = parse_keep_alive(Config.OLLAMA_KEEP_ALIVE)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch of texts in a single request."""
+        response = self.client.embed(model=self.model, input=texts, keep_alive=self.keep_alive)
+        embeddings = response['embeddings']
+        if len(embeddings) != len(texts):
+            raise ValueError(
+                f"Expected {len(texts)} embeddings, got {len(embeddings)}"
+            )
+        return embeddings
+
+    def embed(self, texts: List[str]) -> Dict[str, Any]:
+        """
+        Embed texts in batches, preserving input order.
+
+        Cached embeddings are reused; only cache misses are sent to Ollama.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            Dict with 'embeddings' (one entry per input, None where the batch
+            failed), 'failed_batches' (list of dicts with 'start', 'end' and
+            'error', as positions in the cache-miss list), 'cache_hits',
+            'elapsed' seconds and 'chunks_per_sec'
+        """
+        start_time = time.perf_counter()
+        if self.cache:
+            embeddings = self.cache.get_many(texts)
+        else:
+            embeddings = [None] * len(texts)
+        missing = [i for i, emb in enumerate(embeddings) if emb is None]
+        missing_texts = [texts[i] for i in missing]
+        failed_batches = []
+
+        # Submit every batch up front; the pool bounds how many are in flight
+        futures = []
+        for start in range(0, len(missing_texts), self.batch_size):
+            batch = missing_texts[start:start + self.batch_size]
+            futures.append((start, self.executor.submit(self._embed_batch, batch)))
+
+        for start, future in futures:
+            end = min(start + self.batch_size, len(missing_texts))
+            try:
+                batch_embeddings = future.result()
+            except Exception as e:
+                print(f"Error generating embeddings for chunks {start}-{end - 1}: {e}")
+                failed_batches.append({
+                    'start': start,
+                    'end': end,
+                    'error': str(e)
+                })
+                continue
+            for offset, embedding in enumerate(batch_embeddings):
+                embeddings[missing[start + offset]] = embedding
+            if self.cache:
+                self.cache.put_many(missing_texts[start:end], batch_embeddings)
+
+        elapsed = time.perf_counter() - start_time
+        embedded = len(texts) - sum(b['end'] - b['start'] for b in failed_batches)
+        return {
+            'embeddings': embeddings,
+            'failed_batches': failed_batches,
+            'cache_hits': len(texts) - len(missing),
+            'elapsed': elapsed,
+            'chunks_per_sec': embedded / elapsed if elapsed > 0 else 0.0
+        }
+
+    def embed_one(self, text: str) -> List[float]:
+        """Embed a single text, returning an empty list on failure."""
+        embedding = self.embed([text])['embeddings'][0]
+        return embedding or []
+
+    async def aembed_one(self, text: str) -> List[float]:
+        """Embed a single text without blocking the event loop."""
+        if self.cache:
+            cached = self.cache.get_many([text])[0]
+            if cached is not None:
+                return cached
+        try:
+            response = await self.async_client.embed(
+                model=self.model, input=[text], keep_alive=self.keep_alive
+            )
+            embedding = response['embeddings'][0]
+        except Exception as e:
+            print(f"Error generating embedding: {e}")
+            return []
+        if self.cache:
+            self.cache.put_many([text], [embedding])
+        return embedding
+
+    def flush(self):
+        """Persist the embedding cache."""
+        if self.cache:
+            self.cache.flush()
+
+# Global instance, created on first use
+embedding_engine = LazyInstance(EmbeddingEngine)
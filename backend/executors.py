@@ -0,0 +1,40 @@
+"""
+Bounded executors for running blocking work off the event loop.
+
+Chroma queries and other short blocking calls share the I/O pool; long
+ingestion jobs get their own small pool so they can never starve queries.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor, Executor
+from typing import Any, Callable
+from config import Config
+from profiler import profiler
+
+io_executor = ThreadPoolExecutor(
+    max_workers=Config.IO_WORKERS,
+    thread_name_prefix="io"
+)
+
+ingest_executor = ThreadPoolExecutor(
+    max_workers=Config.INGEST_REQUEST_WORKERS,
+    thread_name_prefix="ingest"
+)
+
+async def run_blocking(executor: Executor, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking callable in an executor and await its result.
+
+    The callable sees the caller's context variables (request ID, stage
+    timings), like asyncio.to_thread, and shows up in the request's
+    profile if it is being profiled.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(ctx.run, profiler.bind(fn), *args, **kwargs))
+
+def shutdown():
+    """Stop accepting work and wait for running tasks to finish."""
+    io_executor.shutdown(wait=True)
+    ingest_executor.shutdown(wait=True)
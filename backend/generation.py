@@ -0,0 +1,260 @@
+"""
+LLM generation: prompt layout, keep-alive and model warm-up.
+
+Messages always start with the same system prompt, followed by the
+conversation history, so consecutive requests share a prompt prefix the
+runtime can reuse from its KV cache instead of re-evaluating it. Both models
+are kept loaded with keep_alive and warmed in the background at startup, so
+the first real request doesn't pay the load time.
+"""
+import asyncio
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator, Union, TYPE_CHECKING
+from config import Config
+from metrics import record_generation, log_event
+from lazy import LazyInstance
+
+if TYPE_CHECKING:
+    import ollama
+
+# Use options to speed up generation
+GENERATION_OPTIONS = {
+    'temperature': 0.7,
+    'num_predict': 256,  # Shorter responses for faster generation
+    'num_ctx': 2048,  # Limit context window; changing it makes Ollama reload the model
+}
+
+# Simplified for faster generation; must not change between requests
+SYSTEM_PROMPT = """You are a helpful AI assistant. Answer based on the provided context. Use [Citation X] when referencing sources. Be concise."""
+
+def parse_keep_alive(value: str) -> Union[float, str]:
+    """Ollama takes seconds as a number or a duration string like "30m"."""
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+class GenerationManager:
+    """Builds prompts, runs chat completions and keeps the models warm."""
+
+    def __init__(self, client: Optional['ollama.AsyncClient'] = None):
+        """Initialize the Ollama client and per-model warm-up state."""
+        if client is None:
+            import ollama
+            client = ollama.AsyncClient(host=Config.OLLAMA_BASE_URL)
+        self.client = client
+        self.model = Config.OLLAMA_MODEL
+        self.embedding_model = Config.EMBEDDING_MODEL
+        self.keep_alive = parse_keep_alive(Config.OLLAMA_KEEP_ALIVE)
+        self.warmup_task: Optional[asyncio.Task] = None
+        self.warmup_state: Dict[str, Dict[str, Any]] = {
+            model: {'state': 'cold', 'load_ms': None, 'error': None}
+            for model in (self.model, self.embedding_model)
+        }
+        # Last loaded-models answer and when it was fetched, reused by status()
+        self.loaded_models: Optional[Dict[str, Dict[str, Any]]] = None
+        self.loaded_checked_at: Optional[float] = None
+
+    def history_window(self, conversation_history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Pick the history messages to send.
+
+        The window start moves in steps of half the window rather than one
+        message per turn, so most turns extend the previous prompt instead
+        of shifting it.
+        """
+        window = Config.HISTORY_MAX_MESSAGES
+        if window <= 0:
+            return []
+        step = max(1, window // 2)
+        overflow = max(0, len(conversation_history) - window)
+        start = -(-overflow // step) * step  # Round up to a whole step
+        return conversation_history[start:]
+
+    def build_messages(
+        self,
+        query: str,
+        context: str,
+        conversation_history: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Build the chat messages sent to the LLM.
+
+        Stable parts come first: the system prompt, then the conversation
+        so far. Retrieved context changes every turn, so it travels only in
+        the final user message.
+
+        Args:
+            query: User query
+            context: Retrieved context with citations
+            conversation_history: Previous conversation messages
+
+        Returns:
+            List of chat messages
+        """
+        messages = [{
+            'role': 'system',
+            'content': SYSTEM_PROMPT
+        }]
+        for msg in self.history_window(conversation_history or []):
+            messages.append({
+                'role': msg.get('role', 'user'),
+                'content': msg.get('content', '')
+            })
+
+        user_prompt = f"""Context:
+{context}
+
+Question: {query}
+
+Answer briefly based on the context. Cite sources with [Citation X]."""
+        messages.append({
+            'role': 'user',
+            'content': user_prompt
+        })
+        return messages
+
+    async def chat(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Run a chat completion, raising on failure."""
+        response = await self.client.chat(
+            model=self.model,
+            messages=messages,
+            options=GENERATION_OPTIONS,
+            keep_alive=self.keep_alive
+        )
+        self.record(response)
+        return response
+
+    async def stream_chat(self, messages: List[Dict[str, str]]) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a chat completion part by part, raising on failure."""
+        async for part in await self.client.chat(
+            model=self.model,
+            messages=messages,
+            options=GENERATION_OPTIONS,
+            stream=True,
+            keep_alive=self.keep_alive
+        ):
+            if part.get('done'):
+                self.record(part)
+            yield part
+
+    def record(self, response: Dict[str, Any]):
+        """Record token counts and throughput from a finished completion."""
+        stats = record_generation(self.model, response)
+        load_ns = response.get('load_duration')
+        log_event(
+            'generation',
+            model=self.model,
+            load_ms=round(load_ns / 1e6, 1) if load_ns else None,
+            **stats
+        )
+
+    def start_warmup(self):
+        """Warm both models in the background."""
+        if self.warmup_task is None or self.warmup_task.done():
+            self.warmup_task = asyncio.ensure_future(self.warmup())
+
+    def stop_warmup(self):
+        if self.warmup_task is not None and not self.warmup_task.done():
+            self.warmup_task.cancel()
+
+    async def _warm(self, model: str, load):
+        state = self.warmup_state[model]
+        state['state'] = 'warming'
+        start = time.perf_counter()
+        try:
+            await load()
+        except Exception as e:
+            print(f"Error warming up {model}: {e}")
+            state['state'] = 'failed'
+            state['error'] = str(e)
+            return
+        state['state'] = 'ready'
+        state['error'] = None
+        state['load_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        # The model is loaded now, so a cached loaded-models answer is stale
+        self.loaded_checked_at = None
+
+    async def warmup(self):
+        """
+        Load both models and prime the chat model with the system prompt.
+
+        The chat warm-up uses the same options as real requests (only
+        num_predict differs), so Ollama doesn't reload the model for the
+        first question, and the system prompt prefix is already evaluated.
+        """
+        async def load_chat_model():
+            await self.client.chat(
+                model=self.model,
+                messages=[{'role': 'system', 'content': SYSTEM_PROMPT}],
+                options={**GENERATION_OPTIONS, 'num_predict': 1},
+                keep_alive=self.keep_alive
+            )
+
+        async def load_embedding_model():
+            await self.client.embed(
+                model=self.embedding_model,
+                input=["warm-up"],
+                keep_alive=self.keep_alive
+            )
+
+        await asyncio.gather(
+            self._warm(self.model, load_chat_model),
+            self._warm(self.embedding_model, load_embedding_model)
+        )
+
+    async def _loaded_models(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Ask Ollama which models are loaded, keyed by name with and without tag.
+
+        The answer is reused for OLLAMA_STATUS_CACHE_SECONDS, and a slow
+        Ollama is given up on after OLLAMA_STATUS_TIMEOUT_SECONDS, so status
+        polling never waits on it for long. Returns None if Ollama couldn't
+        be asked.
+        """
+        now = time.monotonic()
+        if self.loaded_checked_at is not None and now - self.loaded_checked_at < Config.OLLAMA_STATUS_CACHE_SECONDS:
+            return self.loaded_models
+
+        loaded: Optional[Dict[str, Dict[str, Any]]] = None
+        try:
+            response = await asyncio.wait_for(self.client.ps(), Config.OLLAMA_STATUS_TIMEOUT_SECONDS)
+            loaded = {}
+            for entry in response.get('models', []):
+                # Ollama reports names with a tag, e.g. "phi3:latest"
+                loaded[entry['name']] = entry
+                loaded.setdefault(entry['name'].split(':')[0], entry)
+        except asyncio.TimeoutError:
+            print(f"Error checking loaded models: Ollama didn't answer within {Config.OLLAMA_STATUS_TIMEOUT_SECONDS}s")
+        except Exception as e:
+            print(f"Error checking loaded models: {e}")
+
+        # Failures are cached too, so an unreachable Ollama isn't retried on every poll
+        self.loaded_models = loaded
+        self.loaded_checked_at = time.monotonic()
+        return loaded
+
+    async def status(self) -> Dict[str, Any]:
+        """
+        Report which models Ollama currently has loaded.
+
+        Returns:
+            Dict per model with 'loaded' (None if Ollama couldn't be
+            asked), 'expires_at', 'size_vram' and the warm-up 'state',
+            'load_ms' and 'error'
+        """
+        loaded = await self._loaded_models()
+
+        models = {}
+        for model, state in self.warmup_state.items():
+            entry = loaded.get(model) if loaded is not None else None
+            models[model] = {
+                'loaded': entry is not None if loaded is not None else None,
+                'expires_at': str(entry.get('expires_at')) if entry else None,
+                'size_vram': entry.get('size_vram') if entry else None,
+                **state
+            }
+        return models
+
+# Global instance, created on first use
+generation_manager = LazyInstance(GenerationManager)
@@ -0,0 +1,332 @@
+"""
+Staged, parallel ingestion pipeline.
+
+Files flow through three stages connected by bounded queues:
+extraction and splitting in a process pool (CPU-bound), embedding in a
+thread pool (I/O-bound), and a single writer that batches chunks from many
+files into vector store writes through a BulkWriter. A file is committed
+to the manifest once its last chunk has been written. Backpressure comes
+from the queue bounds.
+
+Large PDFs skip the process pool: an embed thread reads them a window of
+pages at a time and hands each window's chunks to the writer as a
+separate segment, so memory stays bounded and the first chunks are
+stored while later pages are still being read.
+"""
+import contextvars
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from config import Config
+from manifest import hash_file
+from partitions import Partition, partition_manager
+from metrics import ingest_stage, observe_ingest_stage, record_ingest_result
+from profiler import profiler
+
+# Marks the end of a stage's input
+_DONE = object()
+
+def _extract_worker(path_str: str, need_hash: bool) -> Dict[str, Any]:
+    """Extract, split and optionally hash a file (runs in a worker process)."""
+    from ingestion import ingester
+    file_path = Path(path_str)
+    timings: Dict[str, float] = {}
+    try:
+        sha256 = hash_file(file_path) if need_hash else None
+        return {
+            'chunks': ingester.split_file(file_path, timings),
+            'sha256': sha256,
+            'error': None,
+            'timings': timings
+        }
+    except Exception as e:
+        return {'chunks': None, 'sha256': None, 'error': str(e), 'timings': timings}
+
+class IngestionPipeline:
+    """Runs extract → split → embed → store with overlapping stages."""
+
+    def __init__(
+        self,
+        extract_workers: Optional[int] = None,
+        embed_workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        write_batch_size: Optional[int] = None,
+        partition: Optional[Partition] = None
+    ):
+        """
+        Initialize stage sizes (defaults come from Config).
+
+        Files are written to the given partition (the default partition if None).
+        """
+        self.partition = partition or partition_manager.get()
+        self.extract_workers = max(1, extract_workers or Config.INGEST_EXTRACT_WORKERS)
+        self.embed_workers = max(1, embed_workers or Config.INGEST_EMBED_WORKERS)
+        self.queue_size = max(1, queue_size or Config.INGEST_QUEUE_SIZE)
+        self.write_batch_size = max(1, write_batch_size or Config.INGEST_WRITE_BATCH_SIZE)
+
+    def run(
+        self,
+        files: List[Tuple[Path, Dict[str, Any]]],
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Ingest files through the pipeline.
+
+        Args:
+            files: (file_path, file_state) pairs, where file_state is the
+                result of manifest.check() for that file
+            on_result: Called with each file's result once it is committed
+                to the vector store (or has failed)
+            should_stop: Polled before each file is submitted; returning True
+                stops submitting new files
+
+        Returns:
+            One result dict per file with 'source', 'success',
+            'chunks_created' and 'message'
+        """
+        from ingestion import ingester
+
+        results: List[Dict[str, Any]] = []
+        # Per-file state, owned by the writer thread
+        file_states: Dict[str, Dict[str, Any]] = {}
+        results_lock = threading.Lock()
+        extracted: queue.Queue = queue.Queue()
+        to_write: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        # Bounds files between submission to extraction and hand-off to the writer
+        in_flight = threading.BoundedSemaphore(self.queue_size)
+
+        def record(file_path: Path, success: bool, chunks_created: int, message: str, chunks_deduplicated: int = 0):
+            result = {
+                'source': str(file_path),
+                'success': success,
+                'chunks_created': chunks_created,
+                'chunks_deduplicated': chunks_deduplicated,
+                'message': message
+            }
+            with results_lock:
+                results.append(result)
+            record_ingest_result(result)
+            if on_result:
+                try:
+                    on_result(result)
+                except Exception as e:
+                    print(f"Error in ingest progress callback: {e}")
+
+        def embed_stage():
+            while True:
+                item = extracted.get()
+                if item is _DONE:
+                    break
+                file_path, file_state, extraction = item
+                # Every file ends with an end marker telling the writer how it went
+                error = None
+                try:
+                    if extraction is None:
+                        # Large PDF: read it here, a window of pages at a time
+                        if file_state['sha256'] is None:
+                            file_state['sha256'] = hash_file(file_path)
+                        timings: Dict[str, float] = {}
+                        segments = ingester.iter_chunks(file_path, timings)
+                    else:
+                        # Worker processes can't update our metrics, so they report timings back
+                        timings = extraction.get('timings', {})
+                        if extraction['error']:
+                            raise RuntimeError(extraction['error'])
+                        if extraction['sha256']:
+                            file_state['sha256'] = extraction['sha256']
+                        segments = [extraction['chunks']] if extraction['chunks'] else []
+
+                    chunks_seen = 0
+                    # This file's chunks from a previous ingest mustn't count as copies
+                    ingester.forget_source(str(file_path), self.partition)
+                    try:
+                        for chunks in segments:
+                            segment = ingester.embed_chunks(file_path, chunks, chunks_seen, self.partition)
+                            chunks_seen += len(chunks)
+                            to_write.put({'file_path': file_path, **segment})
+                    finally:
+                        for stage, seconds in timings.items():
+                            observe_ingest_stage(stage, seconds)
+                    if chunks_seen == 0:
+                        error = f"No text extracted from {file_path.name}"
+                except Exception as e:
+                    error = f"Error ingesting {file_path.name}: {str(e)}"
+                finally:
+                    to_write.put({'file_path': file_path, 'file_state': file_state, 'end': True, 'error': error})
+                    in_flight.release()
+
+        # Set if the writer fails; it then only drains the queue so producers never block
+        writer_failure: List[BaseException] = []
+
+        def write_stage():
+            finished = []
+            try:
+                with self.partition.store.bulk_writer(self.write_batch_size) as writer:
+                    while True:
+                        item = to_write.get()
+                        if item is _DONE:
+                            with ingest_stage('store'):
+                                writer.flush()
+                        elif item.get('end'):
+                            finished.append(item)
+                        else:
+                            self._write_segment(writer, item, file_states)
+                        # A file's segments all precede its end marker, so a finished
+                        # file with nothing left in the writer is fully written
+                        done = [end for end in finished if not writer.pending(str(end['file_path']))]
+                        if done:
+                            finished = [end for end in finished if writer.pending(str(end['file_path']))]
+                            self._finish_files(done, file_states, writer, record)
+                        if item is _DONE:
+                            return
+            except Exception as e:
+                print(f"Error in ingest writer: {e}")
+                writer_failure.append(e)
+
+            # Files not yet committed fail; the queue is drained until the embed stage is done
+            for end in finished:
+                record(end['file_path'], False, 0, f"Error storing {end['file_path'].name}: {writer_failure[0]}")
+            while True:
+                item = to_write.get()
+                if item is _DONE:
+                    break
+                if item.get('end'):
+                    record(item['file_path'], False, 0, f"Error storing {item['file_path'].name}: {writer_failure[0]}")
+
+        # Stage threads run in copies of the caller's context so timings (and profiles) land on its request
+        embed_threads = [
+            threading.Thread(
+                target=contextvars.copy_context().run, args=(profiler.bind(embed_stage),),
+                name=f"ingest-embed-{i}", daemon=True
+            )
+            for i in range(self.embed_workers)
+        ]
+        writer = threading.Thread(
+            target=contextvars.copy_context().run, args=(profiler.bind(write_stage),),
+            name="ingest-writer", daemon=True
+        )
+        for thread in embed_threads:
+            thread.start()
+        writer.start()
+
+        with ProcessPoolExecutor(max_workers=self.extract_workers) as pool:
+            for file_path, file_state in files:
+                in_flight.acquire()
+                if should_stop and should_stop():
+                    in_flight.release()
+                    break
+                if self.should_stream(file_path, file_state):
+                    extracted.put((file_path, file_state, None))
+                    continue
+                future = pool.submit(_extract_worker, str(file_path), file_state['sha256'] is None)
+
+                def on_extracted(f, file_path=file_path, file_state=file_state):
+                    try:
+                        extraction = f.result()
+                    except Exception as e:
+                        extraction = {'chunks': None, 'sha256': None, 'error': str(e)}
+                    extracted.put((file_path, file_state, extraction))
+
+                future.add_done_callback(on_extracted)
+
+        # The pool has drained, so every extraction is queued ahead of these
+        for _ in embed_threads:
+            extracted.put(_DONE)
+        for thread in embed_threads:
+            thread.join()
+        to_write.put(_DONE)
+        writer.join()
+        if writer_failure:
+            raise writer_failure[0]
+
+        return results
+
+    def should_stream(self, file_path: Path, file_state: Dict[str, Any]) -> bool:
+        """Whether a file is read page by page in the embed stage."""
+        return (file_path.suffix.lower() == '.pdf'
+                and file_state['size'] >= Config.INGEST_STREAM_MIN_MB * 1024 * 1024)
+
+    def _write_segment(self, writer, segment: Dict[str, Any], file_states: Dict[str, Dict[str, Any]]):
+        """Hand one segment's chunks to the writer, which batches them with other files'."""
+        source = str(segment['file_path'])
+        state = file_states.setdefault(source, self._new_file_state())
+        state['failed'] += segment['failed']
+        state['duplicates'] += segment['duplicates']
+        state['duplicate_of'] |= segment['duplicate_of']
+        if not segment['texts']:
+            return
+
+        with ingest_stage('store'):
+            if not state['replaced']:
+                # Chunks from previous versions are dropped before the first new ones are written
+                if source in self.partition.manifest:
+                    writer.replace(source)
+                state['replaced'] = True
+            writer.add(segment['texts'], segment['metadatas'], segment['embeddings'])
+        state['chunks'] += len(segment['texts'])
+
+    @staticmethod
+    def _new_file_state() -> Dict[str, Any]:
+        return {'chunks': 0, 'failed': 0, 'duplicates': 0, 'duplicate_of': set(), 'replaced': False}
+
+    def _finish_files(self, finished: List[Dict[str, Any]], file_states: Dict[str, Dict[str, Any]], writer, record):
+        """Commit fully written files to the manifest and report every finished file."""
+        from ingestion import ingester
+        manifest = self.partition.manifest
+        changed = False
+        for end in finished:
+            file_path = end['file_path']
+            source = str(file_path)
+            try:
+                state = file_states.pop(source, None) or self._new_file_state()
+                store_error = writer.errors.pop(source, None)
+                error = end['error'] or (store_error and f"Error storing {file_path.name}: {store_error}")
+                if error is None and state['chunks'] == 0 and (state['failed'] or not state['duplicates']):
+                    error = f"Failed to generate embeddings for {file_path.name}"
+                if error is not None:
+                    ingester.forget_source(source, self.partition)
+                    if state['replaced']:
+                        # Don't leave a partial copy indexed; the file is retried next time
+                        try:
+                            self.partition.store.delete_by_source(source)
+                            manifest.remove(source)
+                            changed = True
+                        except Exception as e:
+                            print(f"Error removing partial chunks of {file_path.name}: {e}")
+                    record(file_path, False, 0, error)
+                    continue
+
+                if state['chunks'] == 0 and source in manifest:
+                    # Every chunk is a copy of one from another file; nothing replaced the old ones
+                    self.partition.store.delete_by_source(source)
+                file_state = end['file_state']
+                manifest.update(
+                    source,
+                    size=file_state['size'],
+                    mtime=file_state['mtime'],
+                    sha256=file_state['sha256'],
+                    chunks=state['chunks']
+                )
+                changed = True
+                if state['chunks'] == 0:
+                    copies = sorted(Path(other).name for other in state['duplicate_of'] if other != source)
+                    message = f"{file_path.name} duplicates already indexed {', '.join(copies)}"
+                else:
+                    message = f"Successfully ingested {file_path.name}"
+                    notes = []
+                    if state['failed']:
+                        notes.append(f"{state['failed']} chunks failed to embed")
+                    if state['duplicates']:
+                        notes.append(f"{state['duplicates']} duplicate chunks skipped")
+                    if notes:
+                        message += f" ({', '.join(notes)})"
+                record(file_path, True, state['chunks'], message, state['duplicates'])
+            except Exception as e:
+                # One file failing to commit mustn't stop the writer
+                print(f"Error committing {file_path.name}: {e}")
+                record(file_path, False, 0, f"Error storing {file_path.name}: {e}")
+        if changed:
+            manifest.save()
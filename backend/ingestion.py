@@ -1,42 +1,50 @@
 """
 Document ingestion pipeline for processing PDFs, Markdown, text files, and emails.
 """
+import bisect
 import os
-import fitz  # PyMuPDF
-import email
-from email import policy
-from email.parser import BytesParser
+import time
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-from bs4 import BeautifulSoup
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-import ollama
+from typing import List, Dict, Any, Optional, Callable, Set, Iterable, Iterator, Tuple
 from config import Config
-from vector_store import vector_store
+from embeddings import embedding_engine
+from manifest import hash_file
+from partitions import Partition, partition_manager
+from ingest_pipeline import IngestionPipeline
+from metrics import ingest_stage, observe_ingest_stage, record_ingest_result
+from lazy import LazyInstance
+from chunker import TextChunker
+from context_packer import estimate_tokens
+from dedup_index import minhash
 
-# Configure Ollama client
-ollama_client = ollama.Client(host=Config.OLLAMA_BASE_URL)
+# PDFs are split once this much page text has been read; bounds memory per file
+PAGE_WINDOW_CHARS = 200_000
 
 class DocumentIngester:
     """Handles ingestion of various document types."""
     
     def __init__(self):
         """Initialize the ingester with text splitter."""
-        self.text_splitter = RecursiveCharacterTextSplitter(
+        self.text_splitter = TextChunker(
             chunk_size=Config.CHUNK_SIZE,
             chunk_overlap=Config.CHUNK_OVERLAP,
-            length_function=len,
+            length_function=estimate_tokens if Config.CHUNK_UNIT == "tokens" else None
         )
     
-    def extract_text_from_pdf(self, file_path: Path) -> str:
-        """Extract text from PDF file."""
+    def iter_pdf_pages(self, file_path: Path) -> Iterator[Tuple[int, str]]:
+        """Yield (page number, text) for each page of a PDF, numbered from 1."""
+        import fitz  # PyMuPDF
+        doc = fitz.open(file_path)
         try:
-            doc = fitz.open(file_path)
-            text = ""
             for page in doc:
-                text += page.get_text()
+                yield page.number + 1, page.get_text()
+        finally:
             doc.close()
-            return text
+    
+    def extract_text_from_pdf(self, file_path: Path) -> str:
+        """Extract text from PDF file."""
+        try:
+            return "".join(text for _, text in self.iter_pdf_pages(file_path))
         except Exception as e:
             print(f"Error reading PDF {file_path}: {e}")
             return ""
@@ -62,6 +70,8 @@ class DocumentIngester:
     def extract_text_from_email(self, file_path: Path) -> str:
         """Extract text from .eml email file."""
         try:
+            from email import policy
+            from email.parser import BytesParser
             with open(file_path, 'rb') as f:
                 msg = BytesParser(policy=policy.default).parse(f)
             
@@ -96,6 +106,7 @@ class DocumentIngester:
                         payload = part.get_payload(decode=True)
                         if payload:
                             html = payload.decode('utf-8', errors='ignore')
+                            from bs4 import BeautifulSoup
                             soup = BeautifulSoup(html, 'html.parser')
                             text_parts.append(soup.get_text())
             else:
@@ -104,6 +115,7 @@ class DocumentIngester:
                     content_type = msg.get_content_type()
                     if content_type == "text/html":
                         html = payload.decode('utf-8', errors='ignore')
+                        from bs4 import BeautifulSoup
                         soup = BeautifulSoup(html, 'html.parser')
                         text_parts.append(soup.get_text())
                     else:
@@ -130,75 +142,410 @@ class DocumentIngester:
             print(f"Unsupported file type: {suffix}")
             return None
     
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for text chunks using Ollama."""
-        embeddings = []
-        for text in texts:
+    def split_text(self, text: str) -> List[Dict[str, Any]]:
+        """Split text into chunks with their 'text', 'start_offset' and 'end_offset'."""
+        return self.text_splitter.split_text(text)
+    
+    def split_pages(
+        self,
+        pages: Iterable[Tuple[int, str]],
+        window_chars: int = PAGE_WINDOW_CHARS,
+        timings: Optional[Dict[str, float]] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Split page texts into chunks a window of pages at a time.
+        
+        Each time window_chars more characters of page text have been read,
+        the chunks that are settled so far are yielded (see ChunkStream);
+        only the text the rest can still depend on is kept. The chunks are
+        the same as splitting the concatenated page texts at once.
+        
+        Args:
+            pages: (page number, text) pairs in order
+            window_chars: Characters of page text to read between splits
+            timings: If given, accumulates the seconds spent splitting in 'split'
+        
+        Yields:
+            Lists of chunks with 'text', 'start_offset' and 'end_offset'
+            (into the concatenated page texts), 'page_start' and 'page_end'
+        """
+        stream = self.text_splitter.stream()
+        page_offsets: List[int] = []  # Where each page starts in the concatenated page texts
+        page_numbers: List[int] = []
+        
+        def split(final: bool = False) -> List[Dict[str, Any]]:
+            start = time.perf_counter()
+            chunks = stream.split(final)
+            for chunk in chunks:
+                chunk_start, chunk_end = chunk['start_offset'], chunk['end_offset']
+                chunk['page_start'] = page_numbers[bisect.bisect_right(page_offsets, chunk_start) - 1]
+                chunk['page_end'] = page_numbers[bisect.bisect_right(page_offsets, max(chunk_end - 1, chunk_start)) - 1]
+            if timings is not None:
+                timings['split'] = timings.get('split', 0.0) + time.perf_counter() - start
+            return chunks
+        
+        for page_number, text in pages:
+            page_offsets.append(stream.end)
+            page_numbers.append(page_number)
+            stream.feed(text)
+            if stream.pending < window_chars:
+                continue
+            chunks = split()
+            # Keep the pages the remaining text spans
+            first = bisect.bisect_right(page_offsets, stream.base) - 1
+            del page_offsets[:first], page_numbers[:first]
+            if chunks:
+                yield chunks
+        
+        chunks = split(final=True)
+        if chunks:
+            yield chunks
+    
+    def iter_chunks(self, file_path: Path, timings: Optional[Dict[str, float]] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Extract and split a file, yielding its chunks in segments.
+        
+        PDFs are read a window of pages at a time, so only one window of
+        text is in memory and the first chunks are ready after the first
+        pages; their chunks carry 'page_start' and 'page_end'. Other files
+        come as a single segment. Nothing is yielded if the file has no text.
+        
+        Args:
+            file_path: File to split
+            timings: If given, accumulates the seconds spent in 'extract' and 'split'
+        
+        Yields:
+            Lists of chunk dicts with 'text' and its 'start_offset' and
+            'end_offset' in the file's extracted text
+        """
+        if timings is None:
+            timings = {}
+        timings.setdefault('extract', 0.0)
+        timings.setdefault('split', 0.0)
+        
+        if file_path.suffix.lower() == '.pdf':
+            pages = self._timed(self.iter_pdf_pages(file_path), timings, 'extract')
+            yield from self.split_pages(pages, timings=timings)
+            return
+        
+        start = time.perf_counter()
+        text = self.extract_text(file_path)
+        timings['extract'] += time.perf_counter() - start
+        if not text or not text.strip():
+            return
+        start = time.perf_counter()
+        chunks = self.split_text(text)
+        timings['split'] += time.perf_counter() - start
+        if chunks:
+            yield chunks
+    
+    @staticmethod
+    def _timed(items: Iterable, timings: Dict[str, float], stage: str) -> Iterator:
+        """Pass items through, adding the time spent producing them to timings[stage]."""
+        iterator = iter(items)
+        while True:
+            start = time.perf_counter()
             try:
-                response = ollama_client.embeddings(
-                    model=Config.EMBEDDING_MODEL,
-                    prompt=text
-                )
-                embeddings.append(response['embedding'])
-            except Exception as e:
-                print(f"Error generating embedding: {e}")
-                # Return zero vector as fallback
-                embeddings.append([0.0] * 384)  # Default dimension
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                timings[stage] += time.perf_counter() - start
+            yield item
+    
+    def split_file(self, file_path: Path, timings: Optional[Dict[str, float]] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Extract text from a file and split it into chunks.
         
-        return embeddings
+        Args:
+            file_path: File to split
+            timings: If given, receives the seconds spent in 'extract' and 'split'
+        
+        Returns:
+            List of chunk dicts (see iter_chunks), or None if no text could
+            be extracted
+        """
+        chunks = [chunk for segment in self.iter_chunks(file_path, timings) for chunk in segment]
+        return chunks or None
+    
+    def build_metadatas(self, file_path: Path, chunks: List[Dict[str, Any]], first_index: int = 0) -> List[Dict[str, Any]]:
+        """
+        Build the per-chunk metadata stored alongside each embedding.
+        
+        Args:
+            file_path: File the chunks come from
+            chunks: Chunk dicts from iter_chunks
+            first_index: chunk_index of the first chunk (for later segments)
+        """
+        metadatas = []
+        ingested_at = time.time()
+        for i, chunk in enumerate(chunks, first_index):
+            metadata = {
+                'source': str(file_path),
+                'filename': file_path.name,
+                'chunk_index': i,
+                'file_type': file_path.suffix.lower(),
+                'ingested_at': ingested_at
+            }
+            if 'start_offset' in chunk:
+                metadata['start_offset'] = chunk['start_offset']
+                metadata['end_offset'] = chunk['end_offset']
+            if 'page_start' in chunk:
+                metadata['page_start'] = chunk['page_start']
+                metadata['page_end'] = chunk['page_end']
+            metadatas.append(metadata)
+        return metadatas
+    
+    def forget_source(self, source: str, partition: Optional[Partition] = None):
+        """
+        Drop a source's chunks from the dedup index, before it is re-ingested
+        or removed.
+        
+        Files that had chunks skipped as copies of this source's are marked
+        modified in the manifest, so the next ingest gives them back their
+        own copies.
+        
+        Args:
+            source: Source file path
+            partition: Partition holding the source (the default partition if None)
+        """
+        partition = partition or partition_manager.get()
+        for dependent in partition.dedup_index.delete_by_source(source):
+            partition.manifest.invalidate(dependent)
     
-    def ingest_file(self, file_path: Path) -> Dict[str, Any]:
+    def dedup_chunks(
+        self,
+        file_path: Path,
+        chunks: List[Dict[str, Any]],
+        metadatas: List[Dict[str, Any]],
+        partition: Optional[Partition] = None
+    ) -> Tuple[List[int], Set[str]]:
+        """
+        Find chunks that nearly duplicate an indexed chunk (from any file in
+        the same partition, including earlier chunks of this one); the rest
+        are indexed.
+        
+        Returns:
+            Indexes of the chunks to keep, and the sources holding copies
+            of the skipped ones
+        """
+        if not Config.DEDUP_ENABLED:
+            return list(range(len(chunks))), set()
+        dedup_index = (partition or partition_manager.get()).dedup_index
+        source = str(file_path)
+        keep = []
+        duplicate_of = set()
+        with ingest_stage('dedup'):
+            for i, (chunk, metadata) in enumerate(zip(chunks, metadatas)):
+                signature = minhash(chunk['text'])
+                copy_of = None
+                if signature is not None:
+                    copy_of = dedup_index.claim(source, metadata['chunk_index'], signature)
+                if copy_of is None:
+                    keep.append(i)
+                else:
+                    duplicate_of.add(copy_of)
+        return keep, duplicate_of
+    
+    def embed_chunks(
+        self,
+        file_path: Path,
+        chunks: List[Dict[str, Any]],
+        first_index: int = 0,
+        partition: Optional[Partition] = None
+    ) -> Dict[str, Any]:
+        """
+        Embed a segment of chunks and build their metadata.
+        
+        Near-duplicates of chunks already indexed in the partition (the
+        default partition if None) are skipped before embedding (see
+        dedup_chunks). Chunks whose batch failed are dropped rather than
+        stored with bogus vectors.
+        
+        Returns:
+            Dict with the kept 'texts', 'metadatas' and 'embeddings', plus
+            'failed' (chunks dropped), 'duplicates' (chunks skipped as
+            copies), 'duplicate_of' (sources holding those copies),
+            'failed_batches' and 'elapsed'
+        """
+        partition = partition or partition_manager.get()
+        metadatas = self.build_metadatas(file_path, chunks, first_index)
+        unique, duplicate_of = self.dedup_chunks(file_path, chunks, metadatas, partition)
+        with ingest_stage('embed'):
+            result = self.generate_embeddings([chunks[i]['text'] for i in unique])
+        kept = [i for i, emb in zip(unique, result['embeddings']) if emb is not None]
+        if len(kept) < len(unique):
+            source = str(file_path)
+            for i in set(unique) - set(kept):
+                partition.dedup_index.release(source, metadatas[i]['chunk_index'])
+        return {
+            'texts': [chunks[i]['text'] for i in kept],
+            'metadatas': [metadatas[i] for i in kept],
+            'embeddings': [emb for emb in result['embeddings'] if emb is not None],
+            'failed': len(unique) - len(kept),
+            'duplicates': len(chunks) - len(unique),
+            'duplicate_of': duplicate_of,
+            'failed_batches': result['failed_batches'],
+            'elapsed': result['elapsed']
+        }
+    
+    def generate_embeddings(self, texts: List[str]) -> Dict[str, Any]:
+        """
+        Generate embeddings for text chunks using batched Ollama requests.
+        
+        Returns:
+            Dict with 'embeddings' (None for chunks whose batch failed),
+            'failed_batches' and 'chunks_per_sec'
+        """
+        return embedding_engine.embed(texts)
+    
+    def ingest_file(
+        self,
+        file_path: Path,
+        file_state: Optional[Dict[str, Any]] = None,
+        save_manifest: bool = True,
+        partition: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Ingest a single file into the vector store.
         
+        Chunks from a previous ingest of the same source are replaced.
+        
+        Args:
+            file_path: File to ingest
+            file_state: Optional result of manifest.check() for this file
+            save_manifest: Persist the manifest and indexes after ingesting
+            partition: Partition to ingest into (the default partition if
+                None; created if it doesn't exist)
+        
         Returns:
             Dict with 'success', 'chunks_created', and 'message'
         """
         try:
-            # Extract text
-            text = self.extract_text(file_path)
-            if not text or not text.strip():
+            target = partition_manager.get(partition, create=True)
+        except ValueError as e:
+            result = {'success': False, 'chunks_created': 0, 'message': str(e)}
+        else:
+            result = self._ingest_file(file_path, file_state, save_manifest, target)
+        record_ingest_result(result)
+        return result
+    
+    def _ingest_file(
+        self,
+        file_path: Path,
+        file_state: Optional[Dict[str, Any]],
+        save_manifest: bool,
+        partition: Partition
+    ) -> Dict[str, Any]:
+        manifest = partition.manifest
+        try:
+            source = str(file_path)
+            if file_state is None:
+                file_state = manifest.check(file_path)
+            if file_state['sha256'] is None:
+                file_state['sha256'] = hash_file(file_path)
+            
+            # Extract, split, embed and store one segment at a time, so a
+            # big PDF never has all its text and vectors in memory at once
+            timings = {}
+            chunks_seen = 0
+            chunks_created = 0
+            failed_chunks = 0
+            duplicates = 0
+            duplicate_of = set()
+            failed_batches = []
+            embed_seconds = 0.0
+            replaced = False
+            writer = partition.store.bulk_writer()
+            # This file's chunks from a previous ingest mustn't count as copies
+            self.forget_source(source, partition)
+            try:
+                for chunks in self.iter_chunks(file_path, timings):
+                    segment = self.embed_chunks(file_path, chunks, chunks_seen, partition)
+                    chunks_seen += len(chunks)
+                    failed_chunks += segment['failed']
+                    duplicates += segment['duplicates']
+                    duplicate_of |= segment['duplicate_of']
+                    failed_batches.extend(segment['failed_batches'])
+                    embed_seconds += segment['elapsed']
+                    if not segment['texts']:
+                        continue
+                    
+                    with ingest_stage('store'):
+                        if not replaced:
+                            # Drop chunks from the previous version of this file
+                            if source in manifest:
+                                writer.replace(source)
+                            replaced = True
+                        
+                        # Buffered with the file's other segments into batched upserts
+                        writer.add(segment['texts'], segment['metadatas'], segment['embeddings'])
+                    chunks_created += len(segment['texts'])
+                
+                with ingest_stage('store'):
+                    writer.close()
+                if source in writer.errors:
+                    raise RuntimeError(writer.errors[source])
+            except Exception:
+                self.forget_source(source, partition)
+                if replaced:
+                    # Don't leave a partial copy indexed; the file is retried next time
+                    partition.store.delete_by_source(source)
+                    manifest.remove(source)
+                partition.flush()
+                raise
+            finally:
+                for stage, seconds in timings.items():
+                    observe_ingest_stage(stage, seconds)
+            
+            if chunks_seen == 0:
                 return {
                     'success': False,
                     'chunks_created': 0,
                     'message': f"No text extracted from {file_path.name}"
                 }
-            
-            # Split into chunks
-            chunks = self.text_splitter.split_text(text)
-            
-            if not chunks:
+            if chunks_created == 0 and (failed_chunks or not duplicates):
                 return {
                     'success': False,
                     'chunks_created': 0,
-                    'message': f"No chunks created from {file_path.name}"
+                    'message': f"Failed to generate embeddings for {file_path.name}",
+                    'failed_batches': failed_batches
                 }
             
-            # Prepare metadata
-            metadatas = []
-            for i, chunk in enumerate(chunks):
-                metadatas.append({
-                    'source': str(file_path),
-                    'filename': file_path.name,
-                    'chunk_index': i,
-                    'total_chunks': len(chunks),
-                    'file_type': file_path.suffix.lower()
-                })
-            
-            # Generate embeddings
-            embeddings = self.generate_embeddings(chunks)
-            
-            # Store in vector database
-            vector_store.add_documents(
-                texts=chunks,
-                metadatas=metadatas,
-                embeddings=embeddings
+            if chunks_created == 0 and source in manifest:
+                # Every chunk is a copy of one from another file; nothing replaced the old ones
+                partition.store.delete_by_source(source)
+            manifest.update(
+                source,
+                size=file_state['size'],
+                mtime=file_state['mtime'],
+                sha256=file_state['sha256'],
+                chunks=chunks_created
             )
+            if save_manifest:
+                partition.flush()
+                embedding_engine.flush()
+            
+            if chunks_created == 0:
+                copies = sorted(Path(other).name for other in duplicate_of if other != source)
+                message = f"{file_path.name} duplicates already indexed {', '.join(copies)}"
+            else:
+                message = f"Successfully ingested {file_path.name}"
+                notes = []
+                if failed_chunks:
+                    notes.append(f"{failed_chunks} chunks failed to embed")
+                if duplicates:
+                    notes.append(f"{duplicates} duplicate chunks skipped")
+                if notes:
+                    message += f" ({', '.join(notes)})"
             
             return {
                 'success': True,
-                'chunks_created': len(chunks),
-                'message': f"Successfully ingested {file_path.name}"
+                'chunks_created': chunks_created,
+                'chunks_deduplicated': duplicates,
+                'message': message,
+                'failed_batches': failed_batches,
+                'chunks_per_sec': (chunks_seen - failed_chunks - duplicates) / embed_seconds if embed_seconds > 0 else 0.0
             }
         except Exception as e:
             return {
@@ -207,35 +554,202 @@ class DocumentIngester:
                 'message': f"Error ingesting {file_path.name}: {str(e)}"
             }
     
-    def ingest_directory(self, directory: Path) -> Dict[str, Any]:
+    def ingest_files(self, files: List[Dict[str, Any]], partition: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Ingest files whose size, mtime and content hash are already known,
+        such as freshly saved uploads.
+        
+        Files byte-identical to something already indexed in the partition
+        are skipped without extracting or embedding anything.
+        
+        Args:
+            files: Dicts with 'path', 'size', 'mtime' and 'sha256'
+            partition: Partition to ingest into (the default partition if
+                None; created if it doesn't exist)
+        
+        Returns:
+            Dict with 'files_processed', 'files_skipped', 'total_chunks',
+            'chunks_deduplicated', 'success', 'errors', 'messages' and
+            'chunks_per_sec'
+        """
+        start_time = time.perf_counter()
+        target = partition_manager.get(partition, create=True)
+        manifest = target.manifest
+        files_processed = 0
+        files_skipped = 0
+        total_chunks = 0
+        chunks_deduplicated = 0
+        errors = []
+        messages = []
+        to_ingest = []
+        
+        for saved in files:
+            file_path = saved['path']
+            source = str(file_path)
+            entry = manifest.get(source)
+            if entry and entry['sha256'] == saved['sha256']:
+                # Same file re-uploaded; just remember its new mtime
+                manifest.update(source, size=saved['size'], mtime=saved['mtime'],
+                                sha256=saved['sha256'], chunks=entry['chunks'])
+                files_skipped += 1
+                messages.append(f"{file_path.name} is already indexed")
+                continue
+            duplicate_of = manifest.find_by_hash(saved['sha256'])
+            if duplicate_of:
+                files_skipped += 1
+                messages.append(f"{file_path.name} is identical to already indexed {Path(duplicate_of).name}")
+                continue
+            to_ingest.append((file_path, {
+                'status': 'modified' if entry else 'new',
+                'size': saved['size'],
+                'mtime': saved['mtime'],
+                'sha256': saved['sha256']
+            }))
+        
+        if len(to_ingest) == 1:
+            file_path, file_state = to_ingest[0]
+            results = [self.ingest_file(file_path, file_state=file_state, partition=target.name)]
+        elif to_ingest:
+            results = IngestionPipeline(partition=target).run(to_ingest)
+        else:
+            results = []
+        
+        for result in results:
+            messages.append(result['message'])
+            if result['success']:
+                files_processed += 1
+                total_chunks += result['chunks_created']
+                chunks_deduplicated += result.get('chunks_deduplicated', 0)
+            else:
+                errors.append(result['message'])
+        target.flush()
+        embedding_engine.flush()
+        
+        elapsed = time.perf_counter() - start_time
+        return {
+            'files_processed': files_processed,
+            'files_skipped': files_skipped,
+            'total_chunks': total_chunks,
+            'chunks_deduplicated': chunks_deduplicated,
+            'success': files_processed > 0 or files_skipped > 0,
+            'errors': errors,
+            'messages': messages,
+            'chunks_per_sec': total_chunks / elapsed if elapsed > 0 else 0.0
+        }
+    
+    def ingest_directory(
+        self,
+        directory: Path,
+        incremental: Optional[bool] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+        skip_sources: Optional[Set[str]] = None,
+        partition: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Ingest all supported files from a directory.
         
+        Files run through the staged IngestionPipeline, so extraction,
+        embedding and storage of different files overlap. In incremental
+        mode, files whose size, mtime or content hash match the manifest are
+        skipped, and chunks of files that no longer exist are purged from
+        the vector store.
+        
+        Args:
+            directory: Directory to walk recursively
+            incremental: Use the manifest (defaults to Config.INCREMENTAL_INGEST)
+            on_progress: Called with {'type': 'planned', 'files', 'skipped'}
+                once the directory is scanned, then {'type': 'file', 'result'}
+                as each file is committed or fails
+            should_stop: Polled between files; returning True cancels the
+                ingest (files already in flight still finish)
+            skip_sources: Sources to treat as already ingested
+            partition: Partition to ingest into (the default partition if
+                None; created if it doesn't exist)
+        
         Returns:
-            Dict with 'files_processed', 'total_chunks', 'success', and 'errors'
+            Dict with 'files_processed', 'files_skipped', 'files_deleted',
+            'total_chunks', 'chunks_deduplicated', 'success', 'errors',
+            'cancelled' and 'chunks_per_sec'
         """
+        if incremental is None:
+            incremental = Config.INCREMENTAL_INGEST
+        target = partition_manager.get(partition, create=True)
+        manifest = target.manifest
+        
         supported_extensions = ['.pdf', '.md', '.markdown', '.txt', '.eml']
+        start_time = time.perf_counter()
         files_processed = 0
+        files_skipped = 0
+        files_deleted = 0
         total_chunks = 0
+        chunks_deduplicated = 0
         errors = []
+        seen_sources = set()
+        to_ingest = []
         
         # Recursively find all supported files
         for file_path in directory.rglob('*'):
             if file_path.is_file() and file_path.suffix.lower() in supported_extensions:
-                result = self.ingest_file(file_path)
-                if result['success']:
-                    files_processed += 1
-                    total_chunks += result['chunks_created']
-                else:
-                    errors.append(result['message'])
+                seen_sources.add(str(file_path))
+                try:
+                    file_state = manifest.check(file_path)
+                except OSError as e:
+                    errors.append(f"Error reading {file_path.name}: {e}")
+                    continue
+                if incremental and file_state['status'] == 'unchanged':
+                    files_skipped += 1
+                    continue
+                if skip_sources and str(file_path) in skip_sources:
+                    files_skipped += 1
+                    continue
+                to_ingest.append((file_path, file_state))
+        
+        if on_progress:
+            on_progress({'type': 'planned', 'files': len(to_ingest), 'skipped': files_skipped})
+        
+        def on_result(result: Dict[str, Any]):
+            if on_progress:
+                on_progress({'type': 'file', 'result': result})
+        
+        # Extract, embed and store changed files through the staged pipeline
+        results = IngestionPipeline(partition=target).run(to_ingest, on_result=on_result, should_stop=should_stop)
+        for result in results:
+            if result['success']:
+                files_processed += 1
+                total_chunks += result['chunks_created']
+                chunks_deduplicated += result.get('chunks_deduplicated', 0)
+            else:
+                errors.append(result['message'])
+        cancelled = bool(should_stop and should_stop())
+        
+        # Purge chunks of files that were deleted since the last ingest
+        if incremental and not cancelled:
+            for source in manifest.sources_under(directory):
+                if source not in seen_sources:
+                    if target.store.delete_by_source(source):
+                        self.forget_source(source, target)
+                        manifest.remove(source)
+                        files_deleted += 1
+                    else:
+                        errors.append(f"Error removing chunks of deleted file {source}")
+        
+        target.flush()
+        embedding_engine.flush()
         
+        elapsed = time.perf_counter() - start_time
         return {
             'files_processed': files_processed,
+            'files_skipped': files_skipped,
+            'files_deleted': files_deleted,
             'total_chunks': total_chunks,
-            'success': files_processed > 0,
-            'errors': errors
+            'chunks_deduplicated': chunks_deduplicated,
+            'success': files_processed > 0 or files_skipped > 0 or files_deleted > 0,
+            'errors': errors,
+            'cancelled': cancelled,
+            'chunks_per_sec': total_chunks / elapsed if elapsed > 0 else 0.0
         }
 
-# Global instance
-ingester = DocumentIngester()
+# Global instance, created on first use
+ingester = LazyInstance(DocumentIngester)
 
@@ -0,0 +1,243 @@
+"""
+Background ingestion jobs with progress reporting, cancellation and resume.
+
+Each job is persisted as a JSON file so queued or interrupted jobs are
+picked up again after a restart, skipping files that were already
+committed to the vector store.
+"""
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from config import Config
+from ingestion import ingester
+
+# Keep job files small even when many files fail
+MAX_JOB_ERRORS = 100
+# Minimum seconds between progress writes to disk
+SAVE_INTERVAL = 1.0
+
+ACTIVE_STATES = ('queued', 'running')
+
+class JobManager:
+    """Queues ingest jobs and runs them on background worker threads."""
+
+    def __init__(self, jobs_dir: Optional[Path] = None, workers: Optional[int] = None):
+        """Set up the manager; persisted jobs are loaded by start()."""
+        self.jobs_dir = jobs_dir or Config.CHROMA_DB_PATH / "jobs"
+        self.workers = max(1, workers or Config.JOB_WORKERS)
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.cancel_flags: Dict[str, threading.Event] = {}
+        self.last_saved: Dict[str, float] = {}
+        self.queue: queue.Queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.threads: List[threading.Thread] = []
+
+    def start(self):
+        """Resume interrupted jobs and start the worker threads."""
+        if self.threads:
+            return
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        for job in self._load_jobs():
+            self.jobs[job['id']] = job
+            if job['status'] in ACTIVE_STATES:
+                job['status'] = 'queued'
+                self.cancel_flags[job['id']] = threading.Event()
+                self.queue.put(job['id'])
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"ingest-job-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        """Stop the workers; running jobs resume on the next start."""
+        for _ in self.threads:
+            self.queue.put(None)
+        self.threads = []
+
+    def _load_jobs(self) -> List[Dict[str, Any]]:
+        jobs = []
+        for path in sorted(self.jobs_dir.glob("*.json")):
+            try:
+                jobs.append(json.loads(path.read_text()))
+            except Exception as e:
+                print(f"Error loading job {path.name}: {e}")
+        jobs.sort(key=lambda job: job['created_at'])
+        return jobs
+
+    def _save(self, job: Dict[str, Any], force: bool = True):
+        """Persist a job, throttled unless force is set."""
+        now = time.time()
+        if not force and now - self.last_saved.get(job['id'], 0) < SAVE_INTERVAL:
+            return
+        self.last_saved[job['id']] = now
+        with self.lock:
+            data = json.dumps(job)
+        path = self.jobs_dir / f"{job['id']}.json"
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(data)
+        os.replace(tmp_path, path)
+
+    def submit(self, path: Path, incremental: Optional[bool] = None, partition: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Queue a file or directory for ingestion into a partition (the
+        default partition if None).
+
+        Returns:
+            The new job (see get())
+        """
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': 'file' if path.is_file() else 'directory',
+            'path': str(path),
+            'incremental': incremental,
+            'partition': partition,
+            'status': 'queued',
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'files_total': None,
+            'files_done': 0,
+            'files_failed': 0,
+            'files_skipped': 0,
+            'chunks_created': 0,
+            'chunks_deduplicated': 0,
+            'errors': [],
+            'completed_files': []
+        }
+        with self.lock:
+            self.jobs[job['id']] = job
+            self.cancel_flags[job['id']] = threading.Event()
+        self._save(job)
+        self.queue.put(job['id'])
+        return self.get(job['id'])
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Request cancellation; files already in flight still finish."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if job['status'] in ACTIVE_STATES:
+            self.cancel_flags[job_id].set()
+            if job['status'] == 'queued':
+                job['status'] = 'cancelled'
+                job['finished_at'] = time.time()
+                self._save(job)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job's progress, including throughput and ETA."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        with self.lock:
+            view = {key: value for key, value in job.items() if key != 'completed_files'}
+            view['errors'] = list(job['errors'])
+
+        chunks_per_sec = None
+        eta_seconds = None
+        if job['started_at']:
+            elapsed = (job['finished_at'] or time.time()) - job['started_at']
+            if elapsed > 0:
+                chunks_per_sec = job['chunks_created'] / elapsed
+                finished = job['files_done'] + job['files_failed']
+                if job['status'] == 'running' and job['files_total'] and finished:
+                    remaining = job['files_total'] - finished
+                    eta_seconds = remaining * elapsed / finished
+        view['chunks_per_sec'] = chunks_per_sec
+        view['eta_seconds'] = eta_seconds
+        return view
+
+    def list(self) -> List[Dict[str, Any]]:
+        """List all jobs, newest first."""
+        job_ids = sorted(self.jobs, key=lambda job_id: self.jobs[job_id]['created_at'], reverse=True)
+        return [self.get(job_id) for job_id in job_ids]
+
+    def _worker(self):
+        while True:
+            job_id = self.queue.get()
+            if job_id is None:
+                break
+            job = self.jobs.get(job_id)
+            if job is None or job['status'] != 'queued':
+                continue
+            try:
+                self._run(job)
+            except Exception as e:
+                print(f"Error running ingest job {job_id}: {e}")
+                with self.lock:
+                    job['status'] = 'failed'
+                    job['errors'].append(str(e))
+                    job['finished_at'] = time.time()
+                self._save(job)
+
+    def _run(self, job: Dict[str, Any]):
+        """Run one job to completion, cancellation or failure."""
+        cancel_flag = self.cancel_flags[job['id']]
+        job['status'] = 'running'
+        job['started_at'] = job['started_at'] or time.time()
+        self._save(job)
+        path = Path(job['path'])
+
+        def add_error(message: str):
+            if len(job['errors']) < MAX_JOB_ERRORS:
+                job['errors'].append(message)
+
+        if job['kind'] == 'file':
+            job['files_total'] = 1
+            result = ingester.ingest_file(path, partition=job.get('partition'))
+            with self.lock:
+                if result['success']:
+                    job['files_done'] = 1
+                    job['chunks_created'] = result['chunks_created']
+                    job['chunks_deduplicated'] = result.get('chunks_deduplicated', 0)
+                    job['completed_files'].append(str(path))
+                else:
+                    job['files_failed'] = 1
+                    add_error(result['message'])
+        else:
+            already_done = set(job['completed_files'])
+
+            def on_progress(event: Dict[str, Any]):
+                with self.lock:
+                    if event['type'] == 'planned':
+                        # Files committed before a restart count as done, not skipped;
+                        # earlier failures are retried, so their count starts over
+                        job['files_total'] = event['files'] + len(already_done)
+                        job['files_skipped'] = event['skipped'] - len(already_done)
+                        job['files_failed'] = 0
+                        job['errors'] = []
+                    elif event['result']['success']:
+                        job['files_done'] += 1
+                        job['chunks_created'] += event['result']['chunks_created']
+                        job['chunks_deduplicated'] = job.get('chunks_deduplicated', 0) + event['result']['chunks_deduplicated']
+                        job['completed_files'].append(event['result']['source'])
+                    else:
+                        job['files_failed'] += 1
+                        add_error(event['result']['message'])
+                self._save(job, force=False)
+
+            result = ingester.ingest_directory(
+                path,
+                incremental=job['incremental'],
+                on_progress=on_progress,
+                should_stop=cancel_flag.is_set,
+                skip_sources=already_done,
+                partition=job.get('partition')
+            )
+            for error in result['errors']:
+                if error not in job['errors']:
+                    add_error(error)
+
+        with self.lock:
+            job['status'] = 'cancelled' if cancel_flag.is_set() else 'completed'
+            job['finished_at'] = time.time()
+        self._save(job)
+
+# Global instance
+job_manager = JobManager()
@@ -0,0 +1,55 @@
+"""
+Lazily created global instances.
+
+Modules expose their global instance (vector_store, embedding_engine, ...)
+as a LazyInstance, so importing a module doesn't open databases, create
+clients or import heavy libraries. The real object is created on first use
+and every attribute access is forwarded to it.
+"""
+import threading
+from typing import Any, Callable
+
+class LazyInstance:
+    """Stands in for a global instance until it is first used."""
+
+    def __init__(self, factory: Callable[[], Any]):
+        """Remember how to create the instance; nothing is created yet."""
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_instance', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _get_instance(self) -> Any:
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    instance = self._factory()
+                    object.__setattr__(self, '_instance', instance)
+        return instance
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._get_instance(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self._get_instance(), name, value)
+
+    def __contains__(self, item: Any) -> bool:
+        return item in self._get_instance()
+
+    def __len__(self) -> int:
+        return len(self._get_instance())
+
+    def __iter__(self):
+        return iter(self._get_instance())
+
+    def __repr__(self) -> str:
+        if self._instance is None:
+            return f"<lazy {getattr(self._factory, '__name__', 'instance')}, not created>"
+        return repr(self._instance)
+
+def initialize(obj: Any) -> Any:
+    """Create a lazy global now (e.g. from a background thread); returns the instance."""
+    if isinstance(obj, LazyInstance):
+        return obj._get_instance()
+    return obj
@@ -0,0 +1,239 @@
+"""
+In-process BM25 inverted index kept alongside the vector store.
+
+Gives keyword-style queries (error codes, names, ticket IDs) a fast path
+that needs no embedding call. Maintained incrementally by VectorStore and
+persisted next to the Chroma database when the store is flushed (after
+ingests and on shutdown).
+
+Only what ranking and filtering need is kept: postings, document lengths
+and chunk metadata. Chunk text stays in the vector backend; VectorStore
+fetches it for the results, and supplies it when chunks are deleted so
+only their terms' postings are touched.
+"""
+import math
+import os
+import pickle
+import re
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+from config import Config
+from vector_backends import matches_where, split_source_filter
+
+# Words plus compound identifiers such as ERR-1042, v2.3.1 or JIRA-123
+TOKEN_PATTERN = re.compile(r"\w+(?:[-.:/]\w+)*")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into terms, keeping compound identifiers whole."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            # Also index the parts so "1042" finds "ERR-1042"
+            tokens.extend(part for part in re.split(r"[-.:/]", token) if part)
+    return tokens
+
+class BM25Index:
+    """Incrementally maintained BM25 index over stored chunks."""
+
+    def __init__(self, path: Optional[Path] = None):
+        """Load the index from disk if it exists."""
+        self.path = path or Config.CHROMA_DB_PATH / "lexical_index.pkl"
+        self.lock = threading.RLock()
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_lengths: Dict[str, int] = {}
+        self.metadatas: Dict[str, Dict[str, Any]] = {}
+        self.source_ids: Dict[str, set] = defaultdict(set)
+        self.total_length = 0
+        self.dirty = False
+        self.loaded_from_disk = self._load()
+
+    def _load(self) -> bool:
+        if not self.path.exists():
+            return False
+        try:
+            with open(self.path, 'rb') as f:
+                state = pickle.load(f)
+            self.postings = defaultdict(dict, state['postings'])
+            self.doc_lengths = state['doc_lengths']
+            self.metadatas = state['metadatas']
+            self.source_ids = defaultdict(set, state['source_ids'])
+            self.total_length = sum(self.doc_lengths.values())
+            return True
+        except Exception as e:
+            print(f"Error loading lexical index, starting empty: {e}")
+            return False
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]):
+        """
+        Index chunks.
+
+        Chunk IDs are derived from the text (see chunk_ids), so an ID that is
+        already indexed has the same terms; only its metadata is updated.
+        """
+        with self.lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                if doc_id in self.doc_lengths:
+                    self._set_metadata(doc_id, metadata)
+                    continue
+                terms = Counter(tokenize(text))
+                for term, count in terms.items():
+                    self.postings[term][doc_id] = count
+                length = sum(terms.values())
+                self.doc_lengths[doc_id] = length
+                self.total_length += length
+                self._set_metadata(doc_id, metadata)
+            self.dirty = True
+
+    def _set_metadata(self, doc_id: str, metadata: Dict[str, Any]):
+        previous = self.metadatas.get(doc_id)
+        if previous is not None:
+            self._unlink_source(doc_id, previous.get('source', ''))
+        self.metadatas[doc_id] = metadata
+        self.source_ids[metadata.get('source', '')].add(doc_id)
+
+    def _unlink_source(self, doc_id: str, source: str):
+        self.source_ids[source].discard(doc_id)
+        if not self.source_ids[source]:
+            del self.source_ids[source]
+
+    def ids(self, sources: List[str]) -> List[str]:
+        """IDs of the indexed chunks of some sources."""
+        with self.lock:
+            return [doc_id for source in sources for doc_id in self.source_ids.get(source, ())]
+
+    def delete_by_sources(self, sources: List[str], texts: Optional[Dict[str, str]] = None):
+        """
+        Remove every chunk from some sources.
+
+        Args:
+            sources: Source file paths
+            texts: Text of the chunks by ID (see ids()), so only their own
+                terms' postings are touched; chunks left out are found by
+                scanning every posting list
+        """
+        texts = texts or {}
+        with self.lock:
+            unknown = set()
+            for doc_id in self.ids(sources):
+                text = texts.get(doc_id)
+                if text is None:
+                    unknown.add(doc_id)
+                    continue
+                for term in set(tokenize(text)):
+                    self._unpost(term, [doc_id])
+                self._forget(doc_id)
+            if unknown:
+                for term in list(self.postings):
+                    self._unpost(term, unknown)
+                for doc_id in unknown:
+                    self._forget(doc_id)
+            self.dirty = True
+
+    def _unpost(self, term: str, doc_ids):
+        postings = self.postings.get(term)
+        if postings is None:
+            return
+        for doc_id in doc_ids:
+            postings.pop(doc_id, None)
+        if not postings:
+            del self.postings[term]
+
+    def _forget(self, doc_id: str):
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        metadata = self.metadatas.pop(doc_id)
+        self._unlink_source(doc_id, metadata.get('source', ''))
+
+    def clear(self):
+        with self.lock:
+            self.postings = defaultdict(dict)
+            self.doc_lengths = {}
+            self.metadatas = {}
+            self.source_ids = defaultdict(set)
+            self.total_length = 0
+            self.dirty = True
+
+    def search(self, query: str, top_k: int = 5, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Rank chunks against a query with BM25, optionally keeping only chunks
+        whose metadata matches a Chroma-style filter.
+
+        Returns:
+            List of results with 'id', 'metadata', 'score' and a 'distance'
+            of None (there is no vector distance); the text isn't kept here,
+            VectorStore.lexical_search adds it
+        """
+        with self.lock:
+            n_docs = len(self.doc_lengths)
+            if n_docs == 0:
+                return []
+            avg_length = self.total_length / n_docs
+            sources, rest = split_source_filter(where)
+            scoped = None
+            if sources is not None:
+                # Chunks of the sources the filter allows, so only those get scored
+                scoped = set().union(*(self.source_ids.get(source, ()) for source in sources))
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                if scoped is None:
+                    matches = postings.items()
+                else:
+                    matches = [(doc_id, postings[doc_id]) for doc_id in scoped.intersection(postings)]
+                for doc_id, tf in matches:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+            if rest:
+                scores = {doc_id: score for doc_id, score in scores.items()
+                          if matches_where(self.metadatas[doc_id], rest)}
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+            return [
+                {'id': doc_id, 'metadata': self.metadatas[doc_id], 'distance': None, 'score': score}
+                for doc_id, score in ranked
+            ]
+
+    def flush(self):
+        """Atomically persist the index if it changed."""
+        with self.lock:
+            if not self.dirty:
+                return
+            state = {
+                'postings': dict(self.postings),
+                'doc_lengths': self.doc_lengths,
+                'metadatas': self.metadatas,
+                'source_ids': dict(self.source_ids)
+            }
+            tmp_path = self.path.with_suffix(".tmp")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], top_k: int, k: int = 60) -> List[Dict[str, Any]]:
+    """
+    Merge ranked result lists with reciprocal rank fusion.
+
+    Each result keeps the fields of its first occurrence (so vector results
+    keep their distance) and gets a fused 'score'.
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    scores: Dict[str, float] = defaultdict(float)
+    for results in result_lists:
+        for rank, result in enumerate(results):
+            scores[result['id']] += 1.0 / (k + rank + 1)
+            fused.setdefault(result['id'], dict(result))
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return [{**fused[doc_id], 'score': score} for doc_id, score in ranked]
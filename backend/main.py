@@ -1,22 +1,36 @@
 """
 FastAPI application for the Personal AI Knowledge Assistant.
 """
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response, FileResponse
 from pathlib import Path
-import aiofiles
+import json
 import os
-from typing import List, Optional
+import time
+from typing import Any, Dict, List, Optional
 
 from config import Config
 from models import (
     ChatRequest, ChatResponse, SearchRequest, SearchResponse,
-    IngestResponse, StatusResponse
+    BatchSearchRequest, BatchSearchResponse,
+    IngestRequest, IngestResponse, JobResponse, StatusResponse,
+    DocumentInfo, DocumentListResponse, PartitionInfo, SearchFilters,
+    ProfilingSettings, ProfilingStatus, ProfileInfo
 )
 from rag import rag_pipeline
+from generation import generation_manager
 from ingestion import ingester
+from embeddings import embedding_engine
 from vector_store import vector_store
+from partitions import partition_manager, check_partition_name, PartitionNotFoundError
+from jobs import job_manager
+from answer_cache import answer_cache
+from uploads import save_upload, save_uploads, UploadTooLargeError, InvalidUploadError
+from executors import io_executor, ingest_executor, run_blocking, shutdown as shutdown_executors
+from metrics import REQUEST_LATENCY, configure_logging, start_request, stage_timings, log_event, render_metrics
+from profiler import profiler, Profile
+from lazy import initialize
 
 app = FastAPI(
     title="Personal AI Knowledge Assistant",
@@ -31,8 +45,85 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "X-Profile-ID"],
 )
 
+def finish_profile(profile: Profile):
+    """Stop a profile and save it on the I/O pool, off the event loop."""
+    if profiler.finish(profile):
+        # Not awaited: this also runs while a response is cancelled because the client went away
+        io_executor.submit(profiler.save, profile)
+
+async def finish_profile_after(profile: Profile, body):
+    """Keep profiling until the response body (e.g. a chat stream) has been sent."""
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        finish_profile(profile)
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    """
+    Tag each request with an ID and record its latency and stage timings.
+    
+    Chat, search and ingest requests are profiled when they send
+    "X-Profile: true" or are picked at the profiler's sample rate.
+    """
+    request_id = start_request(request.headers.get("X-Request-ID"))
+    profile = None
+    if profiler.should_profile(request.url.path, request.headers.get("X-Profile")):
+        profile = profiler.start(request_id, request.method, request.url.path)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    except Exception:
+        if profile is not None:
+            finish_profile(profile)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        # Label by route template, not raw path, so job IDs don't explode the label set
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            request.method, route.path if route is not None else "unmatched", str(status)
+        ).observe(elapsed)
+        log_event(
+            'request',
+            method=request.method,
+            path=request.url.path,
+            status=status,
+            duration_ms=round(elapsed * 1000, 1),
+            stages_ms=stage_timings()
+        )
+    response.headers["X-Request-ID"] = request_id
+    if profile is not None:
+        response.headers["X-Profile-ID"] = profile.id
+        response.body_iterator = finish_profile_after(profile, response.body_iterator)
+    return response
+
+@app.on_event("startup")
+async def startup_event():
+    """Start background ingest workers and warm up the models."""
+    configure_logging()
+    Config.ensure_directories()
+    job_manager.start()
+    if Config.WARMUP_ON_STARTUP:
+        generation_manager.start_warmup()
+        # Open the vector store in the background so the first query doesn't wait for it
+        io_executor.submit(initialize, vector_store)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Let in-flight blocking work finish before the process exits."""
+    job_manager.stop()
+    generation_manager.stop_warmup()
+    shutdown_executors()
+    partition_manager.flush()
+    embedding_engine.flush()
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -42,40 +133,130 @@ async def root():
         "status": "running"
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/api/admin/profiling", response_model=ProfilingStatus)
+async def get_profiling():
+    """Current profiler settings."""
+    return ProfilingStatus(**profiler.settings())
+
+@app.put("/api/admin/profiling", response_model=ProfilingStatus)
+async def update_profiling(settings: ProfilingSettings):
+    """Change the profiler's sample rate or interval until the next restart."""
+    if settings.sample_rate is not None and not 0 <= settings.sample_rate <= 1:
+        raise HTTPException(status_code=400, detail="sample_rate must be between 0 and 1")
+    if settings.interval_ms is not None and settings.interval_ms <= 0:
+        raise HTTPException(status_code=400, detail="interval_ms must be positive")
+    profiler.configure(sample_rate=settings.sample_rate, interval_ms=settings.interval_ms)
+    return ProfilingStatus(**profiler.settings())
+
+@app.get("/api/profiles", response_model=List[ProfileInfo])
+async def list_profiles():
+    """Stored request profiles, newest first."""
+    profiles = await run_blocking(io_executor, profiler.list)
+    return [ProfileInfo(**info) for info in profiles]
+
+@app.get("/api/profiles/{profile_id}")
+async def download_profile(profile_id: str):
+    """Download a profile as collapsed stacks (for flamegraph.pl or speedscope)."""
+    path = await run_blocking(io_executor, profiler.path, profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=path.name)
+
 @app.get("/api/status", response_model=StatusResponse)
 async def get_status():
-    """Get system status and statistics."""
+    """Get system status and statistics, in total and per partition."""
     try:
-        stats = vector_store.get_collection_stats()
+        partitions = await run_blocking(io_executor, partition_manager.stats)
+        models = await generation_manager.status()
         return StatusResponse(
             status="operational",
-            documents_indexed=stats['total_documents'],
-            chunks_stored=stats['total_documents'],
+            documents_indexed=sum(partition['documents'] for partition in partitions),
+            chunks_stored=sum(partition['chunks'] for partition in partitions),
             model=Config.OLLAMA_MODEL,
-            embedding_model=Config.EMBEDDING_MODEL
+            embedding_model=Config.EMBEDDING_MODEL,
+            answer_cache=answer_cache.stats(),
+            models=models,
+            partitions=[PartitionInfo(**partition) for partition in partitions]
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/documents", response_model=DocumentListResponse)
+async def list_documents(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=1000),
+    partition: Optional[str] = None
+):
+    """List a partition's indexed documents with their chunk counts, ordered by path."""
+    await check_partitions([partition] if partition else None)
+    store = partition_manager.get(partition).store
+    page = await run_blocking(io_executor, store.list_documents, offset, limit)
+    return DocumentListResponse(
+        total=page['total'],
+        offset=offset,
+        limit=limit,
+        documents=[DocumentInfo(**document) for document in page['documents']]
+    )
+
+async def check_partitions(partitions: Optional[List[str]]):
+    """Open the partitions a request names, failing with 400 or 404 if one is invalid or missing."""
+    try:
+        await run_blocking(io_executor, partition_manager.resolve, partitions)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PartitionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def check_new_partition(partition: Optional[str]):
+    """Fail with 400 if a partition to ingest into has an invalid name."""
+    if partition is not None:
+        try:
+            check_partition_name(partition)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+def filters_from_request(filters: Optional[SearchFilters]) -> Optional[dict]:
+    """Convert search filters to the format the RAG pipeline expects (times as epoch seconds)."""
+    if filters is None:
+        return None
+    result = filters.model_dump(exclude_none=True)
+    for key in ('ingested_after', 'ingested_before'):
+        if key in result:
+            result[key] = result[key].timestamp()
+    return result or None
+
+def history_from_request(request: ChatRequest) -> Optional[List[dict]]:
+    """Convert conversation history to the format the RAG pipeline expects."""
+    if not request.conversation_history:
+        return None
+    return [
+        {
+            'role': msg.role,
+            'content': msg.content
+        }
+        for msg in request.conversation_history
+    ]
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """Handle chat queries with RAG."""
+    await check_partitions(request.partitions)
     try:
-        # Convert conversation history format if needed
-        conversation_history = None
-        if request.conversation_history:
-            conversation_history = [
-                {
-                    'role': msg.role,
-                    'content': msg.content
-                }
-                for msg in request.conversation_history
-            ]
+        conversation_history = history_from_request(request)
         
         # Process query through RAG pipeline
-        result = rag_pipeline.query(
+        result = await rag_pipeline.query(
             query=request.message,
-            conversation_history=conversation_history
+            conversation_history=conversation_history,
+            mode=request.mode,
+            filters=filters_from_request(request.filters),
+            partitions=request.partitions
         )
         
         return ChatResponse(
@@ -86,110 +267,279 @@ async def chat(request: ChatRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Handle chat queries with RAG, streaming the answer as Server-Sent Events.
+    
+    Emits a 'sources' event once retrieval finishes, a 'token' event per
+    generated fragment, and a final 'done' event with timings.
+    """
+    await check_partitions(request.partitions)
+    conversation_history = history_from_request(request)
+    filters = filters_from_request(request.filters)
+    
+    async def event_stream():
+        async for event in rag_pipeline.stream_query(
+            query=request.message,
+            conversation_history=conversation_history,
+            mode=request.mode,
+            filters=filters,
+            partitions=request.partitions
+        ):
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Don't let proxies buffer the stream
+        }
+    )
+
+def search_results(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Format retrieved chunks as search results."""
+    results = []
+    for chunk in chunks:
+        metadata = chunk.get('metadata', {})
+        results.append({
+            'text': chunk.get('text', ''),
+            'source': metadata.get('source', ''),
+            'filename': metadata.get('filename', 'Unknown'),
+            'chunk_index': metadata.get('chunk_index', 0),
+            'similarity': 1 - chunk.get('distance', 0) if chunk.get('distance') else None,
+            'score': chunk.get('score')
+        })
+    return results
+
 @app.post("/api/search", response_model=SearchResponse)
 async def search(request: SearchRequest):
     """Semantic search across documents."""
+    await check_partitions(request.partitions)
     try:
         # Retrieve relevant chunks
-        chunks = rag_pipeline.retrieve_context(
+        chunks = await rag_pipeline.retrieve_context(
             query=request.query,
-            top_k=request.top_k or Config.TOP_K
+            top_k=request.top_k or Config.TOP_K,
+            mode=request.mode,
+            filters=filters_from_request(request.filters),
+            partitions=request.partitions
         )
         
-        # Format results
-        results = []
-        for chunk in chunks:
-            metadata = chunk.get('metadata', {})
-            results.append({
-                'text': chunk.get('text', ''),
-                'source': metadata.get('source', ''),
-                'filename': metadata.get('filename', 'Unknown'),
-                'chunk_index': metadata.get('chunk_index', 0),
-                'similarity': 1 - chunk.get('distance', 0) if chunk.get('distance') else None
-            })
-        
         return SearchResponse(
-            results=results,
+            results=search_results(chunks),
             query=request.query
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error performing search: {str(e)}")
 
+@app.post("/api/search/batch", response_model=BatchSearchResponse)
+async def search_batch(request: BatchSearchRequest):
+    """Search many queries at once, embedding them in batches."""
+    if len(request.queries) > Config.MAX_SEARCH_BATCH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many queries (max {Config.MAX_SEARCH_BATCH} per request)"
+        )
+    await check_partitions(list(dict.fromkeys(
+        name for item in request.queries for name in item.partitions or request.partitions or []
+    )) or None)
+    try:
+        all_chunks = await rag_pipeline.retrieve_many([
+            {
+                'query': item.query,
+                'top_k': item.top_k or request.top_k or Config.TOP_K,
+                'mode': item.mode or request.mode,
+                'filter': item.filter,
+                'filters': filters_from_request(item.filters),
+                'partitions': item.partitions or request.partitions
+            }
+            for item in request.queries
+        ])
+    except ValueError as e:
+        # Malformed metadata filters
+        raise HTTPException(status_code=400, detail=f"Invalid search request: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error performing search: {str(e)}")
+    
+    return BatchSearchResponse(results=[
+        SearchResponse(results=search_results(chunks), query=item.query)
+        for item, chunks in zip(request.queries, all_chunks)
+    ])
+
+def ingest_response(result: Dict[str, Any]) -> IngestResponse:
+    """Build an IngestResponse from an ingester.ingest_files() result."""
+    return IngestResponse(
+        success=result['success'],
+        message=" ".join(result['messages']),
+        files_processed=result['files_processed'],
+        chunks_created=result['total_chunks'],
+        chunks_per_sec=result['chunks_per_sec'],
+        files_skipped=result['files_skipped'],
+        chunks_deduplicated=result['chunks_deduplicated']
+    )
+
 @app.post("/api/ingest", response_model=IngestResponse)
-async def ingest_file(file: Optional[UploadFile] = File(None)):
-    """Ingest a single uploaded file."""
+async def ingest_file(file: Optional[UploadFile] = File(None), partition: Optional[str] = None):
+    """Ingest a single uploaded file into a partition (created if it doesn't exist)."""
+    check_new_partition(partition)
     try:
         if not file:
             raise HTTPException(status_code=400, detail="No file provided")
         
-        # Save uploaded file temporarily
-        temp_path = Config.DOCUMENTS_DIR / file.filename
-        async with aiofiles.open(temp_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
-        
-        # Ingest file
-        result = ingester.ingest_file(temp_path)
+        # Stream the upload to disk, hashing as we go
+        saved = await save_upload(file, Config.DOCUMENTS_DIR, Config.MAX_UPLOAD_SIZE_MB * 1024 * 1024)
         
-        # Optionally delete temp file (keep it for now)
-        # temp_path.unlink()
+        # Ingest file (skipped if an identical file is already indexed)
+        result = await run_blocking(ingest_executor, ingester.ingest_files, [saved], partition)
+        return ingest_response(result)
+    except HTTPException:
+        raise
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error ingesting file: {str(e)}")
+
+@app.post("/api/ingest/batch", response_model=IngestResponse)
+async def ingest_files(files: List[UploadFile] = File(...), partition: Optional[str] = None):
+    """Ingest several uploaded files into a partition in one request."""
+    check_new_partition(partition)
+    try:
+        if len(files) > Config.MAX_UPLOAD_FILES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"At most {Config.MAX_UPLOAD_FILES} files can be uploaded at once"
+            )
         
-        return IngestResponse(
-            success=result['success'],
-            message=result['message'],
-            files_processed=1 if result['success'] else 0,
-            chunks_created=result['chunks_created']
+        # Nothing is kept unless every file is within the limits
+        saved_files = await save_uploads(
+            files,
+            Config.DOCUMENTS_DIR,
+            Config.MAX_UPLOAD_SIZE_MB * 1024 * 1024,
+            Config.MAX_UPLOAD_REQUEST_MB * 1024 * 1024
         )
+        
+        result = await run_blocking(ingest_executor, ingester.ingest_files, saved_files, partition)
+        return ingest_response(result)
+    except HTTPException:
+        raise
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error ingesting file: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error ingesting files: {str(e)}")
 
 @app.post("/api/ingest/directory", response_model=IngestResponse)
-async def ingest_directory():
-    """Ingest all files from the configured documents directory."""
+async def ingest_directory(incremental: Optional[bool] = None, partition: Optional[str] = None):
+    """Ingest all files from the configured documents directory into a partition."""
+    check_new_partition(partition)
     try:
-        result = ingester.ingest_directory(Config.DOCUMENTS_DIR)
+        result = await run_blocking(
+            ingest_executor, ingester.ingest_directory, Config.DOCUMENTS_DIR,
+            incremental=incremental, partition=partition
+        )
         
         return IngestResponse(
             success=result['success'],
-            message=f"Processed {result['files_processed']} files. {len(result['errors'])} errors.",
+            message=(
+                f"Processed {result['files_processed']} files, skipped {result['files_skipped']} unchanged, "
+                f"removed {result['files_deleted']} deleted, skipped {result['chunks_deduplicated']} duplicate chunks. "
+                f"{len(result['errors'])} errors."
+            ),
             files_processed=result['files_processed'],
-            chunks_created=result['total_chunks']
+            chunks_created=result['total_chunks'],
+            chunks_per_sec=result['chunks_per_sec'],
+            files_skipped=result['files_skipped'],
+            files_deleted=result['files_deleted'],
+            chunks_deduplicated=result['chunks_deduplicated']
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error ingesting directory: {str(e)}")
 
 @app.post("/api/ingest/path", response_model=IngestResponse)
-async def ingest_path(path: str):
-    """Ingest files from a specific path."""
+async def ingest_path(path: str, incremental: Optional[bool] = None, partition: Optional[str] = None):
+    """Ingest files from a specific path into a partition."""
+    check_new_partition(partition)
     try:
         target_path = Path(path)
         if not target_path.exists():
             raise HTTPException(status_code=404, detail="Path does not exist")
         
         if target_path.is_file():
-            result = ingester.ingest_file(target_path)
+            result = await run_blocking(ingest_executor, ingester.ingest_file, target_path, partition=partition)
             return IngestResponse(
                 success=result['success'],
                 message=result['message'],
                 files_processed=1 if result['success'] else 0,
-                chunks_created=result['chunks_created']
+                chunks_created=result['chunks_created'],
+                chunks_deduplicated=result.get('chunks_deduplicated', 0)
             )
         else:
-            result = ingester.ingest_directory(target_path)
+            result = await run_blocking(
+                ingest_executor, ingester.ingest_directory, target_path,
+                incremental=incremental, partition=partition
+            )
             return IngestResponse(
                 success=result['success'],
-                message=f"Processed {result['files_processed']} files.",
+                message=f"Processed {result['files_processed']} files, skipped {result['files_skipped']} unchanged.",
                 files_processed=result['files_processed'],
-                chunks_created=result['total_chunks']
+                chunks_created=result['total_chunks'],
+                chunks_per_sec=result['chunks_per_sec'],
+                files_skipped=result['files_skipped'],
+                files_deleted=result['files_deleted'],
+                chunks_deduplicated=result['chunks_deduplicated']
             )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error ingesting path: {str(e)}")
 
+@app.post("/api/jobs/ingest", response_model=JobResponse)
+async def submit_ingest_job(request: IngestRequest):
+    """
+    Queue a file or directory for background ingestion.
+    
+    Returns immediately with a job ID; poll /api/jobs/{job_id} for progress.
+    Defaults to the configured documents directory.
+    """
+    check_new_partition(request.partition)
+    target = request.file_path or request.directory
+    target_path = Path(target) if target else Config.DOCUMENTS_DIR
+    if not target_path.exists():
+        raise HTTPException(status_code=404, detail="Path does not exist")
+    
+    job = job_manager.submit(target_path, incremental=request.incremental, partition=request.partition)
+    return JobResponse(**job)
+
+@app.get("/api/jobs", response_model=List[JobResponse])
+async def list_jobs():
+    """List ingestion jobs, newest first."""
+    return [JobResponse(**job) for job in job_manager.list()]
+
+@app.get("/api/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Get per-file progress, throughput and ETA for a job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse(**job)
+
+@app.delete("/api/jobs/{job_id}", response_model=JobResponse)
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job."""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse(**job)
+
 @app.delete("/api/reset")
-async def reset_database():
-    """Reset the vector database (use with caution!)."""
+async def reset_database(partition: Optional[str] = None):
+    """Reset a partition (the default one if not given) of the vector database (use with caution!)."""
+    await check_partitions([partition] if partition else None)
     try:
-        vector_store.reset()
+        await run_blocking(io_executor, partition_manager.get(partition).reset)
         return {"message": "Database reset successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error resetting database: {str(e)}")
@@ -201,6 +551,6 @@ if __name__ == "__main__":
         host=Config.HOST,
         port=Config.PORT,
         reload=True,
-        reload_exclude=["venv/*", "*.pyc", "__pycache__/*", ".git/*", "chroma_db/*"]
+        reload_exclude=["venv/*", "*.pyc", "__pycache__/*", ".git/*", "chroma_db/*", "profiles/*"]
     )
 
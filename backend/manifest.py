@@ -0,0 +1,138 @@
+"""
+Persisted file manifest used for incremental ingestion.
+
+Tracks size, mtime and content hash of every ingested file so unchanged
+files can be skipped and deleted files purged from the vector store.
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from config import Config
+from lazy import LazyInstance
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def hash_file(file_path: Path) -> str:
+    """Compute the SHA-256 of a file without reading it all into memory."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class FileManifest:
+    """Maps source paths to the file state they were last ingested from."""
+
+    def __init__(self, path: Optional[Path] = None):
+        """Load the manifest from disk if it exists."""
+        self.path = path or Config.CHROMA_DB_PATH / "ingest_manifest.json"
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            self.entries = json.loads(self.path.read_text())
+        except Exception as e:
+            print(f"Error loading ingest manifest, starting empty: {e}")
+            self.entries = {}
+
+    def save(self):
+        """Atomically write the manifest to disk."""
+        with self.lock:
+            data = json.dumps(self.entries)
+        tmp_path = self.path.with_suffix(".tmp")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_text(data)
+        os.replace(tmp_path, self.path)
+
+    def __contains__(self, source: str) -> bool:
+        return source in self.entries
+
+    def get(self, source: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(source)
+
+    def check(self, file_path: Path) -> Dict[str, Any]:
+        """
+        Compare a file on disk against its manifest entry.
+
+        Size and mtime are checked first; the file is only hashed when they
+        differ, so unchanged files cost a single stat call.
+
+        Returns:
+            Dict with 'status' ('new', 'modified' or 'unchanged'), 'size',
+            'mtime' and 'sha256' (None when hashing was not needed)
+        """
+        stat = file_path.stat()
+        state = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'sha256': None
+        }
+        entry = self.entries.get(str(file_path))
+        if entry is None:
+            state['status'] = 'new'
+            return state
+        if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            state['status'] = 'unchanged'
+            state['sha256'] = entry['sha256']
+            return state
+
+        state['sha256'] = hash_file(file_path)
+        if state['sha256'] == entry['sha256']:
+            # Touched but not changed; remember the new mtime
+            with self.lock:
+                entry['mtime'] = stat.st_mtime_ns
+            state['status'] = 'unchanged'
+        else:
+            state['status'] = 'modified'
+        return state
+
+    def update(self, source: str, size: int, mtime: int, sha256: str, chunks: int):
+        """Record the file state a source was just ingested from."""
+        with self.lock:
+            self.entries[source] = {
+                'size': size,
+                'mtime': mtime,
+                'sha256': sha256,
+                'chunks': chunks
+            }
+
+    def invalidate(self, source: str):
+        """Make a source count as modified, so the next ingest replaces its chunks."""
+        with self.lock:
+            entry = self.entries.get(source)
+            if entry is not None:
+                entry['size'] = -1
+                entry['sha256'] = None
+
+    def remove(self, source: str):
+        with self.lock:
+            self.entries.pop(source, None)
+
+    def clear(self):
+        """Forget every ingested file."""
+        with self.lock:
+            self.entries = {}
+
+    def find_by_hash(self, sha256: str) -> Optional[str]:
+        """Find an ingested source with the given content hash."""
+        with self.lock:
+            for source, entry in self.entries.items():
+                if entry['sha256'] == sha256:
+                    return source
+        return None
+
+    def sources_under(self, directory: Path) -> List[str]:
+        """List manifest sources located inside a directory."""
+        prefix = str(directory).rstrip(os.sep) + os.sep
+        with self.lock:
+            return [source for source in self.entries if source.startswith(prefix)]
+
+# Global instance, created on first use
+manifest = LazyInstance(FileManifest)
@@ -0,0 +1,166 @@
+"""
+Prometheus metrics, request IDs and structured logging.
+
+Each HTTP request gets an ID (taken from the X-Request-ID header when the
+caller sends one). Stage timers feed the Prometheus histograms and also
+collect per-request timings, which are written with the request ID as one
+JSON log line per request and per RAG query.
+"""
+import contextvars
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterator
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from config import Config
+
+# Seconds; RAG stages range from sub-millisecond lookups to minute-long generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 200, 500, 1000, 2000)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS
+)
+RAG_STAGE_LATENCY = Histogram(
+    'rag_stage_duration_seconds', 'Time spent in each stage of a RAG query',
+    ['stage'], buckets=LATENCY_BUCKETS
+)
+RAG_QUERIES = Counter(
+    'rag_queries_total', 'RAG queries by retrieval mode and outcome',
+    ['mode', 'outcome']
+)
+INGEST_STAGE_LATENCY = Histogram(
+    'ingest_stage_duration_seconds', 'Time spent in each ingestion stage, per file or write batch',
+    ['stage'], buckets=LATENCY_BUCKETS
+)
+INGEST_FILES = Counter('ingest_files_total', 'Files processed by ingestion', ['outcome'])
+INGEST_CHUNKS = Counter('ingest_chunks_total', 'Chunks stored by ingestion')
+INGEST_DUPLICATE_CHUNKS = Counter('ingest_duplicate_chunks_total', 'Near-duplicate chunks skipped by ingestion')
+LLM_TOKENS = Counter(
+    'llm_tokens_total', 'Tokens processed by the chat model',
+    ['model', 'phase']  # phase: "prompt" or "completion"
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    'llm_tokens_per_second', 'Chat model throughput reported by Ollama',
+    ['model', 'phase'], buckets=TOKENS_PER_SECOND_BUCKETS
+)
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('request_id', default=None)
+# Stage name -> milliseconds for the current request; shared with tasks and threads it spawns
+stage_timings_var: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar('stage_timings', default=None)
+
+logger = logging.getLogger("knowledge_assistant")
+
+class JsonFormatter(logging.Formatter):
+    """Formats log records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'event': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None)
+        }
+        entry.update(getattr(record, 'fields', {}))
+        return json.dumps(entry, default=str)
+
+def configure_logging():
+    """Send structured logs to stderr (once)."""
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(Config.LOG_LEVEL.upper())
+    logger.propagate = False
+
+def log_event(event: str, level: int = logging.INFO, **fields):
+    """Write a structured log line tagged with the current request ID."""
+    logger.log(level, event, extra={'request_id': request_id_var.get(), 'fields': fields})
+
+def start_request(request_id: Optional[str] = None) -> str:
+    """Begin tracking a request; returns its ID."""
+    request_id = request_id or uuid.uuid4().hex
+    request_id_var.set(request_id)
+    stage_timings_var.set({})
+    return request_id
+
+def stage_timings() -> Dict[str, float]:
+    """Stage timings (ms) recorded so far for the current request."""
+    return dict(stage_timings_var.get() or {})
+
+def _record_stage(stage: str, seconds: float):
+    timings = stage_timings_var.get()
+    if timings is not None:
+        timings[stage] = round(timings.get(stage, 0.0) + seconds * 1000, 1)
+
+def observe_rag_stage(stage: str, seconds: float):
+    """Record time spent in a RAG query stage."""
+    RAG_STAGE_LATENCY.labels(stage).observe(seconds)
+    _record_stage(stage, seconds)
+
+@contextmanager
+def rag_stage(stage: str) -> Iterator[None]:
+    """Time a RAG query stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_rag_stage(stage, time.perf_counter() - start)
+
+def record_rag_query(mode: str, outcome: str):
+    """Count a finished RAG query and log its stage timings."""
+    RAG_QUERIES.labels(mode, outcome).inc()
+    log_event('rag_query', mode=mode, outcome=outcome, stages_ms=stage_timings())
+
+def observe_ingest_stage(stage: str, seconds: float):
+    """Record time spent in an ingestion stage."""
+    INGEST_STAGE_LATENCY.labels(stage).observe(seconds)
+    _record_stage(f"ingest_{stage}", seconds)
+
+@contextmanager
+def ingest_stage(stage: str) -> Iterator[None]:
+    """Time an ingestion stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_ingest_stage(stage, time.perf_counter() - start)
+
+def record_ingest_result(result: Dict[str, Any]):
+    """Count a file's ingest outcome, stored chunks and skipped duplicates."""
+    INGEST_FILES.labels('success' if result['success'] else 'failed').inc()
+    INGEST_CHUNKS.inc(result.get('chunks_created', 0))
+    INGEST_DUPLICATE_CHUNKS.inc(result.get('chunks_deduplicated', 0))
+
+def record_generation(model: str, response: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Record token counts and throughput from a final Ollama chat response.
+
+    Returns:
+        Dict with 'prompt_tokens', 'completion_tokens', 'prompt_tokens_per_sec'
+        and 'completion_tokens_per_sec' (None where Ollama didn't report them)
+    """
+    stats = {}
+    for phase, count_key, duration_key in (
+        ('prompt', 'prompt_eval_count', 'prompt_eval_duration'),
+        ('completion', 'eval_count', 'eval_duration')
+    ):
+        count = response.get(count_key)
+        duration_ns = response.get(duration_key)
+        rate = None
+        if count:
+            LLM_TOKENS.labels(model, phase).inc(count)
+            if duration_ns:
+                rate = count / (duration_ns / 1e9)
+                LLM_TOKENS_PER_SECOND.labels(model, phase).observe(rate)
+        stats[f'{phase}_tokens'] = count
+        stats[f'{phase}_tokens_per_sec'] = round(rate, 1) if rate is not None else None
+    return stats
+
+def render_metrics() -> tuple:
+    """Prometheus exposition: (body, content type)."""
+    return generate_latest(), CONTENT_TYPE_LATEST
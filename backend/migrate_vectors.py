@@ -0,0 +1,185 @@
+"""
+Convert the stored vector index into the numpy backend, optionally quantized,
+and report recall@k against exact float32 search.
+
+Stop the server first, then run from the backend directory:
+
+    # Report recall and size for every storage mode without changing anything
+    python migrate_vectors.py --report
+
+    # Convert the default partition to int8 with float32 re-scoring
+    python migrate_vectors.py --quantization int8 --rescore
+
+    # Convert every partition (VECTOR_BACKEND applies to all of them)
+    python migrate_vectors.py --all-partitions --quantization int8 --rescore
+
+Only the default partition is converted unless --partition or
+--all-partitions says otherwise. Afterwards set VECTOR_BACKEND=numpy and
+the matching VECTOR_QUANTIZATION / VECTOR_RESCORE in .env.
+"""
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+import numpy as np
+from config import Config
+from partitions import DEFAULT_PARTITION, partition_manager, check_partition_name
+from vector_backends import VectorBackend, NumpyBackend, create_backend
+
+# Storage modes compared by --report: (quantization, rescore)
+REPORT_MODES = [
+    ('none', False),
+    ('float16', False),
+    ('int8', False),
+    ('int8', True)
+]
+
+def copy_backend(source: VectorBackend, target: NumpyBackend, page_size: int) -> int:
+    """Copy every chunk from one backend into another."""
+    copied = 0
+    for ids, embeddings, texts, metadatas in source.iter_embeddings(page_size):
+        target.add(ids, embeddings, texts, metadatas)
+        copied += len(ids)
+        print(f"  copied {copied} chunks", end="\r")
+    print()
+    target.flush()
+    return copied
+
+def sample_queries(source: VectorBackend, count: int, page_size: int) -> np.ndarray:
+    """Pick random stored vectors (normalized) to use as queries."""
+    total = source.count()
+    rng = np.random.default_rng(0)
+    picks = set(rng.choice(total, size=min(count, total), replace=False).tolist())
+    queries = []
+    offset = 0
+    for _, embeddings, _, _ in source.iter_embeddings(page_size):
+        for i in range(len(embeddings)):
+            if offset + i in picks:
+                queries.append(embeddings[i])
+        offset += len(embeddings)
+    queries = np.asarray(queries, dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries
+
+def exact_neighbours(source: VectorBackend, queries: np.ndarray, k: int, page_size: int) -> List[List[str]]:
+    """Exact top-k IDs for each query by streaming over the source vectors."""
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_ids = np.empty((len(queries), k), dtype=object)
+    for ids, embeddings, _, _ in source.iter_embeddings(page_size):
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        scores = queries @ (embeddings / np.where(norms == 0, 1, norms)).T
+        merged_scores = np.concatenate([best_scores, scores], axis=1)
+        merged_ids = np.concatenate([best_ids, np.tile(np.asarray(ids, dtype=object), (len(queries), 1))], axis=1)
+        order = np.argsort(-merged_scores, axis=1)[:, :k]
+        best_scores = np.take_along_axis(merged_scores, order, axis=1)
+        best_ids = np.take_along_axis(merged_ids, order, axis=1)
+    return [list(row) for row in best_ids]
+
+def recall_at_k(backend: NumpyBackend, queries: np.ndarray, truth: List[List[str]], k: int) -> Tuple[float, float]:
+    """
+    Measure recall@k and mean query latency against exact results.
+
+    Returns:
+        (recall, mean latency in ms)
+    """
+    hits = 0
+    start = time.perf_counter()
+    for query, expected in zip(queries, truth):
+        found = {result['id'] for result in backend.search(query.tolist(), k)}
+        hits += len(found & set(expected))
+    elapsed = time.perf_counter() - start
+    return hits / (len(queries) * k), elapsed * 1000 / len(queries)
+
+def mode_name(quantization: str, rescore: bool) -> str:
+    return quantization + ("+rescore" if rescore else "")
+
+def migrate(source: VectorBackend, data_dir: Path, args):
+    """
+    Convert one partition's vectors into a numpy index in data_dir (or,
+    with --report, only report recall for every mode).
+
+    Returns:
+        False if the partition was empty, so there was nothing to do
+    """
+    total = source.count()
+    if total == 0:
+        print("The source index is empty; nothing to do.")
+        return False
+    print(f"Source: {args.source}, {total} chunks")
+
+    k = min(args.k, total)
+    queries = sample_queries(source, args.queries, args.page_size)
+    truth = exact_neighbours(source, queries, k, args.page_size)
+
+    target_dir = data_dir / "numpy_index"
+    modes = REPORT_MODES if args.report else [(args.quantization, args.rescore)]
+    rows = []
+    for quantization, rescore in modes:
+        build_dir = Path(tempfile.mkdtemp(prefix="numpy_index.", dir=data_dir))
+        print(f"Building {mode_name(quantization, rescore)} index")
+        target = NumpyBackend(path=build_dir, quantization=quantization, rescore=rescore)
+        copy_backend(source, target, args.page_size)
+        recall, latency = recall_at_k(target, queries, truth, k)
+        rows.append((mode_name(quantization, rescore), recall, latency, target.storage_bytes()))
+
+        if args.report:
+            shutil.rmtree(build_dir)
+            continue
+        # Swap the new index into place
+        old_dir = target_dir.with_name("numpy_index.old")
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if target_dir.exists():
+            target_dir.rename(old_dir)
+        build_dir.rename(target_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        print(f"Wrote {target_dir}")
+
+    print(f"\n{'mode':<15} {'recall@' + str(k):>10} {'query ms':>9} {'vectors MiB':>12}")
+    for name, recall, latency, size in rows:
+        print(f"{name:<15} {recall:>10.4f} {latency:>9.2f} {size / 2**20:>12.1f}")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=Config.VECTOR_BACKEND, choices=["chroma", "numpy"],
+                        help="backend to read from (default: VECTOR_BACKEND)")
+    parser.add_argument("--quantization", default=Config.VECTOR_QUANTIZATION, choices=["none", "float16", "int8"])
+    parser.add_argument("--rescore", action="store_true", default=Config.VECTOR_RESCORE,
+                        help="keep float32 copies on disk to re-rank quantized candidates")
+    parser.add_argument("--report", action="store_true", help="only report recall for every mode")
+    parser.add_argument("--k", type=int, default=Config.TOP_K, help="k for recall@k")
+    parser.add_argument("--queries", type=int, default=200, help="stored vectors to use as queries")
+    parser.add_argument("--page-size", type=int, default=1000)
+    which = parser.add_mutually_exclusive_group()
+    which.add_argument("--partition", action="append",
+                       help="partition to convert (repeatable; default: the default partition)")
+    which.add_argument("--all-partitions", action="store_true", help="convert every partition")
+    args = parser.parse_args()
+
+    Config.ensure_directories()
+    names = partition_manager.names() if args.all_partitions else args.partition or [DEFAULT_PARTITION]
+    converted = False
+    for name in dict.fromkeys(names):
+        try:
+            check_partition_name(name)
+        except ValueError as e:
+            print(f"\n{e}")
+            continue
+        data_dir, collection_name = partition_manager.location(name)
+        if not data_dir.is_dir():
+            print(f"\nUnknown partition: {name}")
+            continue
+        print(f"\nPartition: {name}")
+        converted |= migrate(create_backend(args.source, data_dir, collection_name), data_dir, args)
+
+    if converted and not args.report:
+        print(f"\nSet VECTOR_BACKEND=numpy, VECTOR_QUANTIZATION={args.quantization} and "
+              f"VECTOR_RESCORE={str(args.rescore).lower()} to use it.")
+        if not args.all_partitions and len(partition_manager.names()) > 1:
+            print("VECTOR_BACKEND applies to every partition; convert the others too "
+                  "(--all-partitions) or they will open empty.")
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 Pydantic models for API request/response schemas.
 """
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal, Union
 from datetime import datetime
 
 class ChatMessage(BaseModel):
@@ -12,10 +12,23 @@ class ChatMessage(BaseModel):
     timestamp: Optional[datetime] = None
     sources: Optional[List[Dict[str, Any]]] = None
 
+RetrievalMode = Literal["vector", "lexical", "hybrid"]
+
+class SearchFilters(BaseModel):
+    """Limits search and chat to some documents; every condition given must match."""
+    file_type: Optional[Union[str, List[str]]] = None  # Extension(s), e.g. ".pdf" or ["md", "txt"]
+    source_prefix: Optional[str] = None  # Directory the file is in (whole path components), e.g. "/docs/projects/"
+    filename: Optional[str] = None  # Exact file name
+    ingested_after: Optional[datetime] = None  # ISO 8601 or epoch seconds
+    ingested_before: Optional[datetime] = None
+
 class ChatRequest(BaseModel):
     """Request model for chat queries."""
     message: str
     conversation_history: Optional[List[ChatMessage]] = None
+    mode: Optional[RetrievalMode] = None  # Defaults to Config.RETRIEVAL_MODE
+    filters: Optional[SearchFilters] = None
+    partitions: Optional[List[str]] = None  # Defaults to the default partition
 
 class ChatResponse(BaseModel):
     """Response model for chat queries."""
@@ -27,16 +40,41 @@ class SearchRequest(BaseModel):
     """Request model for semantic search."""
     query: str
     top_k: Optional[int] = None
+    mode: Optional[RetrievalMode] = None  # Defaults to Config.RETRIEVAL_MODE
+    filters: Optional[SearchFilters] = None
+    partitions: Optional[List[str]] = None  # Defaults to the default partition
 
 class SearchResponse(BaseModel):
     """Response model for semantic search."""
     results: List[Dict[str, Any]]
     query: str
 
+class BatchSearchQuery(BaseModel):
+    """One query in a batch search."""
+    query: str
+    top_k: Optional[int] = None  # Defaults to the batch's top_k
+    mode: Optional[RetrievalMode] = None  # Defaults to the batch's mode
+    filter: Optional[Dict[str, Any]] = None  # Chroma-style metadata filter, e.g. {"source": "/docs/a.pdf"}
+    filters: Optional[SearchFilters] = None
+    partitions: Optional[List[str]] = None  # Defaults to the batch's partitions
+
+class BatchSearchRequest(BaseModel):
+    """Request model for searching many queries at once."""
+    queries: List[BatchSearchQuery]
+    top_k: Optional[int] = None  # Defaults to Config.TOP_K
+    mode: Optional[RetrievalMode] = None  # Defaults to Config.RETRIEVAL_MODE
+    partitions: Optional[List[str]] = None  # Defaults to the default partition
+
+class BatchSearchResponse(BaseModel):
+    """Response model for batch search, one entry per query in order."""
+    results: List[SearchResponse]
+
 class IngestRequest(BaseModel):
     """Request model for document ingestion."""
     file_path: Optional[str] = None
     directory: Optional[str] = None
+    incremental: Optional[bool] = None
+    partition: Optional[str] = None  # Created if it doesn't exist; defaults to the default partition
 
 class IngestResponse(BaseModel):
     """Response model for document ingestion."""
@@ -44,12 +82,81 @@ class IngestResponse(BaseModel):
     message: str
     files_processed: int
     chunks_created: int
+    chunks_per_sec: Optional[float] = None
+    files_skipped: int = 0
+    files_deleted: int = 0
+    chunks_deduplicated: int = 0
+
+class JobResponse(BaseModel):
+    """Response model for a background ingestion job."""
+    id: str
+    kind: str  # "file" or "directory"
+    path: str
+    partition: Optional[str] = None  # None for the default partition
+    status: str  # "queued", "running", "completed", "failed" or "cancelled"
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    files_total: Optional[int] = None
+    files_done: int
+    files_failed: int
+    files_skipped: int
+    chunks_created: int
+    chunks_deduplicated: int = 0
+    chunks_per_sec: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    errors: List[str]
+
+class DocumentInfo(BaseModel):
+    """An indexed document (source file)."""
+    source: str
+    filename: str
+    chunks: int
+    bytes: int  # Size of the stored chunk text
+    ingested_at: float
+
+class DocumentListResponse(BaseModel):
+    """Response model for a page of indexed documents."""
+    total: int
+    offset: int
+    limit: int
+    documents: List[DocumentInfo]
+
+class PartitionInfo(BaseModel):
+    """A partition (separately stored corpus) and its size."""
+    name: str
+    documents: int
+    chunks: int
 
 class StatusResponse(BaseModel):
     """Response model for system status."""
     status: str
-    documents_indexed: int
+    documents_indexed: int  # Across all partitions
     chunks_stored: int
     model: str
     embedding_model: str
+    answer_cache: Optional[Dict[str, Any]] = None
+    models: Optional[Dict[str, Any]] = None  # Per model: loaded in Ollama, expiry, warm-up state
+    partitions: Optional[List[PartitionInfo]] = None
+
+class ProfilingSettings(BaseModel):
+    """Request model for changing profiler settings."""
+    sample_rate: Optional[float] = None  # Fraction of eligible requests profiled, 0-1
+    interval_ms: Optional[float] = None  # Time between stack samples
+
+class ProfilingStatus(BaseModel):
+    """Response model for profiler settings."""
+    sample_rate: float
+    interval_ms: float
+    max_stored: int
+    active: int  # Requests being profiled right now
 
+class ProfileInfo(BaseModel):
+    """Response model for a stored request profile."""
+    id: str
+    request_id: Optional[str] = None
+    method: str
+    path: str
+    started_at: float
+    duration_ms: Optional[float] = None
+    samples: int
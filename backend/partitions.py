@@ -0,0 +1,193 @@
+"""
+Named corpora ("partitions"), each stored in its own collection.
+
+A partition has its own vector backend collection, BM25 and source
+indexes, ingest manifest and dedup index, so partitions grow, re-index
+and get reset independently: a bulk re-index of one never rebuilds or
+locks another's HNSW graph. The default partition is the original
+"documents" collection with its files directly in CHROMA_DB_PATH; others
+live in CHROMA_DB_PATH/partitions/<name>, created on first ingest.
+
+Queries over several partitions search each one concurrently and merge
+the results (see merge_results).
+"""
+import re
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+from config import Config
+from vector_store import VectorStore, vector_store
+from vector_backends import create_backend
+from manifest import FileManifest, manifest
+from dedup_index import DedupIndex
+from lazy import LazyInstance
+
+DEFAULT_PARTITION = "documents"
+# Also valid as a Chroma collection name
+PARTITION_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9][a-zA-Z0-9_-]{1,61}[a-zA-Z0-9]$")
+
+class PartitionNotFoundError(LookupError):
+    """Raised when a query names a partition that doesn't exist."""
+
+def check_partition_name(name: str):
+    """Raise ValueError unless name is a valid partition name."""
+    if not PARTITION_NAME_PATTERN.match(name):
+        raise ValueError(
+            f"Invalid partition name {name!r}: use 3-63 letters, digits, '-' or '_', "
+            "starting and ending with a letter or digit"
+        )
+
+class Partition:
+    """One corpus: a vector store with its own ingest manifest and dedup index."""
+
+    def __init__(self, name: str, store: VectorStore, manifest: FileManifest, dedup_index: DedupIndex):
+        self.name = name
+        self.store = store
+        self.manifest = manifest
+        self.dedup_index = dedup_index
+
+    def stats(self) -> Dict[str, Any]:
+        """Document and chunk counts (see VectorStore.get_collection_stats)."""
+        stats = self.store.get_collection_stats()
+        return {
+            'name': self.name,
+            'documents': stats['total_documents'],
+            'chunks': stats['total_chunks']
+        }
+
+    def flush(self):
+        """Persist the store's indexes, the manifest and the dedup index."""
+        self.store.flush()
+        self.manifest.save()
+        self.dedup_index.flush()
+
+    def reset(self):
+        """Delete everything in the partition (use with caution!)."""
+        self.store.reset()
+        self.manifest.clear()
+        self.manifest.save()
+        self.dedup_index.clear()
+        self.dedup_index.flush()
+
+class PartitionManager:
+    """Opens partitions on first use and keeps them open."""
+
+    def __init__(self, root: Optional[Path] = None):
+        """
+        Args:
+            root: Directory holding non-default partitions
+                (CHROMA_DB_PATH/partitions by default)
+        """
+        self.root = root or Config.CHROMA_DB_PATH / "partitions"
+        self.lock = threading.Lock()
+        # The default partition wraps the global store and manifest
+        self.partitions: Dict[str, Partition] = {
+            DEFAULT_PARTITION: Partition(DEFAULT_PARTITION, vector_store, manifest, LazyInstance(DedupIndex))
+        }
+
+    def names(self) -> List[str]:
+        """Every partition, the default first."""
+        names = set()
+        if self.root.exists():
+            names = {
+                path.name for path in self.root.iterdir()
+                if path.is_dir() and PARTITION_NAME_PATTERN.match(path.name)
+            }
+        return [DEFAULT_PARTITION] + sorted(names - {DEFAULT_PARTITION})
+
+    def location(self, name: str) -> Tuple[Path, str]:
+        """Data directory and vector collection name of a partition."""
+        if name == DEFAULT_PARTITION:
+            return Config.CHROMA_DB_PATH, DEFAULT_PARTITION
+        return self.root / name, name
+
+    def get(self, name: Optional[str] = None, create: bool = False) -> Partition:
+        """
+        Open a partition.
+
+        Args:
+            name: Partition name (the default partition if None)
+            create: Create the partition if it doesn't exist
+
+        Returns:
+            The partition
+
+        Raises:
+            ValueError: If the name isn't a valid partition name
+            PartitionNotFoundError: If the partition doesn't exist and create is False
+        """
+        name = name or DEFAULT_PARTITION
+        partition = self.partitions.get(name)
+        if partition is not None:
+            return partition
+        check_partition_name(name)
+        with self.lock:
+            partition = self.partitions.get(name)
+            if partition is not None:
+                return partition
+            path, collection_name = self.location(name)
+            if not path.is_dir():
+                if not create:
+                    raise PartitionNotFoundError(f"Unknown partition: {name}")
+                path.mkdir(parents=True, exist_ok=True)
+            partition = Partition(
+                name,
+                VectorStore(create_backend(path=path, collection_name=collection_name), path=path),
+                FileManifest(path / "ingest_manifest.json"),
+                DedupIndex(path / "dedup_index.pkl")
+            )
+            self.partitions[name] = partition
+            return partition
+
+    def resolve(self, names: Optional[List[str]] = None) -> List[Partition]:
+        """Open the named partitions, in order without repeats (the default partition if none are named)."""
+        return [self.get(name) for name in dict.fromkeys(names or [DEFAULT_PARTITION])]
+
+    @property
+    def version(self) -> int:
+        """Changes whenever any open partition changes, for caches over several partitions."""
+        return sum(partition.store.version for partition in list(self.partitions.values()))
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Document and chunk counts of every partition."""
+        return [self.get(name).stats() for name in self.names()]
+
+    def flush(self):
+        """Persist every open partition."""
+        for partition in list(self.partitions.values()):
+            partition.flush()
+
+def merge_results(result_lists: List[List[Dict[str, Any]]], top_k: int) -> List[Dict[str, Any]]:
+    """
+    Merge per-partition results into one top-k list.
+
+    Vector results are ranked by distance, which is comparable across
+    partitions since they share one embedding model; keyword results have
+    no distance and are ranked by BM25 score, computed from each
+    partition's own term statistics. A chunk found in several partitions
+    (the same file ingested into each) is kept once.
+
+    Args:
+        result_lists: One ranked result list per partition
+        top_k: Number of results to return
+
+    Returns:
+        The best top_k results
+    """
+    if len(result_lists) == 1:
+        return result_lists[0][:top_k]
+    best: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for result in results:
+            kept = best.get(result['id'])
+            if kept is None or _rank_key(result) < _rank_key(kept):
+                best[result['id']] = result
+    return sorted(best.values(), key=_rank_key)[:top_k]
+
+def _rank_key(result: Dict[str, Any]) -> float:
+    if result.get('distance') is not None:
+        return result['distance']
+    return -(result.get('score') or 0.0)
+
+# Global instance, created on first use
+partition_manager = LazyInstance(PartitionManager)
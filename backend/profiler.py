@@ -0,0 +1,259 @@
+"""
+Opt-in sampling profiler for individual API requests.
+
+A profiled request gets its own Profile. While any profile is active, a
+background thread samples call stacks every PROFILE_INTERVAL_MS: the
+event-loop thread counts toward a profile only while one of the request's
+tasks is running, and executor/pipeline threads only while they run work
+submitted by the request. Profiles are saved as collapsed stacks
+("frame;frame;frame count" per line), which flamegraph.pl, speedscope and
+most flamegraph viewers read directly.
+
+Nothing is installed until the first profile starts, so requests that
+aren't profiled pay only for a context variable lookup.
+"""
+import asyncio
+import contextvars
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Callable
+from config import Config
+
+# Only these endpoints can be profiled
+PROFILED_PATH_PREFIXES = ('/api/chat', '/api/search', '/api/ingest')
+# Deepest stack recorded per sample
+MAX_STACK_DEPTH = 128
+
+profile_var: contextvars.ContextVar[Optional['Profile']] = contextvars.ContextVar('profile', default=None)
+
+def _profiled_task_factory(loop, coro, context=None):
+    """Create tasks as usual, remembering which ones belong to a profiled request."""
+    profile = (context.get(profile_var) if context is not None else profile_var.get())
+    task = asyncio.Task(coro, loop=loop, context=context)
+    if profile is not None:
+        profile.tasks.add(task)
+    return task
+
+class Profile:
+    """Stack samples collected for one request."""
+
+    def __init__(self, request_id: Optional[str], method: str, path: str, loop: asyncio.AbstractEventLoop):
+        """Start an empty profile for a request handled on `loop`."""
+        self.id = uuid.uuid4().hex
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.tasks: weakref.WeakSet = weakref.WeakSet()
+        # Thread ident -> number of nested calls currently running for this request
+        self.threads: Dict[int, int] = {}
+        self.samples: Counter = Counter()
+        self.lock = threading.Lock()
+
+    def enter_thread(self):
+        ident = threading.get_ident()
+        with self.lock:
+            self.threads[ident] = self.threads.get(ident, 0) + 1
+
+    def exit_thread(self):
+        ident = threading.get_ident()
+        with self.lock:
+            if self.threads.get(ident, 0) <= 1:
+                self.threads.pop(ident, None)
+            else:
+                self.threads[ident] -= 1
+
+    def thread_ids(self) -> List[int]:
+        """Threads whose current stack belongs to this request."""
+        with self.lock:
+            idents = list(self.threads)
+        if asyncio.current_task(self.loop) in self.tasks:
+            idents.append(self.loop_thread_id)
+        return idents
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'request_id': self.request_id,
+            'method': self.method,
+            'path': self.path,
+            'started_at': self.started_at,
+            'duration_ms': self.duration_ms,
+            'samples': sum(self.samples.values())
+        }
+
+class Profiler:
+    """Decides which requests to profile, samples them and stores the results."""
+
+    def __init__(self, profiles_dir: Optional[Path] = None):
+        """Set up the profiler; the sampler thread starts with the first profile."""
+        self.profiles_dir = profiles_dir or Config.PROFILES_DIR
+        self.sample_rate = Config.PROFILE_SAMPLE_RATE
+        self.interval = Config.PROFILE_INTERVAL_MS / 1000
+        self.max_stored = Config.PROFILE_MAX_STORED
+        self.active: List[Profile] = []
+        self.lock = threading.Lock()
+        self.sampler: Optional[threading.Thread] = None
+        self.frame_labels: Dict[Any, str] = {}
+
+    def should_profile(self, path: str, header: Optional[str]) -> bool:
+        """Profile when asked to by the X-Profile header, or at the sample rate."""
+        if not path.startswith(PROFILED_PATH_PREFIXES):
+            return False
+        if header is not None:
+            return header.lower() in ('1', 'true', 'yes')
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def configure(self, sample_rate: Optional[float] = None, interval_ms: Optional[float] = None):
+        """Change the sampling settings at runtime (not persisted)."""
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if interval_ms is not None:
+            self.interval = interval_ms / 1000
+
+    def settings(self) -> Dict[str, Any]:
+        with self.lock:
+            active = len(self.active)
+        return {
+            'sample_rate': self.sample_rate,
+            'interval_ms': self.interval * 1000,
+            'max_stored': self.max_stored,
+            'active': active
+        }
+
+    def start(self, request_id: Optional[str], method: str, path: str) -> Profile:
+        """
+        Start profiling the current request.
+
+        Must be called on the event loop, before the request's tasks are
+        created; they inherit the profile through the context.
+        """
+        loop = asyncio.get_running_loop()
+        if loop.get_task_factory() is None:
+            loop.set_task_factory(_profiled_task_factory)
+        profile = Profile(request_id, method, path, loop)
+        profile_var.set(profile)
+        profile.tasks.add(asyncio.current_task())
+        with self.lock:
+            self.active.append(profile)
+            if self.sampler is None or not self.sampler.is_alive():
+                self.sampler = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+                self.sampler.start()
+        return profile
+
+    def finish(self, profile: Profile) -> bool:
+        """
+        Stop sampling a profile.
+
+        Returns:
+            True if it was still running, in which case it should be saved
+            (see save; that does file I/O, so keep it off the event loop)
+        """
+        with self.lock:
+            if profile not in self.active:
+                return False
+            self.active.remove(profile)
+        profile.duration_ms = round((time.perf_counter() - profile.start) * 1000, 1)
+        return True
+
+    def save(self, profile: Profile):
+        """Write a finished profile to disk and drop the oldest beyond the cap."""
+        try:
+            self._save(profile)
+        except Exception as e:
+            print(f"Error saving profile {profile.id}: {e}")
+
+    def bind(self, fn: Callable) -> Callable:
+        """
+        Attribute a callable's stacks to the current request's profile when
+        it runs on another thread. Returns `fn` unchanged if the request
+        isn't being profiled.
+        """
+        profile = profile_var.get()
+        if profile is None:
+            return fn
+
+        def run_profiled(*args, **kwargs):
+            profile.enter_thread()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.exit_thread()
+        return run_profiled
+
+    def _label(self, code) -> str:
+        label = self.frame_labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+            self.frame_labels[code] = label
+        return label
+
+    def _stack(self, frame) -> str:
+        labels = []
+        while frame is not None and len(labels) < MAX_STACK_DEPTH:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        return ';'.join(labels)
+
+    def _sample_loop(self):
+        """Sample the threads of every active profile until none are left."""
+        while True:
+            with self.lock:
+                if not self.active:
+                    self.sampler = None
+                    return
+                active = list(self.active)
+            frames = sys._current_frames()
+            for profile in active:
+                for ident in profile.thread_ids():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        profile.samples[self._stack(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def _save(self, profile: Profile):
+        self.profiles_dir.mkdir(parents=True, exist_ok=True)
+        lines = [f"{stack} {count}" for stack, count in profile.samples.most_common()]
+        (self.profiles_dir / f"{profile.id}.collapsed").write_text("\n".join(lines) + "\n")
+        (self.profiles_dir / f"{profile.id}.json").write_text(json.dumps(profile.info()))
+        # Drop the oldest profiles beyond the retention cap
+        for info in self.list()[self.max_stored:]:
+            for suffix in ('.collapsed', '.json'):
+                (self.profiles_dir / f"{info['id']}{suffix}").unlink(missing_ok=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Stored profiles, newest first."""
+        if not self.profiles_dir.exists():
+            return []
+        profiles = []
+        for path in self.profiles_dir.glob("*.json"):
+            try:
+                profiles.append(json.loads(path.read_text()))
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Error reading profile {path.name}: {e}")
+        profiles.sort(key=lambda info: info['started_at'], reverse=True)
+        return profiles
+
+    def path(self, profile_id: str) -> Optional[Path]:
+        """Collapsed-stack file for a stored profile, or None."""
+        # IDs are hex, so this also keeps lookups inside profiles_dir
+        if not profile_id.isalnum():
+            return None
+        path = self.profiles_dir / f"{profile_id}.collapsed"
+        return path if path.exists() else None
+
+# Global instance
+profiler = Profiler()
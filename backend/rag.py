@@ -1,13 +1,28 @@
 """
 Retrieval-Augmented Generation (RAG) pipeline for generating cited answers.
 """
-import ollama
-from typing import List, Dict, Any, Optional
+import asyncio
+import inspect
+import json
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple, Callable, Awaitable, Union
 from config import Config
-from vector_store import vector_store
+from partitions import Partition, partition_manager, merge_results
+from embeddings import embedding_engine
+from executors import io_executor, run_blocking
+from answer_cache import answer_cache
+from lexical_index import reciprocal_rank_fusion
+from vector_backends import split_source_filter
+from context_packer import pack_context
+from generation import generation_manager
+from metrics import rag_stage, record_rag_query
 
-# Configure Ollama client
-ollama_client = ollama.Client(host=Config.OLLAMA_BASE_URL)
+# Hybrid retrieval fetches this many times top_k from each retriever before fusing
+HYBRID_CANDIDATE_MULTIPLIER = 2
+
+NO_DOCUMENTS_ANSWER = "I don't have any documents indexed yet to answer your question. Please upload some documents using the 'Upload Documents' button first. Supported formats include PDFs, Markdown files, text files, and email (.eml) files. Once you've uploaded documents, I'll be able to help answer questions about them!"
+
+NO_MATCHING_DOCUMENTS_ANSWER = "I couldn't find anything relevant in the documents matching your filters. Try widening or removing the filters."
 
 class RAGPipeline:
     """Handles RAG queries with citation extraction."""
@@ -18,45 +33,229 @@ class RAGPipeline:
         self.embedding_model = Config.EMBEDDING_MODEL
         self.top_k = Config.TOP_K
     
-    def generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding for query text."""
-        try:
-            response = ollama_client.embeddings(
-                model=self.embedding_model,
-                prompt=text
+    async def generate_embedding(self, text: str) -> List[float]:
+        """Generate embedding for query text, reusing cached embeddings."""
+        with rag_stage('embed'):
+            return await embedding_engine.aembed_one(text)
+    
+    async def fan_out(self, names: List[str], search: Callable[[Partition], Any]) -> List[Any]:
+        """
+        Run a blocking search on several partitions concurrently, each on
+        its own I/O thread.
+        
+        Returns:
+            search(partition) for each named partition, in order
+        """
+        return list(await asyncio.gather(*(
+            run_blocking(io_executor, search, partition_manager.get(name)) for name in names
+        )))
+    
+    async def lexical_search(
+        self,
+        query: str,
+        top_k: int,
+        scopes: Dict[str, Optional[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """Keyword search over the partitions in scope without blocking the event loop."""
+        with rag_stage('lexical_search'):
+            searched = await self.fan_out(
+                list(scopes), lambda partition: partition.store.lexical_search(
+                    query, top_k=top_k, filter_dict=scopes[partition.name]
+                )
             )
-            return response['embedding']
-        except Exception as e:
-            print(f"Error generating embedding: {e}")
-            return []
+        return merge_results(searched, top_k)
+    
+    async def resolve_scopes(
+        self,
+        partitions: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Open the partitions to search and resolve document filters in each
+        (see VectorStore.scope_filter).
+        
+        Args:
+            partitions: Partition names (the default partition if None)
+            filters: Optional document filters
+            
+        Returns:
+            Partition name -> source filter (None for the whole partition),
+            leaving out partitions with no document in scope
+        """
+        return await run_blocking(io_executor, self._resolve_scopes, partitions, filters)
+    
+    def _resolve_scopes(
+        self,
+        partitions: Optional[List[str]],
+        filters: Optional[Dict[str, Any]]
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        scopes = {}
+        for partition in partition_manager.resolve(partitions):
+            where = partition.store.scope_filter(filters)
+            if split_source_filter(where)[0] != []:
+                scopes[partition.name] = where
+        return scopes
     
-    def retrieve_context(self, query: str, top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+    async def retrieve_context(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        query_embedding: Optional[Union[List[float], Awaitable[List[float]]]] = None,
+        mode: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        partitions: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Retrieve relevant context chunks for a query.
         
+        In hybrid mode the BM25 lookup runs concurrently with the embedding
+        call, and the two rankings are merged with reciprocal rank fusion.
+        Several partitions are searched concurrently and their results
+        merged (see merge_results).
+        
         Args:
             query: User query string
             top_k: Number of chunks to retrieve (defaults to config value)
+            query_embedding: Precomputed query embedding, or a task computing it
+            mode: "vector", "lexical" or "hybrid" (defaults to config value)
+            filters: Optional document filters (see VectorStore.scope_filter)
+            partitions: Partitions to search (the default partition if None)
             
         Returns:
             List of relevant chunks with metadata
         """
         if top_k is None:
             top_k = self.top_k
+        mode = mode or Config.RETRIEVAL_MODE
+        scopes = await self.resolve_scopes(partitions, filters)
+        if not scopes:
+            # No document in scope; skip the embedding call too
+            return []
         
-        # Generate query embedding
-        query_embedding = self.generate_embedding(query)
+        # Keyword fast path: no embedding round-trip at all
+        if mode == 'lexical':
+            return await self.lexical_search(query, top_k, scopes)
+        
+        candidates = top_k
+        lexical_task = None
+        if mode == 'hybrid':
+            candidates = top_k * HYBRID_CANDIDATE_MULTIPLIER
+            lexical_task = asyncio.ensure_future(self.lexical_search(query, candidates, scopes))
+        
+        # Generate query embedding (or wait for the one already being computed)
+        if inspect.isawaitable(query_embedding):
+            query_embedding = await query_embedding
         if not query_embedding:
-            return []
+            query_embedding = await self.generate_embedding(query)
         
-        # Search vector store
-        results = vector_store.search(query_embedding, top_k=top_k)
+        # Search each partition's vector store
+        vector_results = []
+        if query_embedding:
+            with rag_stage('vector_search'):
+                searched = await self.fan_out(
+                    list(scopes), lambda partition: partition.store.search(
+                        query_embedding, top_k=candidates, filter_dict=scopes[partition.name]
+                    )
+                )
+            vector_results = merge_results(searched, candidates)
         
+        if lexical_task is None:
+            return vector_results
+        lexical_results = await lexical_task
+        return reciprocal_rank_fusion([vector_results, lexical_results], top_k)
+    
+    async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embed many query texts in batches (empty list where embedding failed)."""
+        unique_texts = list(dict.fromkeys(texts))
+        with rag_stage('embed'):
+            result = await run_blocking(io_executor, embedding_engine.embed, unique_texts)
+        by_text = dict(zip(unique_texts, result['embeddings']))
+        return [by_text[text] or [] for text in texts]
+    
+    async def retrieve_many(self, queries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieve context for many queries at once.
+        
+        All queries that need vectors are embedded in batches and searched
+        with one multi-vector query per filter in each partition; keyword
+        lookups run alongside. Partitions are searched concurrently.
+        
+        Args:
+            queries: Dicts with 'query' and optional 'top_k', 'mode',
+                'filter' (a Chroma-style metadata filter), 'filters'
+                (document filters, see VectorStore.scope_filter) and
+                'partitions' (the default partition if None)
+            
+        Returns:
+            One list of chunks per query, in order
+        """
+        scopes = await run_blocking(
+            io_executor,
+            lambda: [self._resolve_scopes(item.get('partitions'), item.get('filters')) for item in queries]
+        )
+        specs = []
+        for item, query_scopes in zip(queries, scopes):
+            top_k = item.get('top_k') or self.top_k
+            mode = item.get('mode') or Config.RETRIEVAL_MODE
+            candidates = top_k * HYBRID_CANDIDATE_MULTIPLIER if mode == 'hybrid' else top_k
+            filter_dict = item.get('filter')
+            # Partition name -> the query's filter combined with the partition's scope
+            wheres = {
+                name: {'$and': [filter_dict, scope]} if filter_dict and scope else scope or filter_dict
+                for name, scope in query_scopes.items()
+            }
+            if not wheres:
+                # No document in scope: nothing to search
+                mode = None
+            specs.append((item['query'], top_k, mode, wheres, candidates))
+        names = list(dict.fromkeys(name for spec in specs for name in spec[3]))
+        
+        def lexical_search_all(partition: Partition) -> Dict[int, List[Dict[str, Any]]]:
+            return {
+                i: partition.store.lexical_search(query, top_k=candidates, filter_dict=wheres[partition.name])
+                for i, (query, _, mode, wheres, candidates) in enumerate(specs)
+                if mode in ('lexical', 'hybrid') and partition.name in wheres
+            }
+        async def timed_lexical_search_all() -> List[Dict[int, List[Dict[str, Any]]]]:
+            with rag_stage('lexical_search'):
+                return await self.fan_out(names, lexical_search_all)
+        lexical_task = asyncio.ensure_future(timed_lexical_search_all())
+        
+        vector_searched: List[Dict[int, List[Dict[str, Any]]]] = []
+        vector_indices = [i for i, spec in enumerate(specs) if spec[2] in ('vector', 'hybrid')]
+        if vector_indices:
+            embeddings = dict(zip(vector_indices, await self.generate_embeddings([specs[i][0] for i in vector_indices])))
+            
+            def vector_search_all(partition: Partition) -> Dict[int, List[Dict[str, Any]]]:
+                indices = [i for i in vector_indices if partition.name in specs[i][3]]
+                searched = partition.store.search_many(
+                    [embeddings[i] for i in indices],
+                    top_k=[specs[i][4] for i in indices],
+                    filters=[specs[i][3][partition.name] for i in indices]
+                )
+                return dict(zip(indices, searched))
+            with rag_stage('vector_search'):
+                vector_searched = await self.fan_out(names, vector_search_all)
+        lexical_searched = await lexical_task
+        
+        def merged(searched: List[Dict[int, List[Dict[str, Any]]]], i: int) -> List[Dict[str, Any]]:
+            return merge_results([by_query[i] for by_query in searched if i in by_query], specs[i][4])
+        
+        results = []
+        for i, (_, top_k, mode, _, _) in enumerate(specs):
+            if mode is None:
+                results.append([])
+            elif mode == 'vector':
+                results.append(merged(vector_searched, i))
+            elif mode == 'lexical':
+                results.append(merged(lexical_searched, i))
+            else:
+                results.append(reciprocal_rank_fusion([merged(vector_searched, i), merged(lexical_searched, i)], top_k))
         return results
     
     def format_context_with_citations(self, chunks: List[Dict[str, Any]]) -> str:
         """
-        Format retrieved chunks into context string with citations.
+        Format retrieved chunks (or packed passages) into context string with citations.
         
         Args:
             chunks: List of retrieved chunks
@@ -71,13 +270,29 @@ class RAGPipeline:
             chunk_index = metadata.get('chunk_index', 0)
             text = chunk.get('text', '')
             
+            chunk_indices = chunk.get('chunk_indices') or [chunk_index]
+            if len(chunk_indices) > 1:
+                label = f"Chunks {chunk_indices[0] + 1}-{chunk_indices[-1] + 1}"
+            else:
+                label = f"Chunk {chunk_index + 1}"
+            pages = self.page_label(metadata)
+            if pages:
+                label += f" ({pages})"
             context_parts.append(
                 f"[Citation {i}] Source: {source}\n"
-                f"Chunk {chunk_index + 1}: {text}\n"
+                f"{label}: {text}\n"
             )
         
         return "\n".join(context_parts)
     
+    def page_label(self, metadata: Dict[str, Any]) -> Optional[str]:
+        """"p. 4" or "pp. 4-6" for chunks from paged documents, else None."""
+        page_start = metadata.get('page_start')
+        if page_start is None:
+            return None
+        page_end = metadata.get('page_end', page_start)
+        return f"p. {page_start}" if page_end == page_start else f"pp. {page_start}-{page_end}"
+    
     def extract_citations(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         Extract citation information from retrieved chunks.
@@ -105,86 +320,130 @@ class RAGPipeline:
                     'source': source,
                     'filename': filename,
                     'chunk_index': metadata.get('chunk_index', 0),
+                    'chunk_indices': chunk.get('chunk_indices') or [metadata.get('chunk_index', 0)],
                     'text_preview': chunk.get('text', '')[:200] + '...' if len(chunk.get('text', '')) > 200 else chunk.get('text', ''),
-                    'file_type': metadata.get('file_type', '')
+                    'file_type': metadata.get('file_type', ''),
+                    'page_start': metadata.get('page_start'),
+                    'page_end': metadata.get('page_end')
                 })
                 seen_sources.add(citation_key)
         
         return citations
     
-    def generate_answer(
+    def build_messages(
         self,
         query: str,
         context: str,
         conversation_history: Optional[List[Dict[str, Any]]] = None
-    ) -> str:
+    ) -> List[Dict[str, str]]:
+        """Build the chat messages sent to the LLM (see GenerationManager)."""
+        return generation_manager.build_messages(query, context, conversation_history)
+    
+    async def complete(self, messages: List[Dict[str, str]]) -> str:
+        """Run a chat completion, raising on failure."""
+        response = await generation_manager.chat(messages)
+        return response['message']['content']
+    
+    async def lookup_cached_answer(
+        self,
+        query: str,
+        scope: Tuple,
+        conversation_history: Optional[List[Dict[str, Any]]] = None,
+        query_embedding: Optional[Awaitable[List[float]]] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]], Optional[int]]:
         """
-        Generate answer using LLM with context.
+        Check the answer cache, first by query text, then by embedding.
+        
+        Follow-up questions bypass the cache since their answers depend on
+        the conversation.
         
         Args:
             query: User query
-            context: Retrieved context with citations
+            scope: Retrieval settings the answer depends on
             conversation_history: Previous conversation messages
-            
+            query_embedding: The query's embedding, being computed; if given,
+                near-duplicate questions are matched by it too
+        
         Returns:
-            Generated answer string
+            (cached result or None, query embedding if awaited, corpus
+            version to store a new answer under, or None if uncacheable)
+        """
+        if not Config.ANSWER_CACHE_ENABLED or conversation_history:
+            return None, None, None
+        version = partition_manager.version
+        cached = answer_cache.get_exact(query, scope, version)
+        if cached is not None:
+            return cached, None, version
+        if query_embedding is None:
+            answer_cache.record_miss()
+            return None, None, version
+        query_embedding = await query_embedding
+        if query_embedding:
+            cached = answer_cache.get_similar(query_embedding, scope, version)
+        return cached, query_embedding, version
+    
+    async def lookup_and_retrieve(
+        self,
+        query: str,
+        scope: Tuple,
+        conversation_history: Optional[List[Dict[str, Any]]],
+        top_k: int,
+        mode: str,
+        filters: Optional[Dict[str, Any]],
+        partitions: Optional[List[str]]
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[asyncio.Future], Optional[List[float]], Optional[int]]:
         """
-        # Build prompt - simplified for faster generation
-        system_prompt = """You are a helpful AI assistant. Answer based on the provided context. Use [Citation X] when referencing sources. Be concise."""
+        Check the answer cache while retrieval gets going.
         
-        user_prompt = f"""Context:
-{context}
-
-Question: {query}
-
-Answer briefly based on the context. Cite sources with [Citation X]."""
-        
-        # Add conversation history if available
-        messages = []
-        if conversation_history:
-            for msg in conversation_history[-5:]:  # Last 5 messages for context
-                messages.append({
-                    'role': msg.get('role', 'user'),
-                    'content': msg.get('content', '')
-                })
+        The query embedding is computed once, in its own task shared by the
+        semantic cache lookup and retrieval, so retrieval doesn't wait for
+        the lookup: in hybrid mode the keyword search runs while the
+        embedding is computed. Retrieval is cancelled if an answer is cached.
+        
+        Returns:
+            (cached result or None, retrieval task (None if cached), query
+            embedding and corpus version (see lookup_cached_answer))
+        """
+        embedding_task = None
+        if mode != 'lexical':
+            embedding_task = asyncio.ensure_future(self.generate_embedding(query))
+        retrieval = asyncio.ensure_future(self.retrieve_context(
+            query, top_k=top_k, query_embedding=embedding_task, mode=mode, filters=filters,
+            partitions=partitions
+        ))
         
-        messages.append({
-            'role': 'system',
-            'content': system_prompt
-        })
-        messages.append({
-            'role': 'user',
-            'content': user_prompt
-        })
+        def cancel():
+            retrieval.cancel()
+            if embedding_task is not None:
+                embedding_task.cancel()
         
         try:
-            # Use options to speed up generation
-            response = ollama_client.chat(
-                model=self.model,
-                messages=messages,
-                options={
-                    'temperature': 0.7,
-                    'num_predict': 256,  # Shorter responses for faster generation
-                    'num_ctx': 2048,  # Limit context window
-                }
+            cached, query_embedding, version = await self.lookup_cached_answer(
+                query, scope, conversation_history, embedding_task
             )
-            
-            return response['message']['content']
-        except Exception as e:
-            print(f"Error generating answer: {e}")
-            import traceback
-            traceback.print_exc()
-            # Provide helpful error message
-            error_msg = str(e)
-            if 'timeout' in error_msg.lower() or 'connection' in error_msg.lower():
-                return "The request took too long or couldn't connect to Ollama. Please ensure Ollama is running and try again. If this persists, the model might be slow - try a simpler question."
-            return f"I encountered an error: {error_msg}. Please try again."
+        except BaseException:
+            cancel()
+            raise
+        if cached is not None:
+            cancel()
+            return cached, None, query_embedding, version
+        return None, retrieval, query_embedding, version
+    
+    def describe_generation_error(self, error: Exception) -> str:
+        """Turn an Ollama error into a helpful message for the user."""
+        error_msg = str(error)
+        if 'timeout' in error_msg.lower() or 'connection' in error_msg.lower():
+            return "The request took too long or couldn't connect to Ollama. Please ensure Ollama is running and try again. If this persists, the model might be slow - try a simpler question."
+        return f"I encountered an error: {error_msg}. Please try again."
     
-    def query(
+    async def query(
         self,
         query: str,
         conversation_history: Optional[List[Dict[str, Any]]] = None,
-        top_k: Optional[int] = None
+        top_k: Optional[int] = None,
+        mode: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        partitions: Optional[List[str]] = None
     ) -> Dict[str, Any]:
         """
         Complete RAG query pipeline.
@@ -193,46 +452,217 @@ Answer briefly based on the context. Cite sources with [Citation X]."""
             query: User query
             conversation_history: Previous conversation messages
             top_k: Number of chunks to retrieve
+            mode: Retrieval mode ("vector", "lexical" or "hybrid")
+            filters: Optional document filters (see VectorStore.scope_filter)
+            partitions: Partitions to search (the default partition if None)
             
         Returns:
-            Dict with 'answer', 'sources', and 'model'
+            Dict with 'answer', 'sources', 'model' and, for answers served
+            from the answer cache, 'cached'
         """
+        if top_k is None:
+            top_k = self.top_k
+        mode = mode or Config.RETRIEVAL_MODE
+        scope = (
+            top_k, mode, json.dumps(filters, sort_keys=True) if filters else None,
+            tuple(dict.fromkeys(partitions)) if partitions else None
+        )
+        
         try:
+            cached, retrieval, query_embedding, version = await self.lookup_and_retrieve(
+                query, scope, conversation_history, top_k, mode, filters, partitions
+            )
+            if cached is not None:
+                record_rag_query(mode, 'cached')
+                return {**cached, 'cached': True}
+            
             # Retrieve relevant context
-            chunks = self.retrieve_context(query, top_k=top_k)
+            chunks = await retrieval
             
             if not chunks:
                 # If no documents indexed, provide a quick helpful response without slow RAG
+                record_rag_query(mode, 'no_documents')
                 return {
-                    'answer': "I don't have any documents indexed yet to answer your question. Please upload some documents using the 'Upload Documents' button first. Supported formats include PDFs, Markdown files, text files, and email (.eml) files. Once you've uploaded documents, I'll be able to help answer questions about them!",
+                    'answer': NO_MATCHING_DOCUMENTS_ANSWER if filters else NO_DOCUMENTS_ANSWER,
                     'sources': [],
                     'model': self.model
                 }
             
-            # Format context
-            context = self.format_context_with_citations(chunks)
-            
-            # Generate answer
-            answer = self.generate_answer(query, context, conversation_history)
+            with rag_stage('context_build'):
+                # Merge neighbouring chunks and fit them to the context budget
+                passages = pack_context(chunks)
+                
+                # Format context
+                context = self.format_context_with_citations(passages)
+                messages = self.build_messages(query, context, conversation_history)
             
             # Extract citations
-            citations = self.extract_citations(chunks)
+            with rag_stage('citations'):
+                citations = self.extract_citations(passages)
             
-            return {
+            # Generate answer
+            try:
+                with rag_stage('generation'):
+                    answer = await self.complete(messages)
+            except Exception as e:
+                print(f"Error generating answer: {e}")
+                import traceback
+                traceback.print_exc()
+                record_rag_query(mode, 'generation_error')
+                return {
+                    'answer': self.describe_generation_error(e),
+                    'sources': citations,
+                    'model': self.model
+                }
+            
+            result = {
                 'answer': answer,
                 'sources': citations,
                 'model': self.model
             }
+            if version is not None:
+                answer_cache.put(query, query_embedding, scope, version, result)
+            record_rag_query(mode, 'answered')
+            return result
         except Exception as e:
             print(f"Error in RAG query: {e}")
             import traceback
             traceback.print_exc()
+            record_rag_query(mode, 'error')
             return {
                 'answer': f"I encountered an error processing your query: {str(e)}. Please try again or check if Ollama is running properly.",
                 'sources': [],
                 'model': self.model
             }
 
+    async def stream_query(
+        self,
+        query: str,
+        conversation_history: Optional[List[Dict[str, Any]]] = None,
+        top_k: Optional[int] = None,
+        mode: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        partitions: Optional[List[str]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming RAG query pipeline.
+        
+        Yields events as dicts with 'event' and 'data': one 'sources' event
+        as soon as retrieval finishes, one 'token' event per generated
+        fragment, then a final 'done' event with timings (or an 'error'
+        event if generation fails).
+        
+        Args:
+            query: User query
+            conversation_history: Previous conversation messages
+            top_k: Number of chunks to retrieve
+            mode: Retrieval mode ("vector", "lexical" or "hybrid")
+            filters: Optional document filters (see VectorStore.scope_filter)
+            partitions: Partitions to search (the default partition if None)
+        """
+        start_time = time.perf_counter()
+        
+        def elapsed_ms() -> float:
+            return round((time.perf_counter() - start_time) * 1000, 1)
+        
+        if top_k is None:
+            top_k = self.top_k
+        mode = mode or Config.RETRIEVAL_MODE
+        scope = (
+            top_k, mode, json.dumps(filters, sort_keys=True) if filters else None,
+            tuple(dict.fromkeys(partitions)) if partitions else None
+        )
+        
+        try:
+            cached, retrieval, query_embedding, version = await self.lookup_and_retrieve(
+                query, scope, conversation_history, top_k, mode, filters, partitions
+            )
+            if cached is not None:
+                record_rag_query(mode, 'cached')
+                yield {'event': 'sources', 'data': cached['sources']}
+                yield {'event': 'token', 'data': cached['answer']}
+                yield {
+                    'event': 'done',
+                    'data': {
+                        'model': self.model,
+                        'cached': True,
+                        'timings': {
+                            'retrieval_ms': elapsed_ms(),
+                            'time_to_first_token_ms': elapsed_ms(),
+                            'total_ms': elapsed_ms()
+                        }
+                    }
+                }
+                return
+            
+            chunks = await retrieval
+            retrieval_ms = elapsed_ms()
+            with rag_stage('context_build'):
+                passages = pack_context(chunks)
+                context = self.format_context_with_citations(passages)
+                messages = self.build_messages(query, context, conversation_history)
+            with rag_stage('citations'):
+                citations = self.extract_citations(passages)
+            yield {'event': 'sources', 'data': citations}
+            
+            if not chunks:
+                record_rag_query(mode, 'no_documents')
+                yield {'event': 'token', 'data': NO_MATCHING_DOCUMENTS_ANSWER if filters else NO_DOCUMENTS_ANSWER}
+                yield {
+                    'event': 'done',
+                    'data': {
+                        'model': self.model,
+                        'timings': {
+                            'retrieval_ms': retrieval_ms,
+                            'time_to_first_token_ms': elapsed_ms(),
+                            'total_ms': elapsed_ms()
+                        }
+                    }
+                }
+                return
+            
+            first_token_ms = None
+            final = {}
+            tokens = []
+            with rag_stage('generation'):
+                async for part in generation_manager.stream_chat(messages):
+                    token = part.get('message', {}).get('content', '')
+                    if token:
+                        if first_token_ms is None:
+                            first_token_ms = elapsed_ms()
+                        tokens.append(token)
+                        yield {'event': 'token', 'data': token}
+                    if part.get('done'):
+                        final = part
+            
+            if version is not None:
+                answer_cache.put(query, query_embedding, scope, version, {
+                    'answer': ''.join(tokens),
+                    'sources': citations,
+                    'model': self.model
+                })
+            
+            yield {
+                'event': 'done',
+                'data': {
+                    'model': self.model,
+                    'timings': {
+                        'retrieval_ms': retrieval_ms,
+                        'time_to_first_token_ms': first_token_ms,
+                        'total_ms': elapsed_ms()
+                    },
+                    'prompt_tokens': final.get('prompt_eval_count'),
+                    'completion_tokens': final.get('eval_count')
+                }
+            }
+            record_rag_query(mode, 'answered')
+        except Exception as e:
+            print(f"Error in streaming RAG query: {e}")
+            import traceback
+            traceback.print_exc()
+            record_rag_query(mode, 'error')
+            yield {'event': 'error', 'data': {'message': self.describe_generation_error(e)}}
+
 # Global instance
 rag_pipeline = RAGPipeline()
 
@@ -0,0 +1,197 @@
+"""
+Per-source index of stored chunks, kept alongside the vector store.
+
+Maps each source file to its chunk IDs, chunk count, stored text size and
+ingest time. Deleting or re-indexing a file can then remove its chunks by
+ID, without first querying the vector backend for them. It also gives a
+document-level view (how many files are indexed, and which) without
+scanning the collection. Maintained incrementally by VectorStore and
+persisted next to the Chroma database.
+"""
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Set, Tuple
+from config import Config
+
+class SourceIndex:
+    """Source → chunk IDs, count, bytes and ingest time."""
+
+    def __init__(self, path: Optional[Path] = None):
+        """Load the index from disk if it exists."""
+        self.path = path or Config.CHROMA_DB_PATH / "source_index.pkl"
+        self.lock = threading.RLock()
+        # source -> {'ids': {chunk_id: text bytes}, 'bytes': int, 'ingested_at': float}
+        self.sources: Dict[str, Dict[str, Any]] = {}
+        self.total_chunks = 0
+        self.dirty = False
+        self.last_flush = time.time()
+        self.loaded_from_disk = self._load()
+
+    def _load(self) -> bool:
+        if not self.path.exists():
+            return False
+        try:
+            with open(self.path, 'rb') as f:
+                state = pickle.load(f)
+            self.sources = state['sources']
+            self.total_chunks = sum(len(entry['ids']) for entry in self.sources.values())
+            return True
+        except Exception as e:
+            print(f"Error loading source index, starting empty: {e}")
+            return False
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    def __contains__(self, source: str) -> bool:
+        return source in self.sources
+
+    def add(
+        self,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        ingested_at: Optional[float] = None
+    ):
+        """
+        Record stored chunks, replacing any existing entries with the same IDs.
+
+        The ingest time comes from the chunks' 'ingested_at' metadata, then
+        the ingested_at argument, then the current time.
+        """
+        default_time = time.time() if ingested_at is None else ingested_at
+        with self.lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                source = metadata.get('source', '')
+                ingested_at = metadata.get('ingested_at', default_time)
+                entry = self.sources.get(source)
+                if entry is None:
+                    entry = self.sources[source] = {'ids': {}, 'bytes': 0, 'ingested_at': ingested_at}
+                size = len(text.encode('utf-8'))
+                previous = entry['ids'].get(doc_id)
+                if previous is None:
+                    self.total_chunks += 1
+                else:
+                    entry['bytes'] -= previous
+                entry['ids'][doc_id] = size
+                entry['bytes'] += size
+                entry['ingested_at'] = ingested_at
+            self.dirty = True
+
+    def ids(self, source: str) -> List[str]:
+        """IDs of a source's chunks (empty if it isn't indexed)."""
+        with self.lock:
+            entry = self.sources.get(source)
+            return list(entry['ids']) if entry else []
+
+    def scope_ids(self, sources: List[str]) -> Set[str]:
+        """IDs of every chunk from the given sources."""
+        with self.lock:
+            return set().union(*(self.sources[source]['ids'].keys() for source in sources if source in self.sources))
+
+    def delete_by_source(self, source: str) -> List[str]:
+        """Forget a source, returning the IDs of its chunks."""
+        with self.lock:
+            entry = self.sources.pop(source, None)
+            if entry is None:
+                return []
+            self.total_chunks -= len(entry['ids'])
+            self.dirty = True
+            return list(entry['ids'])
+
+    def get(self, source: str) -> Optional[Dict[str, Any]]:
+        """A source's document info (see list()), or None if it isn't indexed."""
+        with self.lock:
+            entry = self.sources.get(source)
+            return self._info(source, entry) if entry else None
+
+    def find(
+        self,
+        file_types: Optional[List[str]] = None,
+        source_prefix: Optional[str] = None,
+        filename: Optional[str] = None,
+        ingested_after: Optional[float] = None,
+        ingested_before: Optional[float] = None
+    ) -> List[str]:
+        """
+        Sources matching every given condition.
+
+        Args:
+            file_types: Lowercase extensions with the dot, e.g. [".pdf"]
+            source_prefix: Directory (or file) path; sources match it by
+                whole path components, so "/docs/team" doesn't match
+                "/docs/team-archive/..."
+            filename: Exact file name
+            ingested_after: Earliest ingest time (epoch seconds, inclusive)
+            ingested_before: Latest ingest time (epoch seconds, inclusive)
+        """
+        if source_prefix is not None:
+            source_prefix = source_prefix.rstrip('/' + os.sep)
+            directory = source_prefix + os.sep
+        with self.lock:
+            matches = []
+            for source, entry in self.sources.items():
+                if source_prefix is not None and source != source_prefix and not source.startswith(directory):
+                    continue
+                # os.path is much cheaper than Path over many sources
+                name = os.path.basename(source)
+                if filename is not None and name != filename:
+                    continue
+                if file_types is not None and os.path.splitext(name)[1].lower() not in file_types:
+                    continue
+                if ingested_after is not None and entry['ingested_at'] < ingested_after:
+                    continue
+                if ingested_before is not None and entry['ingested_at'] > ingested_before:
+                    continue
+                matches.append(source)
+            return matches
+
+    def list(self, offset: int = 0, limit: int = 50) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Page through indexed documents, ordered by source path.
+
+        Returns:
+            (total number of documents, list of dicts with 'source',
+            'filename', 'chunks', 'bytes' and 'ingested_at')
+        """
+        with self.lock:
+            sources = sorted(self.sources)[offset:offset + limit]
+            return len(self.sources), [self._info(source, self.sources[source]) for source in sources]
+
+    @staticmethod
+    def _info(source: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'source': source,
+            'filename': Path(source).name,
+            'chunks': len(entry['ids']),
+            'bytes': entry['bytes'],
+            'ingested_at': entry['ingested_at']
+        }
+
+    def clear(self):
+        with self.lock:
+            self.sources = {}
+            self.total_chunks = 0
+            self.dirty = True
+
+    def flush(self):
+        """Atomically persist the index if it changed."""
+        with self.lock:
+            if not self.dirty:
+                return
+            state = {'sources': self.sources}
+            tmp_path = self.path.with_suffix(".tmp")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+            self.last_flush = time.time()
+
+    def maybe_flush(self):
+        """Persist if enough time has passed since the last flush (same schedule as the BM25 index)."""
+        if self.dirty and time.time() - self.last_flush >= Config.LEXICAL_FLUSH_INTERVAL:
+            self.flush()
@@ -0,0 +1,147 @@
+"""
+Streaming upload handling: uploads are copied to disk in fixed-size chunks
+and hashed on the way, so memory use per upload stays bounded.
+"""
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+import aiofiles
+from fastapi import UploadFile
+from config import Config
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured size limit."""
+
+class InvalidUploadError(ValueError):
+    """Raised when an upload has no usable name, or shares its name with another in the request."""
+
+async def save_upload(upload: UploadFile, directory: Path, max_bytes: int) -> Dict[str, Any]:
+    """
+    Stream an uploaded file into a directory.
+    
+    The file is written to a temporary name first and renamed into place
+    once complete, so a partial upload never replaces an existing file.
+    
+    Args:
+        upload: Uploaded file
+        directory: Destination directory
+        max_bytes: Maximum accepted size
+        
+    Returns:
+        Dict with 'path', 'size', 'mtime' and 'sha256'
+    """
+    return _place(await _receive(upload, directory, max_bytes))
+
+async def save_uploads(
+    uploads: List[UploadFile],
+    directory: Path,
+    max_bytes: int,
+    max_total_bytes: int
+) -> List[Dict[str, Any]]:
+    """
+    Stream several uploaded files into a directory, keeping all or none.
+    
+    Every file is received under a temporary name first; they are only
+    renamed into place once all of them are within the limits, so a
+    rejected request leaves nothing behind in the directory. Files must
+    have distinct names, since they all land in the same directory.
+    
+    Args:
+        uploads: Uploaded files
+        directory: Destination directory
+        max_bytes: Maximum accepted size of each file
+        max_total_bytes: Maximum accepted size of all files together
+        
+    Returns:
+        One dict per file (see save_upload), in order
+    """
+    names = [_upload_name(upload) for upload in uploads]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise InvalidUploadError(f"More than one file named {', '.join(duplicates)} in the upload")
+    
+    received = []
+    remaining = max_total_bytes
+    try:
+        for upload in uploads:
+            # Files are received one at a time, so memory stays bounded by the read size
+            item = await _receive(upload, directory, max_bytes, remaining, max_total_bytes)
+            received.append(item)
+            remaining -= item['size']
+    except BaseException:
+        for item in received:
+            item['temp_path'].unlink(missing_ok=True)
+        raise
+    return [_place(item) for item in received]
+
+def _upload_name(upload: UploadFile) -> str:
+    """The name an upload is saved under."""
+    # Only keep the base name so uploads can't escape the directory
+    filename = Path(upload.filename or "").name
+    if not filename:
+        raise InvalidUploadError("Uploaded file has no name")
+    return filename
+
+async def _receive(
+    upload: UploadFile,
+    directory: Path,
+    max_bytes: int,
+    request_remaining: Optional[int] = None,
+    request_max_bytes: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Copy an upload to a temporary file in directory, hashing it on the way.
+    
+    Uploads that are part of a larger request also stop at the bytes the
+    request has left (request_remaining of request_max_bytes).
+    """
+    filename = _upload_name(upload)
+    
+    temp_path = directory / f".{filename}.{uuid.uuid4().hex}.part"
+    digest = hashlib.sha256()
+    size = 0
+    
+    try:
+        async with aiofiles.open(temp_path, 'wb') as f:
+            while True:
+                block = await upload.read(Config.UPLOAD_CHUNK_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    raise UploadTooLargeError(
+                        f"{filename} exceeds the {max_bytes // (1024 * 1024)} MB upload limit"
+                    )
+                if request_remaining is not None and size > request_remaining:
+                    raise UploadTooLargeError(
+                        f"Upload exceeds the {request_max_bytes // (1024 * 1024)} MB limit per request"
+                    )
+                digest.update(block)
+                await f.write(block)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    
+    return {
+        'path': directory / filename,
+        'temp_path': temp_path,
+        'size': size,
+        'sha256': digest.hexdigest()
+    }
+
+def _place(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Rename a received upload into place."""
+    final_path = item['path']
+    try:
+        os.replace(item['temp_path'], final_path)
+    except BaseException:
+        item['temp_path'].unlink(missing_ok=True)
+        raise
+    return {
+        'path': final_path,
+        'size': item['size'],
+        'mtime': final_path.stat().st_mtime_ns,
+        'sha256': item['sha256']
+    }
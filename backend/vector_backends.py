@@ -0,0 +1,794 @@
+"""
+Pluggable vector index backends.
+
+VectorStore talks to a VectorBackend; pick one with VECTOR_BACKEND:
+- "chroma": ChromaDB persistent collection with an HNSW index (default)
+- "numpy": brute-force search over a memory-mapped matrix, stored as
+  float32 or quantized to float16 / int8 (VECTOR_QUANTIZATION)
+"""
+import os
+import pickle
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+import numpy as np
+from config import Config
+
+INITIAL_CAPACITY = 1024
+# Compact the numpy index once this fraction of rows has been deleted
+COMPACT_DEAD_FRACTION = 0.25
+# Quantized rows are expanded to float32 this many at a time while scoring
+SCORE_BLOCK_ROWS = 4096
+# Queries scored together by search_many, bounding the rows x queries score matrix
+QUERY_BLOCK_SIZE = 64
+
+QUANTIZATION_DTYPES = {
+    'none': np.float32,
+    'float16': np.float16,
+    'int8': np.int8
+}
+FILE_SUFFIXES = {
+    np.float32: 'f32',
+    np.float16: 'f16',
+    np.int8: 'i8'
+}
+
+class VectorBackend(ABC):
+    """Storage and similarity search for chunk embeddings."""
+
+    # Most chunks a single add() accepts (None: no limit)
+    max_batch_size: Optional[int] = None
+    # Whether filtered searches are slow; VectorStore then serves searches
+    # limited to a few sources with get() and search_ids() instead
+    slow_filtered_search = False
+
+    @abstractmethod
+    def add(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]]
+    ):
+        """Store chunks with their embeddings, replacing any with the same IDs."""
+
+    @abstractmethod
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Find the nearest chunks to a query embedding.
+
+        Returns:
+            List of results with 'id', 'text', 'metadata' and cosine 'distance'
+        """
+
+    def search_many(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several query embeddings sharing a top_k and filter.
+
+        Returns:
+            One result list (see search()) per query, in order
+        """
+        return [self.search(query_embedding, top_k, where) for query_embedding in query_embeddings]
+
+    @abstractmethod
+    def search_ids(self, query_embeddings: List[List[float]], top_k: int) -> List[List[Tuple[str, float]]]:
+        """Nearest (chunk ID, distance) pairs per query, without fetching the chunks."""
+
+    @abstractmethod
+    def get(self, ids: List[str], include_embeddings: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Chunks by ID as {id: {'text', 'metadata'[, 'embedding']}}; unknown IDs are left out."""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """Delete chunks by ID; unknown IDs are ignored."""
+
+    @abstractmethod
+    def delete_by_source(self, source: str) -> int:
+        """Delete all chunks from a source, returning how many were removed."""
+
+    def delete_by_sources(self, sources: List[str]) -> int:
+        """Delete all chunks from several sources, returning how many were removed."""
+        return sum(self.delete_by_source(source) for source in sources)
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored chunks."""
+
+    @abstractmethod
+    def reset(self):
+        """Delete every chunk."""
+
+    @abstractmethod
+    def iter_documents(self, page_size: int = 1000) -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]]]]:
+        """Yield pages of (ids, texts, metadatas) for every stored chunk."""
+
+    @abstractmethod
+    def iter_embeddings(self, page_size: int = 1000) -> Iterator[Tuple[List[str], np.ndarray, List[str], List[Dict[str, Any]]]]:
+        """Yield pages of (ids, float32 embeddings, texts, metadatas)."""
+
+    def flush(self):
+        """Persist any buffered state."""
+
+    def maybe_flush(self):
+        """Persist buffered state if it is due; called after every write."""
+
+FILTER_OPERATORS = ('$eq', '$ne', '$in', '$nin', '$gt', '$gte', '$lt', '$lte')
+
+def split_source_filter(
+    where: Optional[Dict[str, Any]]
+) -> Tuple[Optional[List[str]], Optional[Dict[str, Any]]]:
+    """
+    Split a filter into the sources it limits results to and the rest of it.
+
+    Looks at a top-level 'source' condition ({"source": s} or
+    {"source": {"$in": [...]}}) and at the clauses of a top-level $and, so
+    backends can narrow by source first and only check what's left.
+
+    Returns:
+        (sources, rest): sources is None if the filter doesn't limit the
+        source; rest is None if there's nothing else to check
+    """
+    if not where:
+        return None, None
+    source = where.get('source')
+    if isinstance(source, dict) and set(source) == {'$in'}:
+        source = source['$in']
+    if isinstance(source, (str, list)):
+        rest = {key: condition for key, condition in where.items() if key != 'source'}
+        return [source] if isinstance(source, str) else source, rest or None
+    clauses = where.get('$and') or []
+    for i, clause in enumerate(clauses):
+        sources, clause_rest = split_source_filter(clause)
+        if sources is not None:
+            rest = {key: condition for key, condition in where.items() if key != '$and'}
+            remaining = clauses[:i] + ([clause_rest] if clause_rest else []) + clauses[i + 1:]
+            if remaining:
+                rest['$and'] = remaining
+            return sources, rest or None
+    return None, where
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Chroma-style metadata filter against one metadata dict."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == '$or':
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if op not in FILTER_OPERATORS:
+                    raise ValueError(f"Unsupported filter operator: {op}")
+                if op == '$eq' and value != operand:
+                    return False
+                if op == '$ne' and value == operand:
+                    return False
+                if op == '$in' and value not in operand:
+                    return False
+                if op == '$nin' and value in operand:
+                    return False
+                if op in ('$gt', '$gte', '$lt', '$lte'):
+                    if value is None:
+                        return False
+                    if op == '$gt' and not value > operand:
+                        return False
+                    if op == '$gte' and not value >= operand:
+                        return False
+                    if op == '$lt' and not value < operand:
+                        return False
+                    if op == '$lte' and not value <= operand:
+                        return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+class ChromaBackend(VectorBackend):
+    """ChromaDB persistent collection."""
+
+    # Chroma filters through SQLite before walking the HNSW graph
+    slow_filtered_search = True
+
+    def __init__(self, path: Optional[Path] = None, collection_name: str = "documents"):
+        """Initialize ChromaDB client and collection."""
+        import chromadb
+        from chromadb.config import Settings
+
+        self.collection_name = collection_name
+        self.client = chromadb.PersistentClient(
+            path=str(path or Config.CHROMA_DB_PATH),
+            settings=Settings(anonymized_telemetry=False)
+        )
+        self.collection = self._get_collection()
+        self.max_batch_size = self.client.max_batch_size
+
+    def _get_collection(self):
+        return self.client.get_or_create_collection(
+            name=self.collection_name,
+            metadata={"hnsw:space": "cosine"}
+        )
+
+    def add(self, ids, embeddings, texts, metadatas):
+        self.collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=metadatas
+        )
+
+    def search(self, query_embedding, top_k, where=None):
+        return self.search_many([query_embedding], top_k, where)[0]
+
+    def search_many(self, query_embeddings, top_k, where=None):
+        # Chroma rejects an empty $in rather than matching nothing
+        if split_source_filter(where)[0] == []:
+            return [[] for _ in query_embeddings]
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=top_k,
+            where=where
+        )
+
+        # Format results, one list per query
+        all_results = []
+        for q in range(len(query_embeddings)):
+            formatted_results = []
+            if results['ids'] and len(results['ids'][q]) > 0:
+                for i in range(len(results['ids'][q])):
+                    formatted_results.append({
+                        'id': results['ids'][q][i],
+                        'text': results['documents'][q][i],
+                        'metadata': results['metadatas'][q][i],
+                        'distance': results['distances'][q][i] if results.get('distances') else None
+                    })
+            all_results.append(formatted_results)
+        return all_results
+
+    def search_ids(self, query_embeddings, top_k):
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=top_k,
+            include=["distances"]
+        )
+        return [list(zip(ids, distances)) for ids, distances in zip(results['ids'], results['distances'])]
+
+    def get(self, ids, include_embeddings=False):
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        results = self.collection.get(ids=ids, include=include)
+        chunks = {}
+        for i, doc_id in enumerate(results['ids']):
+            chunk = {'text': results['documents'][i], 'metadata': results['metadatas'][i]}
+            if include_embeddings:
+                chunk['embedding'] = results['embeddings'][i]
+            chunks[doc_id] = chunk
+        return chunks
+
+    def delete(self, ids):
+        for start in range(0, len(ids), self.max_batch_size):
+            self.collection.delete(ids=ids[start:start + self.max_batch_size])
+
+    def delete_by_source(self, source):
+        return self.delete_by_sources([source])
+
+    def delete_by_sources(self, sources):
+        # Find every chunk of these sources in one query, then delete them in one call
+        where = {"source": sources[0]} if len(sources) == 1 else {"source": {"$in": sources}}
+        results = self.collection.get(where=where, include=[])
+        if results['ids']:
+            self.collection.delete(ids=results['ids'])
+        return len(results['ids'])
+
+    def count(self):
+        return self.collection.count()
+
+    def reset(self):
+        self.client.delete_collection(name=self.collection_name)
+        self.collection = self._get_collection()
+
+    def iter_documents(self, page_size=1000):
+        offset = 0
+        while True:
+            page = self.collection.get(
+                include=["documents", "metadatas"],
+                limit=page_size,
+                offset=offset
+            )
+            if not page['ids']:
+                break
+            yield page['ids'], page['documents'], page['metadatas']
+            offset += len(page['ids'])
+
+    def iter_embeddings(self, page_size=1000):
+        offset = 0
+        while True:
+            page = self.collection.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=page_size,
+                offset=offset
+            )
+            if not page['ids']:
+                break
+            yield (page['ids'], np.asarray(page['embeddings'], dtype=np.float32),
+                   page['documents'], page['metadatas'])
+            offset += len(page['ids'])
+
+class NumpyBackend(VectorBackend):
+    """
+    Brute-force search over L2-normalized embeddings in memory-mapped
+    matrices, with a row-level table of IDs, texts and metadata.
+
+    Vectors are stored as float32, float16, or int8 with one float32 scale
+    per vector. With rescoring, quantized indexes also keep a float32 copy
+    on disk; quantized scores pick a few candidates per result and only
+    those rows are read back at full precision.
+
+    Deleted rows are tombstoned and compacted away once they make up a
+    quarter of the matrix. Compaction writes new array files, and the row
+    table (which names the current files) is replaced atomically, so a crash
+    never leaves the table pointing at mismatched matrices.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        quantization: Optional[str] = None,
+        rescore: Optional[bool] = None
+    ):
+        """
+        Open (or create) the index directory.
+
+        An existing index keeps the storage mode it was built with;
+        quantization and rescore (VECTOR_QUANTIZATION / VECTOR_RESCORE by
+        default) apply to new indexes. Use migrate_vectors.py to convert.
+        """
+        self.path = path or Config.CHROMA_DB_PATH / "numpy_index"
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.requested_quantization = (quantization or Config.VECTOR_QUANTIZATION).lower()
+        if self.requested_quantization not in QUANTIZATION_DTYPES:
+            raise ValueError(f"Unknown vector quantization: {self.requested_quantization}")
+        self.requested_rescore = Config.VECTOR_RESCORE if rescore is None else rescore
+        self.lock = threading.RLock()
+        self._init_empty()
+        self._load()
+
+    def _init_empty(self):
+        self.quantization = self.requested_quantization
+        self.rescore = self.requested_rescore and self.quantization != 'none'
+        self.dim = 0
+        self.capacity = 0
+        self.rows = 0
+        self.generation = 0
+        self.arrays: Dict[str, np.memmap] = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.id_rows: Dict[str, int] = {}
+        self.source_rows: Dict[str, set] = {}
+        self.dirty = False
+        self.last_flush = time.time()
+
+    @property
+    def table_path(self) -> Path:
+        return self.path / "rows.pkl"
+
+    def _array_specs(self) -> Dict[str, Tuple[type, int]]:
+        """Name -> (dtype, columns) of every matrix in the current mode."""
+        specs = {'vectors': (QUANTIZATION_DTYPES[self.quantization], self.dim)}
+        if self.quantization == 'int8':
+            specs['scales'] = (np.float32, 1)
+        if self.rescore:
+            specs['full'] = (np.float32, self.dim)
+        return specs
+
+    def _array_path(self, name: str, generation: Optional[int] = None) -> Path:
+        dtype, _ = self._array_specs()[name]
+        generation = self.generation if generation is None else generation
+        return self.path / f"{name}-{generation}.{FILE_SUFFIXES[dtype]}"
+
+    def _open_array(self, name: str, capacity: int, generation: Optional[int] = None) -> np.memmap:
+        """Map an array file, growing it to hold `capacity` rows."""
+        dtype, columns = self._array_specs()[name]
+        path = self._array_path(name, generation)
+        shape = (capacity, columns) if columns > 1 else (capacity,)
+        with open(path, "ab") as f:
+            if f.tell() < capacity * columns * np.dtype(dtype).itemsize:
+                f.truncate(capacity * columns * np.dtype(dtype).itemsize)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _load(self):
+        if not self.table_path.exists():
+            return
+        try:
+            with open(self.table_path, 'rb') as f:
+                table = pickle.load(f)
+            self.quantization = table.get('quantization', 'none')
+            self.rescore = table.get('rescore', False)
+            self.dim = table['dim']
+            self.capacity = table['capacity']
+            self.generation = table['generation']
+            self.ids = table['ids']
+            self.texts = table['texts']
+            self.metadatas = table['metadatas']
+            self.rows = len(self.ids)
+            self.alive = np.zeros(self.capacity, dtype=bool)
+            self.alive[:self.rows] = np.frombuffer(table['alive'], dtype=bool)
+            if self.capacity:
+                self.arrays = {name: self._open_array(name, self.capacity) for name in self._array_specs()}
+        except Exception as e:
+            print(f"Error loading numpy index {self.path}, starting empty: {e}")
+            self._init_empty()
+            return
+        if self.quantization != self.requested_quantization:
+            print(f"Numpy index {self.path} is stored as {self.quantization}, not "
+                  f"{self.requested_quantization}; run migrate_vectors.py to convert it")
+        for row in np.nonzero(self.alive[:self.rows])[0]:
+            row = int(row)
+            self.id_rows[self.ids[row]] = row
+            self.source_rows.setdefault(self.metadatas[row].get('source', ''), set()).add(row)
+
+    def _ensure_capacity(self, needed: int, dim: int):
+        """Grow the memory-mapped matrices so they can hold `needed` rows."""
+        if self.dim and dim != self.dim:
+            raise ValueError(f"Embedding dimension {dim} does not match index dimension {self.dim}")
+        if needed <= self.capacity:
+            return
+        new_capacity = max(INITIAL_CAPACITY, self.capacity)
+        while new_capacity < needed:
+            new_capacity *= 2
+        for array in self.arrays.values():
+            array.flush()
+        self.dim = dim
+        self.arrays = {name: self._open_array(name, new_capacity) for name in self._array_specs()}
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:self.capacity] = self.alive
+        self.alive = alive
+        self.capacity = new_capacity
+
+    def _encode(self, matrix: np.ndarray) -> Dict[str, np.ndarray]:
+        """Convert normalized float32 rows into the stored arrays."""
+        if self.quantization == 'float16':
+            encoded = {'vectors': matrix.astype(np.float16)}
+        elif self.quantization == 'int8':
+            scales = np.abs(matrix).max(axis=1) / 127
+            scales[scales == 0] = 1
+            encoded = {
+                'vectors': np.round(matrix / scales[:, None]).astype(np.int8),
+                'scales': scales.astype(np.float32)
+            }
+        else:
+            encoded = {'vectors': matrix}
+        if self.rescore:
+            encoded['full'] = matrix
+        return encoded
+
+    def _decode(self, rows) -> np.ndarray:
+        """Float32 vectors for some rows, at full precision when available."""
+        if 'full' in self.arrays:
+            return np.array(self.arrays['full'][rows])
+        vectors = self.arrays['vectors'][rows].astype(np.float32)
+        if self.quantization == 'int8':
+            vectors *= self.arrays['scales'][rows][:, None]
+        return vectors
+
+    def _score(self, rows, queries: np.ndarray) -> np.ndarray:
+        """
+        Dot products of the stored (possibly quantized) rows with queries.
+
+        Args:
+            rows: Slice or array of row numbers
+            queries: (dim, n_queries) matrix of normalized queries
+
+        Returns:
+            (len(rows), n_queries) score matrix
+        """
+        vectors = self.arrays['vectors']
+        if self.quantization == 'none':
+            return vectors[rows] @ queries
+        if isinstance(rows, slice):
+            rows = range(rows.start or 0, rows.stop)
+        # Expand quantized rows block by block into one cache-sized float32 buffer,
+        # so the whole matrix never sits in RAM as float32
+        scores = np.empty((len(rows), queries.shape[1]), dtype=np.float32)
+        buffer = np.empty((min(len(rows), SCORE_BLOCK_ROWS), self.dim), dtype=np.float32)
+        for start in range(0, len(rows), SCORE_BLOCK_ROWS):
+            block = rows[start:start + SCORE_BLOCK_ROWS]
+            if isinstance(block, range):
+                block = slice(block.start, block.stop)
+            expanded = buffer[:len(scores[start:start + SCORE_BLOCK_ROWS])]
+            np.copyto(expanded, vectors[block], casting='unsafe')
+            block_scores = expanded @ queries
+            if self.quantization == 'int8':
+                block_scores *= self.arrays['scales'][block][:, None]
+            scores[start:start + len(block_scores)] = block_scores
+        return scores
+
+    def _kill_row(self, row: int):
+        self.alive[row] = False
+        self.id_rows.pop(self.ids[row], None)
+        source = self.metadatas[row].get('source', '')
+        rows = self.source_rows.get(source)
+        if rows is not None:
+            rows.discard(row)
+            if not rows:
+                del self.source_rows[source]
+
+    def add(self, ids, embeddings, texts, metadatas):
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        with self.lock:
+            self._ensure_capacity(self.rows + len(ids), matrix.shape[1])
+            for doc_id in ids:
+                # Re-adding an ID replaces the old row
+                if doc_id in self.id_rows:
+                    self._kill_row(self.id_rows[doc_id])
+            start = self.rows
+            for name, values in self._encode(matrix).items():
+                self.arrays[name][start:start + len(ids)] = values
+            self.alive[start:start + len(ids)] = True
+            for offset, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+                row = start + offset
+                self.ids.append(doc_id)
+                self.texts.append(text)
+                self.metadatas.append(metadata)
+                self.id_rows[doc_id] = row
+                self.source_rows.setdefault(metadata.get('source', ''), set()).add(row)
+            self.rows += len(ids)
+            self.dirty = True
+
+    def search(self, query_embedding, top_k, where=None):
+        return self.search_many([query_embedding], top_k, where)[0]
+
+    def search_many(self, query_embeddings, top_k, where=None):
+        all_results: List[List[Dict[str, Any]]] = [[] for _ in query_embeddings]
+        with self.lock:
+            if self.rows == 0:
+                return all_results
+            # Skip queries that can't be scored (failed embeddings, wrong model)
+            valid = [i for i, embedding in enumerate(query_embeddings)
+                     if len(embedding) == self.dim and np.any(embedding)]
+            if not valid:
+                return all_results
+            queries = np.asarray([query_embeddings[i] for i in valid], dtype=np.float32)
+            queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+            if where:
+                candidates = self._filter_rows(where)
+                available = len(candidates)
+                rows = candidates
+            else:
+                candidates = np.arange(self.rows)
+                available = len(self.id_rows)
+                rows = slice(0, self.rows)
+            k = min(top_k, available)
+            if k == 0:
+                return all_results
+            dead = None if where else ~self.alive[:self.rows]
+
+            for block_start in range(0, len(valid), QUERY_BLOCK_SIZE):
+                block = queries[block_start:block_start + QUERY_BLOCK_SIZE]
+                # Score only the rows a filter lets through
+                scores = self._score(rows, block.T)
+                if dead is not None:
+                    scores[dead] = -np.inf
+                for column, query in enumerate(block):
+                    all_results[valid[block_start + column]] = self._top_k(
+                        scores[:, column], candidates, query, k, available
+                    )
+        return all_results
+
+    def search_ids(self, query_embeddings, top_k):
+        # Results already hold the chunks, so there is nothing to save by leaving them out
+        return [
+            [(result['id'], result['distance']) for result in results]
+            for results in self.search_many(query_embeddings, top_k)
+        ]
+
+    def get(self, ids, include_embeddings=False):
+        with self.lock:
+            rows = [(doc_id, self.id_rows[doc_id]) for doc_id in dict.fromkeys(ids) if doc_id in self.id_rows]
+            vectors = self._decode([row for _, row in rows]) if include_embeddings and rows else None
+            chunks = {}
+            for i, (doc_id, row) in enumerate(rows):
+                chunk = {'text': self.texts[row], 'metadata': self.metadatas[row]}
+                if vectors is not None:
+                    chunk['embedding'] = vectors[i].tolist()
+                chunks[doc_id] = chunk
+            return chunks
+
+    def _top_k(self, scores: np.ndarray, candidates: np.ndarray, query: np.ndarray,
+               k: int, available: int) -> List[Dict[str, Any]]:
+        """Pick the k best candidates for one query, re-scoring if enabled."""
+        if self.rescore:
+            # Re-rank a few quantized candidates per result at full precision
+            pool = min(k * Config.VECTOR_RESCORE_MULTIPLIER, available)
+            top = np.argpartition(-scores, pool - 1)[:pool]
+            candidates = candidates[top]
+            scores = np.array(self.arrays['full'][candidates]) @ query
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for position in top:
+            row = int(candidates[position])
+            results.append({
+                'id': self.ids[row],
+                'text': self.texts[row],
+                'metadata': self.metadatas[row],
+                'distance': float(1.0 - scores[position])
+            })
+        return results
+
+    def _filter_rows(self, where: Dict[str, Any]) -> np.ndarray:
+        """Live rows whose metadata matches a filter."""
+        sources, rest = split_source_filter(where)
+        if sources is not None:
+            # Narrow by the source index, then check only the other conditions
+            rows = sorted(row for source in sources for row in self.source_rows.get(source, ()))
+        else:
+            rows = np.nonzero(self.alive[:self.rows])[0]
+        if rest:
+            rows = [row for row in rows if matches_where(self.metadatas[row], rest)]
+        return np.array(rows, dtype=np.int64)
+
+    def delete(self, ids):
+        with self.lock:
+            rows = [self.id_rows[doc_id] for doc_id in ids if doc_id in self.id_rows]
+            for row in rows:
+                self._kill_row(row)
+            if rows:
+                self.dirty = True
+
+    def delete_by_source(self, source):
+        with self.lock:
+            rows = list(self.source_rows.get(source, ()))
+            for row in rows:
+                self._kill_row(row)
+            if rows:
+                self.dirty = True
+            return len(rows)
+
+    def count(self):
+        with self.lock:
+            return len(self.id_rows)
+
+    def reset(self):
+        with self.lock:
+            self.arrays = {}
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._init_empty()
+
+    def _live_rows(self) -> List[int]:
+        with self.lock:
+            return [int(row) for row in np.nonzero(self.alive[:self.rows])[0]]
+
+    def iter_documents(self, page_size=1000):
+        live_rows = self._live_rows()
+        for start in range(0, len(live_rows), page_size):
+            page = live_rows[start:start + page_size]
+            yield ([self.ids[row] for row in page],
+                   [self.texts[row] for row in page],
+                   [self.metadatas[row] for row in page])
+
+    def iter_embeddings(self, page_size=1000):
+        live_rows = self._live_rows()
+        for start in range(0, len(live_rows), page_size):
+            page = live_rows[start:start + page_size]
+            with self.lock:
+                vectors = self._decode(page)
+            yield ([self.ids[row] for row in page],
+                   vectors,
+                   [self.texts[row] for row in page],
+                   [self.metadatas[row] for row in page])
+
+    def storage_bytes(self) -> int:
+        """Size of the vector array files on disk."""
+        return sum(self._array_path(name).stat().st_size for name in self.arrays)
+
+    def _compact(self) -> List[Path]:
+        """
+        Copy live rows into new array files.
+
+        Returns:
+            The old array files, to delete once the new table is saved
+        """
+        live_rows = np.nonzero(self.alive[:self.rows])[0]
+        capacity = INITIAL_CAPACITY
+        while capacity < len(live_rows):
+            capacity *= 2
+        old_paths = [self._array_path(name) for name in self.arrays]
+        generation = self.generation + 1
+        arrays = {}
+        for name, array in self.arrays.items():
+            arrays[name] = self._open_array(name, capacity, generation)
+            for start in range(0, len(live_rows), SCORE_BLOCK_ROWS):
+                block = live_rows[start:start + SCORE_BLOCK_ROWS]
+                arrays[name][start:start + len(block)] = array[block]
+        self.arrays = arrays
+        self.generation = generation
+        self.capacity = capacity
+        self.rows = len(live_rows)
+        self.ids = [self.ids[row] for row in live_rows]
+        self.texts = [self.texts[row] for row in live_rows]
+        self.metadatas = [self.metadatas[row] for row in live_rows]
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.alive[:self.rows] = True
+        self.id_rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.source_rows = {}
+        for row, metadata in enumerate(self.metadatas):
+            self.source_rows.setdefault(metadata.get('source', ''), set()).add(row)
+        return old_paths
+
+    def flush(self):
+        """Persist the row table, compacting if worthwhile."""
+        with self.lock:
+            if not self.dirty:
+                return
+            stale_paths = []
+            if self.rows and 1 - len(self.id_rows) / self.rows >= COMPACT_DEAD_FRACTION:
+                stale_paths = self._compact()
+            for array in self.arrays.values():
+                array.flush()
+            table = {
+                'quantization': self.quantization,
+                'rescore': self.rescore,
+                'dim': self.dim,
+                'capacity': self.capacity,
+                'generation': self.generation,
+                'ids': self.ids,
+                'texts': self.texts,
+                'metadatas': self.metadatas,
+                'alive': self.alive[:self.rows].tobytes()
+            }
+            tmp_path = self.table_path.with_suffix(".tmp")
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(table, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.table_path)
+            for path in stale_paths:
+                if path.exists():
+                    os.remove(path)
+            self.dirty = False
+            self.last_flush = time.time()
+
+    def maybe_flush(self):
+        """Persist if enough time has passed since the last flush."""
+        if self.dirty and time.time() - self.last_flush >= Config.VECTOR_FLUSH_INTERVAL:
+            self.flush()
+
+def create_backend(
+    name: Optional[str] = None,
+    path: Optional[Path] = None,
+    collection_name: str = "documents"
+) -> VectorBackend:
+    """
+    Create the configured vector backend.
+
+    Args:
+        name: "chroma" or "numpy" (defaults to Config.VECTOR_BACKEND)
+        path: Data directory (defaults to Config.CHROMA_DB_PATH)
+        collection_name: Chroma collection to open
+    """
+    name = (name or Config.VECTOR_BACKEND).lower()
+    if name == "chroma":
+        return ChromaBackend(path, collection_name)
+    if name == "numpy":
+        return NumpyBackend(path / "numpy_index" if path else None)
+    raise ValueError(f"Unknown vector backend: {name}")
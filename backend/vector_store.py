@@ -1,26 +1,89 @@
 """
-Vector store management using ChromaDB for embedding storage and retrieval.
+Vector store management for embedding storage and retrieval.
+
+Vectors live in a pluggable backend (see vector_backends); a BM25 index is
+kept alongside for keyword search, and a source index for per-document
+bookkeeping (see source_index). Bulk ingestion writes through a
+BulkWriter, which batches chunks from many files into few backend calls.
 """
-import chromadb
-from chromadb.config import Settings
+from collections import Counter
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 import hashlib
+import json
+import math
+import numpy as np
 from config import Config
+from lexical_index import BM25Index
+from source_index import SourceIndex
+from vector_backends import VectorBackend, create_backend, split_source_filter
+from lazy import LazyInstance
+
+# Page size when rebuilding the lexical and source indexes from the vector backend
+REBUILD_PAGE_SIZE = 1000
+# Resolved document filters remembered until the store changes
+SCOPE_CACHE_SIZE = 64
+# On backends with slow filtered search: scopes up to this many chunks are
+# scored exactly from their embeddings...
+EXACT_SCOPE_MAX_CHUNKS = 256
+# ...larger ones come from an unfiltered search over-fetched by this factor
+# (beyond the scope's share of the collection), up to this many results
+SCOPE_OVERFETCH_FACTOR = 2
+SCOPE_OVERFETCH_MAX_RESULTS = 1000
+
+def chunk_ids(texts: List[str], metadatas: List[Dict[str, Any]]) -> List[str]:
+    """
+    Stable chunk IDs from content, source and chunk index.
+    
+    Re-ingesting the same chunk gives the same ID, so writes are idempotent.
+    """
+    return [
+        hashlib.md5(f"{text}_{metadata.get('source', '')}_{metadata.get('chunk_index', i)}".encode()).hexdigest()
+        for i, (text, metadata) in enumerate(zip(texts, metadatas))
+    ]
 
 class VectorStore:
-    """Manages vector storage and retrieval using ChromaDB."""
+    """Manages vector storage and retrieval on top of a vector backend."""
     
-    def __init__(self):
-        """Initialize ChromaDB client and collection."""
-        self.client = chromadb.PersistentClient(
-            path=str(Config.CHROMA_DB_PATH),
-            settings=Settings(anonymized_telemetry=False)
-        )
-        self.collection = self.client.get_or_create_collection(
-            name="documents",
-            metadata={"hnsw:space": "cosine"}
-        )
+    def __init__(self, backend: Optional[VectorBackend] = None, path: Optional[Path] = None):
+        """
+        Initialize the vector backend (VECTOR_BACKEND by default).
+        
+        Args:
+            backend: Vector backend to store embeddings in
+            path: Directory for the BM25 and source indexes (CHROMA_DB_PATH by default)
+        """
+        self.backend = backend or create_backend()
+        # Bumped on every change so caches can tell when results went stale
+        self.version = 0
+        self.lexical_index = BM25Index(path / "lexical_index.pkl" if path else None)
+        self.source_index = SourceIndex(path / "source_index.pkl" if path else None)
+        # json of filters -> (version, resolved filter)
+        self.scope_cache: Dict[str, tuple] = {}
+        # The BM25 index is only saved on flush, so after a crash it can be behind the backend
+        if len(self.lexical_index) != self.backend.count():
+            self.rebuild_lexical_index()
+        if not self.source_index.loaded_from_disk and self.backend.count() > 0:
+            self.rebuild_source_index()
+    
+    def rebuild_lexical_index(self):
+        """Rebuild the BM25 index from the documents in the vector backend."""
+        self.lexical_index.clear()
+        for ids, texts, metadatas in self.backend.iter_documents(REBUILD_PAGE_SIZE):
+            self.lexical_index.add(ids, texts, metadatas)
+        self.lexical_index.flush()
+    
+    def rebuild_source_index(self):
+        """
+        Rebuild the source index from the documents in the vector backend.
+        
+        Chunks stored before ingest times were recorded in their metadata
+        get the time of the rebuild.
+        """
+        self.source_index.clear()
+        for ids, texts, metadatas in self.backend.iter_documents(REBUILD_PAGE_SIZE):
+            self.source_index.add(ids, texts, metadatas)
+        self.source_index.flush()
     
     def add_documents(
         self,
@@ -29,7 +92,7 @@ class VectorStore:
         embeddings: Optional[List[List[float]]] = None
     ) -> List[str]:
         """
-        Add documents to the vector store.
+        Add documents to the vector store, replacing any with the same IDs.
         
         Args:
             texts: List of text chunks
@@ -39,32 +102,105 @@ class VectorStore:
         Returns:
             List of document IDs
         """
-        # Generate IDs based on content and metadata
-        ids = []
-        for i, (text, metadata) in enumerate(zip(texts, metadatas)):
-            # Create unique ID from content hash and metadata
-            content_hash = hashlib.md5(
-                f"{text}_{metadata.get('source', '')}_{metadata.get('chunk_index', i)}".encode()
-            ).hexdigest()
-            ids.append(content_hash)
-        
-        # Add to collection
-        # Note: ChromaDB requires embeddings to be provided if using custom embeddings
-        # If embeddings are None, we'll let ChromaDB handle it (but we're using custom embeddings)
+        ids = chunk_ids(texts, metadatas)
+        
+        # Add to the backend
+        # Note: we always provide our own embeddings; backends don't compute them
         if embeddings and len(embeddings) > 0:
-            self.collection.add(
-                ids=ids,
-                embeddings=embeddings,
-                documents=texts,
-                metadatas=metadatas
-            )
+            self.backend.add(ids, embeddings, texts, metadatas)
+            self.lexical_index.add(ids, texts, metadatas)
+            self.source_index.add(ids, texts, metadatas)
+            self.backend.maybe_flush()
+            self.source_index.maybe_flush()
+            self.version += 1
         else:
-            # ChromaDB will compute embeddings if not provided (requires embedding function)
             # For now, we always provide embeddings from Ollama
             raise ValueError("Embeddings must be provided for this implementation")
         
         return ids
     
+    def scope_filter(self, filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Resolve document filters to a metadata filter on source.
+        
+        Filters are matched against the source index rather than chunk
+        metadata, so backends get a list of sources they can look up
+        directly instead of checking every chunk.
+        
+        Args:
+            filters: Dict with any of 'file_type' (extension or list of
+                extensions), 'source_prefix', 'filename', 'ingested_after'
+                and 'ingested_before' (epoch seconds)
+            
+        Returns:
+            None if every document matches, otherwise a Chroma-style filter
+            on 'source' (with an empty $in if no document matches)
+        """
+        if not filters:
+            return None
+        key = json.dumps(filters, sort_keys=True)
+        version = self.version
+        cached = self.scope_cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        
+        file_types = filters.get('file_type')
+        if isinstance(file_types, str):
+            file_types = [file_types]
+        if file_types is not None:
+            file_types = ['.' + file_type.lower().lstrip('.') for file_type in file_types]
+        sources = self.source_index.find(
+            file_types=file_types,
+            source_prefix=filters.get('source_prefix'),
+            filename=filters.get('filename'),
+            ingested_after=filters.get('ingested_after'),
+            ingested_before=filters.get('ingested_before')
+        )
+        if len(sources) == len(self.source_index):
+            where = None
+        elif len(sources) == 1:
+            where = {'source': sources[0]}
+        else:
+            where = {'source': {'$in': sorted(sources)}}
+        
+        if len(self.scope_cache) >= SCOPE_CACHE_SIZE:
+            self.scope_cache.pop(next(iter(self.scope_cache)), None)
+        self.scope_cache[key] = (version, where)
+        return where
+    
+    def lexical_search(
+        self,
+        query: str,
+        top_k: int = 5,
+        filter_dict: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Search for documents by keyword using the BM25 index.
+        
+        Args:
+            query: Query text
+            top_k: Number of results to return
+            filter_dict: Optional metadata filters
+            
+        Returns:
+            List of search results with documents, metadatas and BM25 scores
+        """
+        results = self.lexical_index.search(query, top_k=top_k, where=filter_dict)
+        if not results:
+            return results
+        # The BM25 index doesn't keep chunk text; fetch it for the hits only
+        chunks = self.backend.get([result['id'] for result in results])
+        return [
+            {**result, 'text': chunks[result['id']]['text']}
+            for result in results if result['id'] in chunks
+        ]
+    
+    def flush(self):
+        """Persist in-memory indexes."""
+        self.backend.flush()
+        self.lexical_index.flush()
+        self.source_index.flush()
+    
     def search(
         self,
         query_embedding: List[float],
@@ -82,32 +218,145 @@ class VectorStore:
         Returns:
             List of search results with documents, metadatas, and distances
         """
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k,
-            where=filter_dict
-        )
+        return self.search_many([query_embedding], top_k, [filter_dict])[0]
+    
+    def search_many(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: Union[int, List[int]] = 5,
+        filters: Optional[List[Optional[Dict[str, Any]]]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for many query embeddings at once.
+        
+        Queries with the same filter go to the backend as one multi-vector
+        query using the group's largest top_k, then each is trimmed to its
+        own top_k.
         
-        # Format results
-        formatted_results = []
-        if results['ids'] and len(results['ids'][0]) > 0:
-            for i in range(len(results['ids'][0])):
-                formatted_results.append({
-                    'id': results['ids'][0][i],
-                    'text': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i] if 'distances' in results else None
-                })
+        Args:
+            query_embeddings: Query vector embeddings (empty ones get no results)
+            top_k: Number of results, for all queries or per query
+            filters: Optional metadata filters, one per query
+            
+        Returns:
+            One list of search results (see search()) per query, in order
+        """
+        top_ks = top_k if isinstance(top_k, list) else [top_k] * len(query_embeddings)
+        filters = filters or [None] * len(query_embeddings)
+        groups: Dict[str, List[int]] = {}
+        for i, query_embedding in enumerate(query_embeddings):
+            if query_embedding:
+                groups.setdefault(json.dumps(filters[i], sort_keys=True), []).append(i)
         
-        return formatted_results
+        results: List[List[Dict[str, Any]]] = [[] for _ in query_embeddings]
+        for indices in groups.values():
+            group_queries = [query_embeddings[i] for i in indices]
+            group_top_k = max(top_ks[i] for i in indices)
+            where = filters[indices[0]]
+            group_results = None
+            if where and self.backend.slow_filtered_search:
+                group_results = self._search_source_scope(group_queries, group_top_k, where)
+            if group_results is None:
+                group_results = self.backend.search_many(group_queries, group_top_k, where=where)
+            for i, query_results in zip(indices, group_results):
+                results[i] = query_results[:top_ks[i]]
+        return results
+    
+    def _search_source_scope(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int,
+        where: Dict[str, Any]
+    ) -> Optional[List[List[Dict[str, Any]]]]:
+        """
+        Search a few sources' chunks without a filtered backend search.
+        
+        The source index has the scope's chunk IDs. Small scopes are scored
+        exactly from their embeddings; larger ones are cut from an unfiltered
+        ID-only search, over-fetched by the scope's share of the collection.
+        
+        Returns:
+            Results per query (see search()), or None if the filter isn't
+            just a list of sources, the scope falls between the two cases,
+            or an over-fetch came back with too few chunks in scope
+        """
+        sources, rest = split_source_filter(where)
+        if sources is None or rest:
+            return None
+        scoped = self.source_index.scope_ids(sources)
+        if not scoped:
+            return [[] for _ in query_embeddings]
+        
+        if len(scoped) <= EXACT_SCOPE_MAX_CHUNKS:
+            chunks = self.backend.get(list(scoped), include_embeddings=True)
+            if not chunks:
+                return [[] for _ in query_embeddings]
+            ids = list(chunks)
+            matrix = np.asarray([chunks[doc_id]['embedding'] for doc_id in ids], dtype=np.float32)
+            queries = np.asarray(query_embeddings, dtype=np.float32)
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+            similarities = queries @ matrix.T
+            results = []
+            for row in similarities:
+                top = np.argsort(-row)[:top_k]
+                results.append([
+                    {
+                        'id': ids[j],
+                        'text': chunks[ids[j]]['text'],
+                        'metadata': chunks[ids[j]]['metadata'],
+                        'distance': float(1.0 - row[j])
+                    }
+                    for j in top
+                ])
+            return results
+        
+        total = max(self.source_index.total_chunks, len(scoped))
+        fetch = min(total, math.ceil(top_k * SCOPE_OVERFETCH_FACTOR * total / len(scoped)))
+        if fetch > SCOPE_OVERFETCH_MAX_RESULTS:
+            return None
+        kept = [
+            [(doc_id, distance) for doc_id, distance in hits if doc_id in scoped][:top_k]
+            for hits in self.backend.search_ids(query_embeddings, fetch)
+        ]
+        if any(len(hits) < top_k for hits in kept):
+            return None
+        chunks = self.backend.get(list({doc_id for hits in kept for doc_id, _ in hits}))
+        return [
+            [
+                {
+                    'id': doc_id,
+                    'text': chunks[doc_id]['text'],
+                    'metadata': chunks[doc_id]['metadata'],
+                    'distance': distance
+                }
+                for doc_id, distance in hits if doc_id in chunks
+            ]
+            for hits in kept
+        ]
     
     def get_collection_stats(self) -> Dict[str, int]:
         """Get statistics about the collection."""
-        count = self.collection.count()
         return {
-            'total_documents': count
+            'total_documents': len(self.source_index),
+            'total_chunks': self.backend.count()
         }
     
+    def list_documents(self, offset: int = 0, limit: int = 50) -> Dict[str, Any]:
+        """
+        Page through indexed documents, ordered by source path.
+        
+        Args:
+            offset: Documents to skip
+            limit: Maximum documents to return
+            
+        Returns:
+            Dict with 'total' and 'documents' (dicts with 'source',
+            'filename', 'chunks', 'bytes' and 'ingested_at')
+        """
+        total, documents = self.source_index.list(offset, limit)
+        return {'total': total, 'documents': documents}
+    
     def delete_by_source(self, source: str) -> bool:
         """
         Delete all documents from a specific source.
@@ -119,30 +368,179 @@ class VectorStore:
             True if successful
         """
         try:
-            # Get all documents with this source
-            results = self.collection.get(
-                where={"source": source}
-            )
-            
-            if results['ids']:
-                self.collection.delete(ids=results['ids'])
-            
+            self.delete_by_sources([source])
             return True
         except Exception as e:
             print(f"Error deleting documents: {e}")
             return False
     
+    def delete_by_sources(self, sources: List[str]) -> int:
+        """
+        Delete all documents from several sources with one backend call.
+        
+        Chunk IDs come from the source index, so the backend doesn't have to
+        look them up. Unlike delete_by_source, errors are raised.
+        
+        Args:
+            sources: Source file paths
+            
+        Returns:
+            Number of chunks removed
+        """
+        if not sources:
+            return 0
+        ids = [doc_id for source in sources for doc_id in self.source_index.ids(source)]
+        # The BM25 index needs the chunks' text to find their postings
+        lexical_ids = self.lexical_index.ids(sources)
+        texts = {}
+        if lexical_ids:
+            texts = {doc_id: chunk['text'] for doc_id, chunk in self.backend.get(lexical_ids).items()}
+        if ids:
+            self.backend.delete(ids)
+        removed = len(ids)
+        # Sources missing from the index (e.g. written just before a crash) are looked up
+        unknown = [source for source in sources if source not in self.source_index]
+        if unknown:
+            removed += self.backend.delete_by_sources(unknown)
+        if removed:
+            self.version += 1
+        self.lexical_index.delete_by_sources(sources, texts)
+        for source in sources:
+            self.source_index.delete_by_source(source)
+        self.backend.maybe_flush()
+        self.source_index.maybe_flush()
+        return removed
+    
+    def bulk_writer(self, batch_size: Optional[int] = None) -> "BulkWriter":
+        """Open a BulkWriter on this store (see BulkWriter)."""
+        return BulkWriter(self, batch_size)
+    
     def reset(self):
         """Reset the entire collection (use with caution!)."""
         try:
-            self.client.delete_collection(name="documents")
-            self.collection = self.client.get_or_create_collection(
-                name="documents",
-                metadata={"hnsw:space": "cosine"}
-            )
+            self.version += 1
+            self.backend.reset()
+            self.backend.flush()
+            self.lexical_index.clear()
+            self.lexical_index.flush()
+            self.source_index.clear()
+            self.source_index.flush()
         except Exception as e:
             print(f"Error resetting collection: {e}")
 
-# Global instance
-vector_store = VectorStore()
+class BulkWriter:
+    """
+    Buffers chunk writes into size-bounded upserts.
+    
+    Chunks from any number of files collect until a batch is full, then go
+    to the backend in one call, capped at the backend's max_batch_size.
+    Deleting a file's old chunks (replace()) is deferred too: all pending
+    deletions run in one call right before the next write.
+    
+    Nothing is guaranteed stored until flush() or close(); used as a
+    context manager it closes on exit, even after an error. Failed writes
+    don't raise: they're recorded in `errors` by source, and that source's
+    later chunks are dropped. Not thread-safe; use one writer per thread.
+    """
+    
+    def __init__(self, store: VectorStore, batch_size: Optional[int] = None):
+        """
+        Args:
+            store: Vector store to write to
+            batch_size: Chunks per write (INGEST_WRITE_BATCH_SIZE by default)
+        """
+        self.store = store
+        self.batch_size = max(1, batch_size or Config.INGEST_WRITE_BATCH_SIZE)
+        if store.backend.max_batch_size:
+            self.batch_size = min(self.batch_size, store.backend.max_batch_size)
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.embeddings: List[List[float]] = []
+        # Source -> buffered chunks
+        self.buffered: Counter = Counter()
+        self.to_delete: List[str] = []
+        # Source -> first error storing its chunks
+        self.errors: Dict[str, str] = {}
+        # Backend calls made (deletions and writes)
+        self.round_trips = 0
+    
+    def __enter__(self) -> "BulkWriter":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def replace(self, source: str):
+        """Delete a source's stored chunks before anything else is written."""
+        if source not in self.to_delete:
+            self.to_delete.append(source)
+    
+    def add(
+        self,
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        embeddings: List[List[float]]
+    ):
+        """Buffer chunks, writing every batch that fills up."""
+        for text, metadata, embedding in zip(texts, metadatas, embeddings):
+            source = metadata.get('source', '')
+            if source in self.errors:
+                continue
+            self.texts.append(text)
+            self.metadatas.append(metadata)
+            self.embeddings.append(embedding)
+            self.buffered[source] += 1
+        while len(self.texts) >= self.batch_size:
+            self._write()
+    
+    def pending(self, source: str) -> bool:
+        """Whether a source has chunks or a deletion not yet written."""
+        return source in self.buffered or source in self.to_delete
+    
+    def flush(self):
+        """Write everything buffered."""
+        while self.texts or self.to_delete:
+            self._write()
+    
+    def close(self):
+        """Write everything buffered; the writer shouldn't be used afterwards."""
+        self.flush()
+    
+    def _write(self):
+        if self.to_delete:
+            sources, self.to_delete = self.to_delete, []
+            try:
+                self.round_trips += 1
+                self.store.delete_by_sources(sources)
+            except Exception as e:
+                for source in sources:
+                    self._fail(source, f"Error deleting old chunks: {e}")
+        
+        texts = self.texts[:self.batch_size]
+        metadatas = self.metadatas[:self.batch_size]
+        embeddings = self.embeddings[:self.batch_size]
+        del self.texts[:self.batch_size], self.metadatas[:self.batch_size], self.embeddings[:self.batch_size]
+        sources = Counter(metadata.get('source', '') for metadata in metadatas)
+        self.buffered -= sources
+        
+        # Chunks of sources that failed since they were buffered are dropped
+        keep = [i for i, metadata in enumerate(metadatas) if metadata.get('source', '') not in self.errors]
+        if len(keep) < len(texts):
+            texts = [texts[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+            embeddings = [embeddings[i] for i in keep]
+        if not texts:
+            return
+        try:
+            self.round_trips += 1
+            self.store.add_documents(texts, metadatas, embeddings)
+        except Exception as e:
+            for source in sources:
+                self._fail(source, str(e))
+    
+    def _fail(self, source: str, error: str):
+        self.errors.setdefault(source, error)
+
+# Global instance, created on first use
+vector_store = LazyInstance(VectorStore)
 
@@ -63,17 +63,35 @@ export default function ChatInterface({ onUploadClick, refreshTrigger }) {
         content: msg.content,
       }))
 
-      const response = await chatAPI.sendMessage(input.trim(), conversationHistory)
-      
+      // Show the answer as it streams in
       const assistantMessage = {
         role: 'assistant',
-        content: response.message,
+        content: '',
         timestamp: new Date(),
-        sources: response.sources || [],
+        sources: [],
       }
-
       setMessages(prev => [...prev, assistantMessage])
-      setCurrentSources(response.sources || [])
+
+      const updateAssistant = (changes) => {
+        setMessages(prev => {
+          const next = [...prev]
+          next[next.length - 1] = { ...next[next.length - 1], ...changes }
+          return next
+        })
+      }
+
+      let content = ''
+      await chatAPI.streamMessage(input.trim(), conversationHistory, {
+        onSources: (sources) => {
+          updateAssistant({ sources: sources || [] })
+          setCurrentSources(sources || [])
+        },
+        onToken: (token) => {
+          content += token
+          setIsLoading(false)
+          updateAssistant({ content })
+        },
+      })
       setIsConnected(true)
     } catch (error) {
       console.error('Error sending message:', error)
@@ -88,7 +106,14 @@ export default function ChatInterface({ onUploadClick, refreshTrigger }) {
         sources: [],
         error: true,
       }
-      setMessages(prev => [...prev, errorMessage])
+      // Replace the partially streamed answer, if there is one
+      setMessages(prev => {
+        const last = prev[prev.length - 1]
+        if (last?.role === 'assistant' && !last.error) {
+          return [...prev.slice(0, -1), errorMessage]
+        }
+        return [...prev, errorMessage]
+      })
     } finally {
       setIsLoading(false)
     }
@@ -41,6 +41,13 @@ export default function SourceCitations({ sources }) {
                 <div className="flex-1 min-w-0">
                   <h4 className="text-sm font-medium text-gray-900 dark:text-white truncate">
                     {source.filename || 'Unknown Source'}
+                    {source.page_start != null && (
+                      <span className="font-normal text-gray-500 dark:text-gray-400">
+                        {source.page_end != null && source.page_end !== source.page_start
+                          ? ` · pp. ${source.page_start}-${source.page_end}`
+                          : ` · p. ${source.page_start}`}
+                      </span>
+                    )}
                   </h4>
                   <p className="text-xs text-gray-500 dark:text-gray-400 mt-1 truncate">
                     {source.source}
@@ -38,6 +38,57 @@ export const chatAPI = {
     })
     return response.data
   },
+
+  // Streams the answer over Server-Sent Events. Handlers: onSources(sources),
+  // onToken(text), onDone({ model, timings, ... })
+  streamMessage: async (message, conversationHistory = [], handlers = {}) => {
+    let response
+    try {
+      response = await fetch(`${API_BASE_URL}/api/chat/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          message,
+          conversation_history: conversationHistory,
+        }),
+      })
+    } catch (error) {
+      throw new Error('Cannot connect to server. Please ensure the backend is running.')
+    }
+    if (!response.ok || !response.body) {
+      throw new Error(`Request failed with status ${response.status}`)
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+
+    while (true) {
+      const { value, done } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+
+      // Events are separated by a blank line
+      let boundary
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const rawEvent = buffer.slice(0, boundary)
+        buffer = buffer.slice(boundary + 2)
+
+        let event = 'message'
+        let data = ''
+        for (const line of rawEvent.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7)
+          else if (line.startsWith('data: ')) data += line.slice(6)
+        }
+        const payload = data ? JSON.parse(data) : null
+
+        if (event === 'sources') handlers.onSources?.(payload)
+        else if (event === 'token') handlers.onToken?.(payload)
+        else if (event === 'done') handlers.onDone?.(payload)
+        else if (event === 'error') throw new Error(payload?.message || 'Error generating answer')
+      }
+    }
+  },
 }
 
 export const searchAPI = {